@@ -0,0 +1,171 @@
+# analytics.py
+# Materialized aggregates for the History dashboard.
+#
+# A SQLite trigger on the history table keeps small summary tables up to date in
+# the same transaction as each insert: a total row count, per-level counts,
+# per-user counts (whose keys are the distinct-user set) and per-day buckets.
+# The dashboard reads these instead of scanning the raw log, so its cost does
+# not grow with the number of predictions. rebuild() recomputes everything from
+# the raw rows and verify() compares the two.
+
+from datetime import date, timedelta
+
+import pandas as pd
+
+AGGREGATE_TABLES = [
+    """CREATE TABLE IF NOT EXISTS agg_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        n INTEGER NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS agg_level_counts (
+        stress_level INTEGER PRIMARY KEY,
+        n INTEGER NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS agg_user_counts (
+        username TEXT PRIMARY KEY,
+        n INTEGER NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS agg_daily (
+        day TEXT PRIMARY KEY,
+        n INTEGER NOT NULL,
+        stress_sum INTEGER NOT NULL,
+        stress_n INTEGER NOT NULL
+    )""",
+]
+
+AGGREGATE_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS trg_history_aggregates AFTER INSERT ON history
+BEGIN
+    INSERT INTO agg_totals (id, n) VALUES (1, 1)
+        ON CONFLICT (id) DO UPDATE SET n = n + 1;
+    INSERT INTO agg_level_counts (stress_level, n)
+        SELECT NEW.stress_level, 1 WHERE NEW.stress_level IS NOT NULL
+        ON CONFLICT (stress_level) DO UPDATE SET n = n + 1;
+    INSERT INTO agg_user_counts (username, n) VALUES (NEW.username, 1)
+        ON CONFLICT (username) DO UPDATE SET n = n + 1;
+    INSERT INTO agg_daily (day, n, stress_sum, stress_n)
+        SELECT substr(NEW.dt_iso, 1, 10), 1, coalesce(NEW.stress_level, 0), NEW.stress_level IS NOT NULL
+        WHERE NEW.dt_iso IS NOT NULL
+        ON CONFLICT (day) DO UPDATE SET
+            n = n + 1,
+            stress_sum = stress_sum + excluded.stress_sum,
+            stress_n = stress_n + excluded.stress_n;
+END
+"""
+
+# Table name -> canonical dump query (used by verify)
+_DUMPS = {
+    "agg_totals": "SELECT id, n FROM {} ORDER BY id",
+    "agg_level_counts": "SELECT stress_level, n FROM {} ORDER BY stress_level",
+    "agg_user_counts": "SELECT username, n FROM {} ORDER BY username",
+    "agg_daily": "SELECT day, n, stress_sum, stress_n FROM {} ORDER BY day",
+}
+
+
+def _recompute_statements(prefix=""):
+    # INSERT ... SELECT statements filling `prefix + table` from the raw rows
+    return [
+        f"INSERT INTO {prefix}agg_totals (id, n) SELECT 1, COUNT(*) FROM history",
+        f"""INSERT INTO {prefix}agg_level_counts (stress_level, n)
+            SELECT stress_level, COUNT(*) FROM history
+            WHERE stress_level IS NOT NULL GROUP BY stress_level""",
+        f"""INSERT INTO {prefix}agg_user_counts (username, n)
+            SELECT username, COUNT(*) FROM history GROUP BY username""",
+        f"""INSERT INTO {prefix}agg_daily (day, n, stress_sum, stress_n)
+            SELECT substr(dt_iso, 1, 10), COUNT(*), coalesce(SUM(stress_level), 0), COUNT(stress_level)
+            FROM history WHERE dt_iso IS NOT NULL GROUP BY substr(dt_iso, 1, 10)""",
+    ]
+
+
+def _rebuild(conn):
+    for table in _DUMPS:
+        conn.execute(f"DELETE FROM {table}")
+    for stmt in _recompute_statements():
+        conn.execute(stmt)
+
+
+def install(conn):
+    """Create the aggregate tables and trigger; backfill them if they are new."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for stmt in AGGREGATE_TABLES:
+            conn.execute(stmt)
+        conn.execute(AGGREGATE_TRIGGER)
+        if conn.execute("SELECT COUNT(*) FROM agg_totals").fetchone()[0] == 0:
+            _rebuild(conn)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def rebuild(conn):
+    """Recompute every aggregate from the raw history rows."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _rebuild(conn)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def verify(conn):
+    """Compare the stored aggregates with a fresh recomputation; returns the mismatching table names."""
+    conn.execute("BEGIN")
+    try:
+        stored = {t: conn.execute(q.format(t)).fetchall() for t, q in _DUMPS.items()}
+        # Recompute into temp copies inside the same read snapshot, then roll back
+        for t in _DUMPS:
+            conn.execute(f"CREATE TEMP TABLE verify_{t} AS SELECT * FROM main.{t} WHERE 0")
+        for stmt in _recompute_statements(prefix="verify_"):
+            conn.execute(stmt)
+        fresh = {t: conn.execute(q.format("verify_" + t)).fetchall() for t, q in _DUMPS.items()}
+    finally:
+        conn.execute("ROLLBACK")
+    return [t for t in _DUMPS if stored[t] != fresh[t]]
+
+
+# ---------------------------
+# Dashboard summaries
+# ---------------------------
+def summary(conn):
+    """Everything the History page needs, read from the aggregate tables."""
+    row = conn.execute("SELECT n FROM agg_totals WHERE id = 1").fetchone()
+    levels = dict(conn.execute("SELECT stress_level, n FROM agg_level_counts ORDER BY stress_level").fetchall())
+    daily = pd.read_sql_query("SELECT day, n, stress_sum, stress_n FROM agg_daily ORDER BY day", conn)
+    daily["day"] = pd.to_datetime(daily["day"], errors="coerce")
+    return {
+        "total": row[0] if row else 0,
+        "unique_users": conn.execute("SELECT COUNT(*) FROM agg_user_counts").fetchone()[0],
+        "levels": levels,
+        "daily": daily.dropna(subset=["day"]),
+    }
+
+
+def user_count(conn, username):
+    row = conn.execute("SELECT n FROM agg_user_counts WHERE username = ?", (username,)).fetchone()
+    return row[0] if row else 0
+
+
+def entries_last_days(daily, days=7, today=None):
+    """Entries in the last `days` calendar days, today included."""
+    today = today or date.today()
+    start = pd.Timestamp(today - timedelta(days=days - 1))
+    return int(daily.loc[daily["day"] >= start, "n"].sum())
+
+
+def level_distribution(levels):
+    """value_counts-style frame: stress_level, count, label."""
+    dist = pd.DataFrame(sorted(levels.items()), columns=["stress_level", "count"])
+    dist["label"] = dist["stress_level"].map({0:"Low",1:"Moderate",2:"High"})
+    return dist
+
+
+def weekly_trend(daily):
+    """Mean stress per 7-day bin, matching resample("7D") over the raw rows."""
+    if daily.empty:
+        return pd.DataFrame(columns=["dt_iso", "stress_level"])
+    bins = daily.set_index("day")[["stress_sum", "stress_n"]].resample("7D").sum()
+    trend = (bins["stress_sum"] / bins["stress_n"].where(bins["stress_n"] > 0)).rename("stress_level")
+    return trend.rename_axis("dt_iso").reset_index()
@@ -0,0 +1,85 @@
+# api_bench.py
+# Load-test client for api_service.py (standard library only).
+#
+#   uvicorn api_service:app --port 8000 &
+#   python api_bench.py --requests 5000 --concurrency 64
+#   python api_bench.py --batch-size 100 --requests 200
+
+import json
+import time
+import random
+import argparse
+import threading
+import http.client
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+from config import FEATURE_COLUMNS, BINARY_FEATURES
+
+
+def random_features(rng):
+    return {c: rng.randint(0, 1) if c in BINARY_FEATURES else rng.randint(1, 10) for c in FEATURE_COLUMNS}
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float("nan")
+    idx = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def run(url, requests, concurrency, batch_size, record, seed=0):
+    target = urlparse(url)
+    local = threading.local()
+    rng = random.Random(seed)
+    if batch_size > 1:
+        path = "/predict/batch"
+        bodies = [json.dumps({"username": "bench", "record": record,
+                              "items": [random_features(rng) for _ in range(batch_size)]})
+                  for _ in range(min(requests, 100))]
+    else:
+        path = "/predict"
+        bodies = [json.dumps({"username": "bench", "record": record, "features": random_features(rng)})
+                  for _ in range(min(requests, 1000))]
+
+    def one(i):
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+        start = time.perf_counter()
+        conn.request("POST", path, body=bodies[i % len(bodies)], headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        resp.read()
+        return time.perf_counter() - start, resp.status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(lat for lat, status in results if status == 200)
+    errors = sum(1 for _, status in results if status != 200)
+    return {
+        "requests": requests,
+        "rows": requests * batch_size,
+        "errors": errors,
+        "seconds": wall,
+        "requests_per_sec": requests / wall,
+        "rows_per_sec": requests * batch_size / wall,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the prediction API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=1, help="rows per request (>1 uses /predict/batch)")
+    parser.add_argument("--record", action="store_true", help="write the predictions to history")
+    args = parser.parse_args()
+
+    res = run(args.url, args.requests, args.concurrency, args.batch_size, args.record)
+    print(json.dumps({k: round(v, 3) if isinstance(v, float) else v for k, v in res.items()}, indent=2))
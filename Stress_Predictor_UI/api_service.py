@@ -0,0 +1,314 @@
+# api_service.py
+# JSON prediction API sharing the app's model files, feature contract and storage
+# (STRESS_DATA_DIR / STRESS_STORAGE, see storage.py).
+#
+#   uvicorn api_service:app --port 8000            (run from Stress_Predictor_UI/)
+#   python api_bench.py --url http://127.0.0.1:8000 --requests 5000 --concurrency 64
+#
+# Request path: the async handler validates the body, hands the rows to the
+# MicroBatcher and awaits the result. The batcher merges whatever requests
+# arrive within a few milliseconds into one predict_proba call, which runs on a
+# worker pool (processes by default, so inference does not hold the event
+# loop's GIL). History rows are handed to the background history writer
+# (history_writer.py) from a separate thread and the response does not wait
+# for them. Every scored row also goes into the drift monitor
+# (drift_monitor.py), whose verdict is served at /drift.
+
+import os
+import time
+import asyncio
+from typing import List
+from datetime import datetime
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field, create_model
+
+import metrics
+from config import FEATURE_COLUMNS, BINARY_FEATURES, LABEL_MAP, MODEL_FILE, SCALER_FILE, MODELS_DIR
+
+API_POOL = os.environ.get("STRESS_API_POOL", "process")          # "process" or "thread"
+API_WORKERS = int(os.environ.get("STRESS_API_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+MAX_BATCH_ROWS = int(os.environ.get("STRESS_API_MAX_BATCH", 256))
+MAX_WAIT_MS = float(os.environ.get("STRESS_API_MAX_WAIT_MS", 2.0))
+MAX_REQUEST_ROWS = 10_000
+
+
+# ---------------------------
+# Request / response schema
+# ---------------------------
+Features = create_model(
+    "Features",
+    **{c: (int, Field(ge=0, le=1) if c in BINARY_FEATURES else Field(ge=1, le=10)) for c in FEATURE_COLUMNS},
+)
+
+
+class PredictRequest(BaseModel):
+    username: str = "api"
+    email: str = ""
+    record: bool = True
+    features: Features
+
+
+class BatchPredictRequest(BaseModel):
+    username: str = "api"
+    record: bool = True
+    items: List[Features] = Field(min_length=1, max_length=MAX_REQUEST_ROWS)
+
+
+class Prediction(BaseModel):
+    stress_level: int
+    label: str
+    probabilities: dict
+    model_version: str
+
+
+class BatchPrediction(BaseModel):
+    predictions: List[Prediction]
+    model_version: str
+    seconds: float
+
+
+# ---------------------------
+# Inference (runs inside the worker pool)
+# ---------------------------
+def _pool_predict(X):
+    """predict_proba with the process's registry; also returns the version and classes used."""
+    from model_registry import get_model_registry
+    active = get_model_registry(MODEL_FILE, SCALER_FILE, models_dir=MODELS_DIR).get()
+    return active.predictor.predict_proba(X), active.version, [int(c) for c in active.predictor.classes_]
+
+
+def _warm_worker():
+    _pool_predict(np.ones((1, len(FEATURE_COLUMNS))))
+
+
+class MicroBatcher:
+    """Merges concurrent requests into one predict call on the worker pool."""
+
+    def __init__(self, executor, max_rows=MAX_BATCH_ROWS, max_wait_ms=MAX_WAIT_MS):
+        self.executor = executor
+        self.max_rows = max_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.rows = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, X):
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put((X, fut))
+        return await fut
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            n = len(items[0][0])
+            deadline = loop.time() + self.max_wait
+            while n < self.max_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                n += len(item[0])
+
+            X = np.vstack([x for x, _ in items])
+            start = time.perf_counter()
+            try:
+                proba, version, classes = await loop.run_in_executor(self.executor, _pool_predict, X)
+            except Exception as e:
+                for _, fut in items:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            metrics.observe("api.pool_predict", time.perf_counter() - start)
+            metrics.inc("api.batches")
+            self.batches += 1
+            self.rows += len(X)
+            start = 0
+            for x, fut in items:
+                if not fut.done():
+                    fut.set_result((proba[start:start + len(x)], version, classes))
+                start += len(x)
+
+
+# ---------------------------
+# History (fire-and-forget writes)
+# ---------------------------
+def _history_rows(username, email, X, preds):
+    now = datetime.now()
+    rows = []
+    for x, p in zip(X, preds):
+        row = {"username": username, "timestamp": now.timestamp(), "dt_iso": now.isoformat(),
+               "email": email, "stress_level": int(p)}
+        row.update(zip(FEATURE_COLUMNS, (int(v) for v in x)))
+        rows.append(row)
+    return rows
+
+
+def _history_writer():
+    from storage import get_storage
+    from history_writer import get_history_writer
+    return get_history_writer(get_storage().history)
+
+
+def _record(rows):
+    # Group-committed with the other requests' rows by the background writer
+    _history_writer().append_many(rows)
+
+
+def _drift_monitor():
+    """This process's drift monitor, its window started from the newest history rows."""
+    from storage import get_storage
+    from drift_monitor import get_drift_monitor, COLUMNS
+    monitor = get_drift_monitor()
+    if monitor is not None and not monitor.seeded:
+        monitor.seed(get_storage().history.recent(monitor.window, COLUMNS).iloc[::-1])
+    return monitor
+
+
+def _observe(X, predictions):
+    if state["drift"] is not None:
+        state["drift"].observe(X, [p.stress_level for p in predictions])
+
+
+# ---------------------------
+# App
+# ---------------------------
+state = {}
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if API_POOL == "process":
+        executor = ProcessPoolExecutor(max_workers=API_WORKERS)
+    else:
+        executor = ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix="inference")
+    # Load the model in every worker before taking traffic
+    await asyncio.gather(*[asyncio.get_running_loop().run_in_executor(executor, _warm_worker)
+                           for _ in range(API_WORKERS)])
+    state["executor"] = executor
+    state["history"] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history")
+    state["pending"] = set()
+    state["batcher"] = MicroBatcher(executor)
+    state["batcher"].start()
+    state["drift"] = _drift_monitor()
+    yield
+    await state["batcher"].stop()
+    if state["pending"]:
+        await asyncio.gather(*state["pending"], return_exceptions=True)
+    state["history"].shutdown(wait=True)
+    _history_writer().close()
+    executor.shutdown(wait=True)
+
+
+app = FastAPI(title="Stress Analyzer API", lifespan=lifespan)
+
+
+def _to_matrix(items):
+    return np.array([[getattr(f, c) for c in FEATURE_COLUMNS] for f in items], dtype=float)
+
+
+def _predictions(proba, classes, version):
+    out = []
+    for row in proba:
+        level = classes[int(row.argmax())]
+        out.append(Prediction(
+            stress_level=level,
+            label=LABEL_MAP.get(level, ("UNKNOWN",))[0],
+            probabilities={LABEL_MAP.get(c, (str(c),))[0]: float(p) for c, p in zip(classes, row)},
+            model_version=version,
+        ))
+    return out
+
+
+def _record_later(username, email, X, predictions):
+    rows = _history_rows(username, email, X, [p.stress_level for p in predictions])
+    fut = asyncio.get_running_loop().run_in_executor(state["history"], _record, rows)
+    state["pending"].add(fut)
+    fut.add_done_callback(state["pending"].discard)
+
+
+async def _score(X):
+    try:
+        return await state["batcher"].submit(X)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=f"Model not available: {e}")
+
+
+@app.get("/health")
+async def health():
+    b = state["batcher"]
+    return {"status": "ok", "pool": API_POOL, "workers": API_WORKERS, "queued": b.queue.qsize(),
+            "batches": b.batches, "rows": b.rows, "history_writes_pending": len(state["pending"]),
+            "history_writer": _history_writer().stats()}
+
+
+@app.get("/drift")
+async def drift():
+    if state["drift"] is None:
+        raise HTTPException(status_code=404, detail="Drift monitoring is off (no training dataset)")
+    rep = state["drift"].report()
+    table = rep["table"]
+    rep["table"] = table.astype(object).where(table.notna(), None).to_dict(orient="records")
+    return rep
+
+
+# With the default process pool the inference stage timers fire inside the
+# workers, so these show the request/batching side; STRESS_API_POOL=thread
+# keeps everything in one process and reports the inference stages too.
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_prometheus():
+    return metrics.prometheus_text()
+
+
+@app.get("/metrics.json")
+async def metrics_json():
+    return metrics.snapshot()
+
+
+@app.post("/predict", response_model=Prediction)
+async def predict(req: PredictRequest):
+    start = time.perf_counter()
+    X = _to_matrix([req.features])
+    proba, version, classes = await _score(X)
+    pred = _predictions(proba, classes, version)
+    _observe(X, pred)
+    if req.record:
+        _record_later(req.username, req.email, X, pred)
+    metrics.observe("api.predict", time.perf_counter() - start)
+    metrics.inc("api.predictions")
+    return pred[0]
+
+
+@app.post("/predict/batch", response_model=BatchPrediction)
+async def predict_batch(req: BatchPredictRequest):
+    start = time.perf_counter()
+    X = _to_matrix(req.items)
+    proba, version, classes = await _score(X)
+    preds = _predictions(proba, classes, version)
+    _observe(X, preds)
+    if req.record:
+        _record_later(req.username, "", X, preds)
+    metrics.observe("api.predict_batch", time.perf_counter() - start)
+    metrics.inc("api.predictions", len(preds))
+    return BatchPrediction(predictions=preds, model_version=version, seconds=time.perf_counter() - start)
@@ -1,94 +1,185 @@
 # app.py
+import time
+_run_started = time.perf_counter()
+
 import streamlit as st
 import numpy as np
 import pandas as pd
-import joblib
 import os
-import hashlib
+import tempfile
 from datetime import datetime
-import time
 
-# Machine learning imports for fallback training
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report, confusion_matrix
-
-# Visualization
-import altair as alt
+# sklearn is only needed to unpickle the model (model_registry) and by the
+# offline fallback trainer (fallback_model.py); altair is imported when the
+# History page charts are (re)built. Neither is paid for by a cold start on
+# the other pages.
 
 # ---------------------------
 # Config & Files
 # ---------------------------
 st.set_page_config(page_title="Stress Analyzer", page_icon="🧠", layout="wide")
-USERS_CSV = "users.csv"
-HISTORY_CSV = "history.csv"
-MODEL_FILE = "best_model.pkl"
-SCALER_FILE = "scaler.pkl"
-
-# Columns (20 feature set + metadata)
-FEATURE_COLUMNS = [
-    "anxiety_level","self_esteem","mental_health_history","depression","headache",
-    "blood_pressure","sleep_quality","breathing_problem","living_conditions","safety",
-    "basic_needs","academic_performance","study_load","teacher_student_relationship","future_career_concerns",
-    "social_support","peer_pressure","extracurricular_activities","screen_time","health_issues"
-]
 
-HISTORY_COLUMNS = ["username","timestamp","dt_iso","email","stress_level"] + FEATURE_COLUMNS
+from config import (
+    USERS_CSV, MODEL_FILE, SCALER_FILE, MODELS_DIR, DATA_DIR,
+    FEATURE_COLUMNS, LABEL_MAP, METRICS_PORT,
+    DRIFT_MIN_SAMPLES, DRIFT_PSI_WARN, DRIFT_PSI_ALERT,
+)
+from analytics import entries_last_days, level_distribution, weekly_trend
+from storage import get_storage
+from user_store import sha256_hash
+from model_registry import get_model_registry, write_atomic
+import artifacts
+from batch_predict import run_batch, DEFAULT_CHUNKSIZE
+from prediction_cache import get_prediction_cache
+from tree_shap import get_explainer, global_importances
+from exports import FORMATS as EXPORT_FORMATS, export_history, export_users, export_to_temp
+from render_cache import get_render_cache
+from history_writer import get_history_writer
+from cohorts import get_cohort_engine
+from drift_monitor import get_drift_monitor, COLUMNS as DRIFT_COLUMNS
+import metrics
+from fallback_model import create_and_save_fallback_model
+import startup_report
+
+startup_report.begin_run(_run_started)
+startup_report.mark("import")
 
 # ---------------------------
 # Utility helpers
 # ---------------------------
-def sha256_hash(s: str) -> str:
-    return hashlib.sha256(s.encode("utf-8")).hexdigest()
-
 def ensure_files_exist():
+    if DATA_DIR:
+        os.makedirs(DATA_DIR, exist_ok=True)
     if not os.path.exists(USERS_CSV):
         df = pd.DataFrame([{"username":"Ayush","password":sha256_hash("1234"), "role":"user"}])
-        df.to_csv(USERS_CSV, index=False)
-    if not os.path.exists(HISTORY_CSV):
-        pd.DataFrame(columns=HISTORY_COLUMNS).to_csv(HISTORY_CSV, index=False)
-
-def load_users():
-    return pd.read_csv(USERS_CSV)
-
-def save_users(df):
-    df.to_csv(USERS_CSV, index=False)
-
-def load_history():
-    return pd.read_csv(HISTORY_CSV)
-
-def save_history(df):
-    df.to_csv(HISTORY_CSV, index=False)
-
-# Create fallback model and scaler if missing
-def create_and_save_fallback_model():
-    X = np.random.rand(1000, len(FEATURE_COLUMNS)) * 9 + 1  
-    y = np.random.choice([0,1,2], size=X.shape[0], p=[0.5,0.35,0.15])
-    scaler = StandardScaler()
-    Xs = scaler.fit_transform(X)
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
-    model.fit(Xs, y)
-    joblib.dump(model, MODEL_FILE)
-    joblib.dump(scaler, SCALER_FILE)
-    return model, scaler
-
-def load_model_and_scaler():
-    if os.path.exists(MODEL_FILE) and os.path.exists(SCALER_FILE):
+        # Other workers may be starting too: never let them read a half-written file
+        tmp = f"{USERS_CSV}.{os.getpid()}.tmp"
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, USERS_CSV)
+
+def record_history(row):
+    # Queued for the background writer; with STRESS_HISTORY_DURABILITY=fsync
+    # this waits for the group commit
+    history_writer.append(row)
+
+def get_active_model():
+    """Current model bundle, loaded on first use; None while it is being prepared."""
+    start = time.perf_counter()
+    try:
+        reloaded = model_registry.refresh()
+    except FileNotFoundError:
+        return None, False
+    startup_report.mark("model_load", time.perf_counter() - start if reloaded else 0.0)
+    active = model_registry.current
+    if active is not None:
+        # Pre-compute the most common history vectors once per model version
+        prediction_cache.warm_in_background(active, lambda n: [v for v, _ in history_store.top_vectors(n)])
+    return active, reloaded
+
+def export_download(kind, build, key):
+    """Format picker + "Prepare download"; the file is built (streamed to disk) only on click.
+
+    The download button reads the file once, when it is clicked, and removes it. A file that
+    was prepared but not downloaded is removed on the next rerun or when the session ends.
+    """
+    c1, c2 = st.columns([1, 1])
+    fmt = c1.selectbox("Format", list(EXPORT_FORMATS), key=f"{key}_fmt")
+    stale = st.session_state.pop(key, None)
+    if stale is not None:
+        stale.discard()
+    if c2.button("Prepare download", key=f"{key}_build"):
         try:
-            model = joblib.load(MODEL_FILE)
-            scaler = joblib.load(SCALER_FILE)
-            return model, scaler, "loaded"
-        except Exception:
-            return create_and_save_fallback_model()
+            prepared = export_to_temp(kind, fmt, build)
+        except (ValueError, ImportError) as e:
+            st.error(str(e))
+            return
+        st.session_state[key] = prepared
+        st.download_button(f"Download {prepared.file_name} ({prepared.rows:,} rows)", prepared.read,
+                           file_name=prepared.file_name, mime=prepared.mime, on_click="ignore",
+                           key=f"{key}_download")
+
+def build_history_view(username):
+    """Everything the History page shows except the export widgets: metrics, tables, Vega-Lite specs."""
+    import altair as alt  # only the History charts need it, and only when rebuilt
+    summary = history_store.summary()
+    view = {"total": summary["total"], "unique_users": summary["unique_users"]}
+    if summary["total"] == 0:
+        return view
+    view["last_7d"] = entries_last_days(summary["daily"], days=7)
+    # Latest entries for user (indexed per-user query, newest first)
+    view["user_recent"] = history_store.user_history(username, limit=20)
+    view["recent"] = history_store.recent(50)
+
+    dist = level_distribution(summary["levels"])
+    view["bar"] = alt.Chart(dist).mark_bar(cornerRadiusTopLeft=6, cornerRadiusTopRight=6).encode(
+        x=alt.X('label:N', sort=["Low","Moderate","High"], title="Stress Level"),
+        y=alt.Y('count:Q', title="Count"),
+        color=alt.Color('label:N', scale=alt.Scale(domain=["Low","Moderate","High"], range=["#56CCF2","#FEC260","#FF6A88"])),
+        tooltip=['label','count']
+    ).properties(width=600, height=360).to_dict()
+
+    view["trend"] = None
+    recent = weekly_trend(summary["daily"])
+    if not recent.empty:
+        line = alt.Chart(recent).mark_line(point=True).encode(
+            x=alt.X('dt_iso:T', title='Date'),
+            y=alt.Y('stress_level:Q', title='Average stress (0-2)'),
+            tooltip=[alt.Tooltip('dt_iso:T', title='Date'), alt.Tooltip('stress_level:Q', title='Avg stress')]
+        ).properties(width=800, height=320)
+        area = alt.Chart(recent).mark_area(opacity=0.1).encode(
+            x='dt_iso:T', y='stress_level:Q'
+        )
+        view["trend"] = (area + line).to_dict()
+
+    view["pie"] = None
+    if not dist.empty:
+        view["pie"] = alt.Chart(dist).mark_arc(innerRadius=50).encode(
+            theta=alt.Theta(field="count", type="quantitative"),
+            color=alt.Color(field="label", type="nominal", scale=alt.Scale(range=["#56CCF2","#FEC260","#FF6A88"])),
+            tooltip=['label','count']
+        ).properties(width=350, height=350).to_dict()
+    return view
+
+def history_view(username, role):
+    """build_history_view, memoized until the next history row is recorded."""
+    history_writer.flush()  # show the row this session just queued
+    version = history_store.version()
+    with metrics.timer("history_page.view"):
+        return render_cache.get_or_build(("history", version, username, role), version,
+                                         lambda: build_history_view(username))
+
+def model_unavailable_message():
+    if model_registry.preparing:
+        st.info("The model is being prepared in the background — please try again in a moment.")
     else:
-        return create_and_save_fallback_model()
+        st.error(f"No model available. Run `python fallback_model.py` or upload {MODEL_FILE} in the Admin panel.")
 
 # ---------------------------
 # App Initialization
 # ---------------------------
 ensure_files_exist()
-model, scaler, model_status = load_model_and_scaler()
+# Users and history live in the configured backend under STRESS_DATA_DIR
+# (storage.py), shared safely by any number of worker processes
+storage = get_storage()
+history_store, users_repo = storage.history, storage.users
+history_writer = get_history_writer(history_store)
+# Integer-coded, indexed copy of the history for the Admin cohort views (loaded on first use)
+cohort_engine = get_cohort_engine(history_store, users_repo)
+
+# Model and scaler are deserialized once per process, on a background thread
+# at first start; pages that predict pick up new uploads via get_active_model()
+model_registry = get_model_registry(MODEL_FILE, SCALER_FILE, fallback=create_and_save_fallback_model,
+                                    models_dir=MODELS_DIR)
+model_registry.preload()
+prediction_cache = get_prediction_cache()
+render_cache = get_render_cache()
+# Incoming vectors vs the training data; the window starts from the newest history rows
+drift_monitor = get_drift_monitor()
+if drift_monitor is not None and not drift_monitor.seeded:
+    drift_monitor.seed(history_store.recent(drift_monitor.window, DRIFT_COLUMNS).iloc[::-1])
+if METRICS_PORT:
+    metrics.serve(METRICS_PORT)
+startup_report.mark("init")
 
 # ---------------------------
 # STYLING: Animated gradient, floating icons, neon buttons, large fonts
@@ -255,7 +346,7 @@ st.markdown("""
 # Sidebar Navigation
 # ---------------------------
 st.sidebar.title("Stress Analyzer")
-nav = st.sidebar.radio("Navigate", ("Home","Analyze","History","Admin","About"))
+nav = st.sidebar.radio("Navigate", ("Home","Analyze","Batch","History","Admin","Metrics","About"))
 
 # ---------------------------
 # Authentication
@@ -274,17 +365,12 @@ def auth_box():
         u = st.sidebar.text_input("Username", key="login_user")
         p = st.sidebar.text_input("Password", type="password", key="login_pass")
         if st.sidebar.button("Login"):
-            users = load_users()
-            if not users.empty and (users["username"].str.lower() == u.lower()).any():
-                stored_pw = users.loc[users["username"].str.lower() == u.lower(), "password"].values[0]
-                if str(stored_pw) == sha256_hash(p):
+            user = users_repo.get(u)
+            if user is not None:
+                if user["password"] == sha256_hash(p):
                     st.session_state.logged_in = True
-                    st.session_state.username = users.loc[
-                        users["username"].str.lower() == u.lower(), "username"
-                    ].values[0]
-                    st.session_state.role = users.loc[
-                        users["username"].str.lower() == u.lower(), "role"
-                    ].values[0] if "role" in users.columns else "user"
+                    st.session_state.username = user["username"]
+                    st.session_state.role = user["role"]
                     st.experimental_rerun()
                 else:
                     st.sidebar.error("Incorrect Password")
@@ -297,13 +383,9 @@ def auth_box():
             if not new_u or not new_p:
                 st.sidebar.error("Please fill username and password")
             else:
-                users = load_users()
-                if (users["username"].str.lower() == new_u.lower()).any():
+                if not users_repo.add(new_u, sha256_hash(new_p), role="user"):
                     st.sidebar.error("Username taken")
                 else:
-                    new_row = {"username": new_u, "password": sha256_hash(new_p), "role": "user"}
-                    users = pd.concat([users, pd.DataFrame([new_row])], ignore_index=True)
-                    save_users(users)
                     st.sidebar.success("Registered! Please login.")
 
 if not st.session_state.logged_in:
@@ -378,22 +460,29 @@ if nav == "Analyze":
             screen_time = input_select("Screen Time (1-10)", "screen")
             health_issues = st.selectbox("Health Issues (0/1)", [0,1], key="health")
 
-        if st.button("🔍 Analyze Stress Level"):
+        analyze_clicked = st.button("🔍 Analyze Stress Level")
+        active = get_active_model()[0] if analyze_clicked else None
+        if analyze_clicked and active is None:
+            model_unavailable_message()
+
+        if analyze_clicked and active is not None:
 
             features = np.array([[anxiety, self_esteem, mental_hist, depression, headache,
                                   bp, sleep, breathing, living, safety, needs, academic,
                                   load, teacher, career, support, peer, extra,
                                   screen_time, health_issues]])
 
+            analyze_start = time.perf_counter()
             try:
-                scaled = scaler.transform(features)
-                pred = model.predict(scaled)[0]
+                # Repeat submissions are answered from the cache without running the model
+                with metrics.timer("analyze.predict"):
+                    pred = prediction_cache.predict(active, features)[0]
+                if drift_monitor is not None:
+                    drift_monitor.observe(features, [pred])
 
-                label_map = {0:("LOW","🌟"), 1:("MODERATE","⚠"), 2:("HIGH","🚨")}
-                tag, emoji = label_map.get(pred, ("UNKNOWN","❔"))
+                tag, emoji = LABEL_MAP.get(pred, ("UNKNOWN","❔"))
 
-                # Save to history
-                hist = load_history()
+                # Save to history (single-row append)
                 now = datetime.now()
                 new_row = {
                     "username": st.session_state.username,
@@ -405,8 +494,8 @@ if nav == "Analyze":
                 for i,col in enumerate(FEATURE_COLUMNS):
                     new_row[col] = int(features[0][i])
 
-                hist = pd.concat([hist, pd.DataFrame([new_row])], ignore_index=True)
-                save_history(hist)
+                with metrics.timer("analyze.record_history"):
+                    record_history(new_row)
 
                 st.success(f"{emoji} Predicted: {tag} stress")
 
@@ -417,17 +506,89 @@ if nav == "Analyze":
                 else:
                     st.error("High stress detected — seek help or talk to someone you trust.")
 
-                if hasattr(model, "feature_importances_"):
-                    fi = model.feature_importances_
-                    fi_df = pd.DataFrame({
-                        "feature": FEATURE_COLUMNS,
-                        "importance": fi
-                    }).sort_values("importance", ascending=False)
-                    st.markdown("#### Top features influencing model")
-                    st.table(fi_df.head(6))
+                # Per-prediction attributions (exact TreeSHAP); explainer built once per model version
+                explainer = get_explainer(active)
+                if explainer is not None:
+                    with metrics.timer("analyze.explain"):
+                        cls = int(np.flatnonzero(active.predictor.classes_ == pred)[0])
+                        contrib = explainer.explain(features, [cls])[0]
+                        why = pd.DataFrame({
+                            "feature": FEATURE_COLUMNS,
+                            "your answer": features[0].astype(int),
+                            f"effect on P({tag})": contrib.round(4),
+                        })
+                        why = why.iloc[np.argsort(-np.abs(contrib), kind="stable")]
+                        st.markdown("#### What drove this prediction")
+                        st.table(why.head(6).reset_index(drop=True))
+
+                fi = global_importances(active)
+                if fi is not None:
+                    with metrics.timer("analyze.importance_table"):
+                        fi_df = pd.DataFrame({
+                            "feature": FEATURE_COLUMNS,
+                            "importance": fi
+                        }).sort_values("importance", ascending=False)
+                        with st.expander("Top features influencing model (all predictions)"):
+                            st.table(fi_df.head(6))
 
             except Exception as e:
+                metrics.inc("analyze.errors")
                 st.error(f"Error during prediction: {e}")
+            finally:
+                metrics.observe("analyze.total", time.perf_counter() - analyze_start)
+
+        st.markdown("</div>", unsafe_allow_html=True)
+
+# ---------------------------
+# NAV: Batch
+# ---------------------------
+if nav == "Batch":
+    if not st.session_state.logged_in:
+        st.info("Please login to score a file.")
+    else:
+        st.markdown("<div class='card'>", unsafe_allow_html=True)
+        st.header("Batch scoring")
+        st.write("Upload a CSV export with the 20 feature columns; extra columns are kept in the output.")
+
+        batch_file = st.file_uploader("Survey export (.csv)", type=["csv"], key="batch_file")
+        chunksize = st.number_input("Rows per chunk", min_value=1000, max_value=200_000,
+                                    value=DEFAULT_CHUNKSIZE, step=1000)
+        to_history = st.checkbox("Save results to history", value=True)
+        explain = st.checkbox("Add per-row explanations (contrib_* columns)", value=False)
+
+        score_clicked = batch_file is not None and st.button("Score file")
+        active = get_active_model()[0] if score_clicked else None
+        if score_clicked and active is None:
+            model_unavailable_message()
+
+        if score_clicked and active is not None:
+            out_path = os.path.join(tempfile.gettempdir(), f"scored_{st.session_state.username}_{int(time.time())}.csv")
+            progress = st.progress(0.0)
+            total_bytes = max(batch_file.size, 1)
+
+            def on_chunk(rep):
+                progress.progress(min(batch_file.tell() / total_bytes, 1.0))
+
+            try:
+                with open(out_path, "w", newline="", encoding="utf-8") as out:
+                    rep = run_batch(batch_file, out, active.predictor, int(chunksize),
+                                    history=history_store if to_history else None,
+                                    username=st.session_state.username, progress=on_chunk,
+                                    explainer=get_explainer(active) if explain else None,
+                                    monitor=drift_monitor)
+                progress.progress(1.0)
+                st.success(f"Scored {rep.scored:,} of {rep.rows:,} rows in {rep.seconds:.2f}s "
+                           f"({rep.rows_per_sec:,.0f} rows/sec)")
+                if rep.skipped:
+                    st.warning(f"{rep.skipped:,} rows had missing or non-numeric features and were not scored.")
+                st.session_state.batch_output = out_path
+            except ValueError as e:
+                st.error(str(e))
+
+        out_path = st.session_state.get("batch_output")
+        if out_path and os.path.exists(out_path):
+            with open(out_path, "rb") as f:
+                st.download_button("Download scored file (CSV)", f, file_name="scored.csv")
 
         st.markdown("</div>", unsafe_allow_html=True)
 
@@ -440,84 +601,58 @@ if nav == "History":
     else:
         st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.header("Submission History & Analytics")
-
-        hist = load_history()
-        if hist.empty:
+        # Tables and chart specs are memoized per (history version, user, role);
+        # a rerun with no new rows only re-sends them
+        view = history_view(st.session_state.username, st.session_state.role)
+        if view["total"] == 0:
             st.info("No history yet.")
         else:
-            # Convert dt_iso to datetime safely
-            hist["dt_iso"] = pd.to_datetime(hist["dt_iso"], errors="coerce")
-            # Latest entries for user
-            user_hist = hist[hist["username"] == st.session_state.username].copy()
             col1, col2 = st.columns([2,1])
             with col1:
                 st.subheader("Your recent entries")
-                if not user_hist.empty:
-                    st.dataframe(user_hist.sort_values("timestamp", ascending=False).head(20))
-                    csv = user_hist.to_csv(index=False).encode("utf-8")
-                    st.download_button("Download your history (CSV)", csv, file_name=f"{st.session_state.username}_history.csv")
+                if not view["user_recent"].empty:
+                    st.dataframe(view["user_recent"])
+                    st.markdown("Download your history")
+                    export_download(f"{st.session_state.username}_history",
+                                    lambda path, fmt: export_history(history_store, path, fmt,
+                                                                     username=st.session_state.username),
+                                    key="export_user_history")
                 else:
                     st.info("You don't have personal entries yet.")
 
             with col2:
                 st.subheader("Quick stats")
-                total = len(hist)
-                unique_users = hist["username"].nunique()
-                last_week = hist[hist["dt_iso"] >= (pd.Timestamp.now() - pd.Timedelta(days=7))]
-                st.metric("Total entries", total)
-                st.metric("Unique users", unique_users)
-                st.metric("Entries last 7d", len(last_week))
+                st.metric("Total entries", view["total"])
+                st.metric("Unique users", view["unique_users"])
+                st.metric("Entries last 7d", view["last_7d"])
 
             st.markdown("---")
 
             # Analytics cards
             st.subheader("Stress distribution")
-            dist = hist["stress_level"].value_counts().sort_index().reset_index()
-            dist.columns = ["stress_level", "count"]
-            dist["label"] = dist["stress_level"].map({0:"Low",1:"Moderate",2:"High"})
-            bar = alt.Chart(dist).mark_bar(cornerRadiusTopLeft=6, cornerRadiusTopRight=6).encode(
-                x=alt.X('label:N', sort=["Low","Moderate","High"], title="Stress Level"),
-                y=alt.Y('count:Q', title="Count"),
-                color=alt.Color('label:N', scale=alt.Scale(domain=["Low","Moderate","High"], range=["#56CCF2","#FEC260","#FF6A88"])),
-                tooltip=['label','count']
-            ).properties(width=600, height=360)
-            st.altair_chart(bar, use_container_width=True)
+            st.vega_lite_chart(view["bar"], use_container_width=True)
 
             st.markdown("### Trend over time")
-            recent = hist.set_index("dt_iso").resample("7D")["stress_level"].mean().reset_index()
-            if not recent.empty:
-                line = alt.Chart(recent).mark_line(point=True).encode(
-                    x=alt.X('dt_iso:T', title='Date'),
-                    y=alt.Y('stress_level:Q', title='Average stress (0-2)'),
-                    tooltip=[alt.Tooltip('dt_iso:T', title='Date'), alt.Tooltip('stress_level:Q', title='Avg stress')]
-                ).properties(width=800, height=320)
-                area = alt.Chart(recent).mark_area(opacity=0.1).encode(
-                    x='dt_iso:T', y='stress_level:Q'
-                )
-                st.altair_chart(area + line, use_container_width=True)
+            if view["trend"] is not None:
+                st.vega_lite_chart(view["trend"], use_container_width=True)
             else:
                 st.info("Not enough data to show trend.")
 
             st.markdown("### Stress share (pie)")
-            pie_df = dist.copy()
-            if not pie_df.empty:
-                pie = alt.Chart(pie_df).mark_arc(innerRadius=50).encode(
-                    theta=alt.Theta(field="count", type="quantitative"),
-                    color=alt.Color(field="label", type="nominal", scale=alt.Scale(range=["#56CCF2","#FEC260","#FF6A88"])),
-                    tooltip=['label','count']
-                ).properties(width=350, height=350)
-                st.altair_chart(pie, use_container_width=False)
+            if view["pie"] is not None:
+                st.vega_lite_chart(view["pie"], use_container_width=False)
             else:
                 st.info("No distribution yet.")
 
             st.markdown("---")
             st.subheader("Latest site entries")
-            st.dataframe(hist.sort_values("timestamp", ascending=False).head(50))
+            st.dataframe(view["recent"])
 
             # Admin-only full download
             if st.session_state.role == "admin":
-                csv_all = hist.to_csv(index=False).encode("utf-8")
-                st.download_button("Download full history (CSV)", csv_all, file_name="history_full.csv")
+                st.markdown("Download full history")
+                export_download("history_full", lambda path, fmt: export_history(history_store, path, fmt),
+                                key="export_full_history")
 
         st.markdown("</div>", unsafe_allow_html=True)
 
@@ -530,27 +665,210 @@ if nav == "Admin":
 
     if st.session_state.role != "admin":
         st.warning("Admin-only panel.")
-        users = load_users()
         st.markdown("Promote a user (demo only)")
-        sel = st.selectbox("User", users["username"].tolist())
+        sel = st.selectbox("User", users_repo.usernames())
         if st.button("Promote to admin"):
-            users.loc[users["username"]==sel, "role"]="admin"
-            save_users(users)
+            users_repo.set_role(sel, "admin")
             st.success("User promoted.")
     else:
         st.success("Welcome, admin 👑")
-        users = load_users()
+        users = users_repo.to_frame(include_passwords=True)
         st.dataframe(users)
 
-        if st.button("Export users"):
-            st.download_button("Download users.csv", users.to_csv(index=False).encode("utf-8"))
+        st.markdown("Export users")
+        export_download("users", lambda path, fmt: export_users(users_repo, path, fmt), key="export_users")
 
         upload = st.file_uploader("Upload model (.pkl)", type=["pkl","joblib"])
         if upload:
-            with open(MODEL_FILE, "wb") as f:
-                f.write(upload.getbuffer())
+            # The uploader keeps the file across reruns; write it only once per upload
+            upload_id = getattr(upload, "file_id", None) or (upload.name, upload.size)
+            if st.session_state.get("uploaded_model_id") != upload_id:
+                # Published as a new version together with the scaler in use, so every
+                # worker process switches to the same pair
+                scaler_file = model_registry.paths()[1]
+                if os.path.exists(scaler_file):
+                    version = artifacts.write_files(upload.getbuffer(), scaler_file,
+                                                    {"source": "admin upload", "file_name": upload.name}, MODELS_DIR)
+                    artifacts.publish(version, MODELS_DIR)
+                else:
+                    write_atomic(MODEL_FILE, upload.getbuffer())
+                prediction_cache.clear()
+                st.session_state.uploaded_model_id = upload_id
             st.success("Model uploaded!")
 
+        st.subheader("Model registry")
+        active, model_reloaded = get_active_model()
+        reg = model_registry.stats()
+        if active is None:
+            model_unavailable_message()
+        else:
+            m1, m2, m3, m4, m5 = st.columns(5)
+            m1.metric("Version", reg["version"])
+            m2.metric("Load time", f"{reg['load_seconds']*1000:.0f} ms")
+            m3.metric("Swaps", reg["swaps"])
+            m4.metric("This rerun", "loaded" if model_reloaded else "cached")
+            m5.metric("Engine", reg["engine"])
+        if reg["published"]:
+            st.caption(f"Published version: models/{reg['published']} (`python artifacts.py list` to see all)")
+        if reg["last_error"]:
+            st.error(f"Last model load failed, still serving {reg['version']}: {reg['last_error']}")
+
+        st.subheader("Prediction cache")
+        cache = prediction_cache.stats()
+        c1, c2, c3, c4, c5 = st.columns(5)
+        c1.metric("Entries", f"{cache['size']} / {cache['max_entries']}")
+        c2.metric("Hit rate", "-" if cache["hit_rate"] is None else f"{cache['hit_rate']:.0%}")
+        c3.metric("Hits / misses", f"{cache['hits']} / {cache['misses']}")
+        c4.metric("Evictions", cache["evictions"] + cache["expirations"])
+        c5.metric("Warmed", cache["warmed"])
+        if st.button("Clear prediction cache"):
+            prediction_cache.clear()
+            st.success("Prediction cache cleared.")
+
+        st.subheader("History page render cache")
+        rc = render_cache.stats()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Entries", rc["entries"])
+        c2.metric("Memory", f"{rc['bytes'] / 2**20:.1f} / {rc['max_bytes'] / 2**20:.0f} MB")
+        c3.metric("Hits / misses", f"{rc['hits']} / {rc['misses']}")
+        c4.metric("Evictions", rc["evictions"])
+
+        st.subheader("History writer")
+        hw = history_writer.stats()
+        commit = metrics.snapshot()["stages"].get("history_writer.commit")
+        c1, c2, c3, c4, c5 = st.columns(5)
+        c1.metric("Durability", hw["durability"])
+        c2.metric("Queue depth", f"{hw['queue_depth']} / {hw['max_queue']}", help=f"Deepest so far: {hw['max_depth']}")
+        c3.metric("Rows committed", f"{hw['committed']} / {hw['enqueued']}")
+        c4.metric("Rows per commit", "-" if hw["rows_per_commit"] is None else f"{hw['rows_per_commit']:.1f}")
+        c5.metric("Commit p95", "-" if not commit else f"{commit['p95'] * 1000:.2f} ms")
+        if hw["errors"]:
+            st.error(f"{hw['errors']} commits failed ({hw['dropped']} rows lost); last: {hw['last_error']}")
+
+        st.subheader("Input drift")
+        if drift_monitor is None:
+            st.info("Drift monitoring is off: the training dataset (StressLevelDataset) was not found.")
+        else:
+            drift = drift_monitor.report()
+            if drift["window"] < DRIFT_MIN_SAMPLES:
+                st.info(f"Collecting: {drift['window']} of the {DRIFT_MIN_SAMPLES} predictions needed for a verdict.")
+            elif drift["retrain"]:
+                st.error(f"Retraining recommended: {drift['drifted_features']} of {len(FEATURE_COLUMNS)} features "
+                         f"have drifted from the training data"
+                         + (" and the predicted stress levels have shifted." if drift["prediction_drift"] else ".")
+                         + " `python retrain.py --publish` grows the model from recent history; "
+                         "`python train_pipeline.py` retrains from scratch.")
+            else:
+                st.success(f"No significant drift ({drift['drifted_features']} of {len(FEATURE_COLUMNS)} features drifted).")
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Window", f"{drift['window']} / {drift['window_size']}")
+            c2.metric("Observed (this process)", drift["observed"])
+            c3.metric("Reference rows", drift["reference_rows"])
+            st.dataframe(drift["table"].round(4), hide_index=True)
+            st.caption(f"PSI over {DRIFT_PSI_WARN} is 'watch', over {DRIFT_PSI_ALERT} (or KS D above its critical "
+                       f"value) 'drift'. `python drift_monitor.py` runs the same check over stored history.")
+            col = st.selectbox("Distribution", DRIFT_COLUMNS, key="drift_column")
+            values, ref_share, live_share = drift_monitor.histograms(col)
+            st.bar_chart(pd.DataFrame({"training data": ref_share, "recent inputs": live_share}, index=values))
+            if st.button("Reset drift window"):
+                drift_monitor.reset()
+                st.success("Drift window cleared.")
+
+        st.subheader("Cohort analytics")
+        history_writer.flush()
+
+        def timing(q):
+            return f"{q['seconds'] * 1000:.1f} ms" + (" (cached)" if q["cached"] else "")
+
+        tab_weekly, tab_high, tab_users = st.tabs(["Weekly stress by group", "HIGH share by answer", "User trajectories"])
+        with tab_weekly:
+            grouping = st.selectbox("Group users by", ["role", "cohort", "all"], key="cohort_group",
+                                    format_func={"role": "role", "cohort": "week of first entry", "all": "everyone"}.get)
+            weeks = st.selectbox("Period", [None, 30, 90, 365], key="cohort_days",
+                                 format_func=lambda d: "all time" if d is None else f"last {d} days")
+            q = cohort_engine.query("weekly_stress", group_by=grouping, days=weeks)
+            if q["result"].empty:
+                st.info("No history yet.")
+            else:
+                st.line_chart(q["result"])
+            st.caption(f"Mean predicted stress (0 = LOW, 2 = HIGH) per week. Query {timing(q)}")
+        with tab_high:
+            c1, c2 = st.columns(2)
+            feature = c1.selectbox("Answer", FEATURE_COLUMNS, index=FEATURE_COLUMNS.index("sleep_quality"),
+                                   key="cohort_feature")
+            split = c2.number_input("Split at (0 = per answer value)", min_value=0, max_value=10, value=0,
+                                    key="cohort_split")
+            q = cohort_engine.query("high_share", feature=feature, threshold=int(split) or None)
+            if not q["result"].empty:
+                st.bar_chart(q["result"]["high_share"])
+                st.dataframe(q["result"].assign(high_share=q["result"]["high_share"].round(3)))
+            st.caption(f"Share of HIGH predictions per answer to {feature}. Query {timing(q)}")
+        with tab_users:
+            cohort_engine.refresh()
+            picked = st.multiselect("Users", cohort_engine.usernames, default=cohort_engine.most_active(5),
+                                    key="cohort_users")
+            q = cohort_engine.query("trajectories", usernames=picked)
+            if not q["result"].empty:
+                st.line_chart(q["result"])
+            st.caption(f"Weekly mean predicted stress per user. Query {timing(q)}")
+        ce = cohort_engine.stats()
+        st.caption(f"{ce['rows']:,} rows, {ce['users']:,} users over {ce['days']} days in "
+                   f"{ce['bytes'] / 2**20:.1f} MB; last refresh "
+                   + ("-" if ce["refresh_seconds"] is None else f"{ce['refresh_seconds'] * 1000:.0f} ms")
+                   + ". `python cohorts.py bench` times the queries on a synthetic history.")
+
+        st.subheader("Startup timings")
+        startup = startup_report.report()
+        if startup["first_run"]:
+            st.table(pd.DataFrame({
+                "first run (s)": startup["first_run"],
+                "last run (s)": startup["last_run"],
+            }).round(4))
+            st.caption(f"{startup['runs']} script runs in this process. "
+                       "`python startup_report.py` measures a cold start in a fresh interpreter.")
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
+# ---------------------------
+# NAV: Metrics (admin only)
+# ---------------------------
+if nav == "Metrics":
+    st.markdown("<div class='card'>", unsafe_allow_html=True)
+    st.header("Metrics")
+
+    if st.session_state.role != "admin":
+        st.warning("Admin-only panel.")
+    else:
+        on = st.toggle("Record metrics", value=metrics.enabled())
+        if on != metrics.enabled():
+            metrics.set_enabled(on)
+        snap = metrics.snapshot()
+        st.caption(f"Since {datetime.fromtimestamp(snap['since']):%Y-%m-%d %H:%M:%S} "
+                   f"({snap['uptime_seconds']/60:.0f} min), this server process only.")
+
+        st.subheader("Stage latency (ms)")
+        if snap["stages"]:
+            stages = pd.DataFrame(snap["stages"]).T
+            for col in ["sum", "mean", "max", "p50", "p95", "p99"]:
+                stages[col] = stages[col].astype(float) * 1000
+            stages["count"] = stages["count"].astype(int)
+            st.dataframe(stages[["count", "p50", "p95", "p99", "max", "mean"]].round(3))
+        else:
+            st.info("No timings recorded yet.")
+
+        st.subheader("Counters")
+        if snap["counters"]:
+            st.table(pd.DataFrame({"count": snap["counters"]}))
+
+        d1, d2, d3 = st.columns(3)
+        d1.download_button("Prometheus text", metrics.prometheus_text(), file_name="metrics.prom")
+        d2.download_button("JSON", metrics.to_json(), file_name="metrics.json")
+        if d3.button("Reset metrics"):
+            metrics.reset()
+            st.success("Metrics reset.")
+        if METRICS_PORT:
+            st.caption(f"Also served at http://127.0.0.1:{METRICS_PORT}/metrics and /metrics.json")
+
     st.markdown("</div>", unsafe_allow_html=True)
 
 # ---------------------------
@@ -569,3 +887,5 @@ if nav == "About":
     - Neon-glow action buttons
     """)
     st.markdown("</div>", unsafe_allow_html=True)
+
+startup_report.finish_run()
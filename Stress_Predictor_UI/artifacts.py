@@ -0,0 +1,169 @@
+# artifacts.py
+# Versioned model artifacts with an atomic "current version" pointer.
+#
+# Each version is an immutable directory models/<timestamp>-<hash>/ holding
+# best_model.pkl, scaler.pkl and metadata.json; it is written under a
+# temporary name and renamed into place only when complete. models/CURRENT
+# names the version to serve and is replaced atomically, so a worker process
+# that reads it always gets a matching model/scaler pair, never one file of
+# the old version and one of the new. ModelRegistry(models_dir=...) follows
+# the pointer; publishing or rolling back is a single rename.
+#
+#   python artifacts.py list
+#   python artifacts.py publish 20250101-120000-0123456789ab
+#   python artifacts.py rollback
+#   python artifacts.py prune --keep 5
+
+import os
+import json
+import time
+import shutil
+import argparse
+from datetime import datetime
+
+from config import MODELS_DIR, MODEL_FILE, SCALER_FILE
+
+CURRENT = "CURRENT"
+MODEL_NAME = os.path.basename(MODEL_FILE)
+SCALER_NAME = os.path.basename(SCALER_FILE)
+
+
+def list_versions(models_dir=MODELS_DIR):
+    """Complete version directories, oldest first."""
+    if not os.path.isdir(models_dir):
+        return []
+    return sorted(name for name in os.listdir(models_dir)
+                  if not name.startswith(".") and os.path.isfile(os.path.join(models_dir, name, MODEL_NAME)))
+
+
+def current_version(models_dir=MODELS_DIR):
+    try:
+        with open(os.path.join(models_dir, CURRENT), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_dir(models_dir=MODELS_DIR):
+    """Directory of the published version, or None when nothing is published."""
+    version = current_version(models_dir)
+    return os.path.join(models_dir, version) if version else None
+
+
+def read_metadata(version, models_dir=MODELS_DIR):
+    try:
+        with open(os.path.join(models_dir, version, "metadata.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_version(writers, metadata=None, models_dir=MODELS_DIR, extras=None):
+    """Create a version from {file name: fn(path)} (model first); returns its directory.
+
+    The name is <timestamp>-<content hash of the files>, the same hash the
+    ModelRegistry reports as the model version. `extras` are derived files,
+    {file name: fn(path, hash)}, written after the hash and not part of it.
+    """
+    from model_registry import content_hash
+    os.makedirs(models_dir, exist_ok=True)
+    tmp = os.path.join(models_dir, f".tmp-{os.getpid()}-{int(time.time() * 1000)}")
+    os.makedirs(tmp)
+    try:
+        for name, write in writers.items():
+            write(os.path.join(tmp, name))
+        digest = content_hash(*(os.path.join(tmp, name) for name in writers))
+        for name, write in (extras or {}).items():
+            write(os.path.join(tmp, name), digest)
+        version = f"{datetime.now():%Y%m%d-%H%M%S}-{digest}"
+        metadata = dict(metadata or {}, version=version, model_hash=digest)
+        with open(os.path.join(tmp, "metadata.json"), "w") as f:
+            json.dump(metadata, f, indent=2, default=str)
+        out = os.path.join(models_dir, version)
+        try:
+            os.replace(tmp, out)
+        except OSError:
+            if not os.path.isdir(out):
+                raise
+            # Same files published twice within a second: the version already exists
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return out
+
+
+def write_files(model_src, scaler_src, metadata=None, models_dir=MODELS_DIR):
+    """New version from a model and a scaler, each given as a path or as bytes."""
+    def writer(src):
+        def write(path):
+            if isinstance(src, (bytes, bytearray, memoryview)):
+                with open(path, "wb") as f:
+                    f.write(src)
+            else:
+                shutil.copyfile(src, path)
+        return write
+    return write_version({MODEL_NAME: writer(model_src), SCALER_NAME: writer(scaler_src)}, metadata, models_dir)
+
+
+def publish(version, models_dir=MODELS_DIR):
+    """Point CURRENT at `version` (a name or a directory); returns the version name."""
+    from model_registry import write_atomic
+    version = os.path.basename(os.path.normpath(version))
+    for name in (MODEL_NAME, SCALER_NAME):
+        if not os.path.isfile(os.path.join(models_dir, version, name)):
+            raise FileNotFoundError(f"{os.path.join(models_dir, version)} has no {name}")
+    write_atomic(os.path.join(models_dir, CURRENT), version.encode("utf-8"))
+    return version
+
+
+def rollback(models_dir=MODELS_DIR):
+    """Publish the version before the current one; returns its name."""
+    versions = list_versions(models_dir)
+    current = current_version(models_dir)
+    older = [v for v in versions if current is None or v < current]
+    if not older:
+        raise ValueError("No earlier version to roll back to")
+    return publish(older[-1], models_dir)
+
+
+def prune(keep=5, models_dir=MODELS_DIR):
+    """Delete all but the `keep` newest versions; the published one is always kept."""
+    current = current_version(models_dir)
+    versions = list_versions(models_dir)
+    removed = [v for v in versions[:max(0, len(versions) - keep)] if v != current]
+    for v in removed:
+        shutil.rmtree(os.path.join(models_dir, v), ignore_errors=True)
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List, publish, roll back and prune model versions")
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list")
+    pub = sub.add_parser("publish")
+    pub.add_argument("version")
+    sub.add_parser("rollback")
+    pr = sub.add_parser("prune")
+    pr.add_argument("--keep", type=int, default=5)
+    imp = sub.add_parser("import", help=f"publish the flat {MODEL_FILE} / {SCALER_FILE} as a new version")
+    imp.add_argument("--model", default=MODEL_FILE)
+    imp.add_argument("--scaler", default=SCALER_FILE)
+    args = parser.parse_args()
+
+    if args.cmd == "list":
+        current = current_version(args.models_dir)
+        for v in list_versions(args.models_dir):
+            meta = read_metadata(v, args.models_dir)
+            score = meta.get("test_accuracy")
+            print(f"{'*' if v == current else ' '} {v}  {meta.get('candidate', meta.get('source', ''))}"
+                  + (f"  test={score:.4f}" if score is not None else ""))
+    elif args.cmd == "publish":
+        print(f"published {publish(args.version, args.models_dir)}")
+    elif args.cmd == "rollback":
+        print(f"rolled back to {rollback(args.models_dir)}")
+    elif args.cmd == "prune":
+        removed = prune(args.keep, args.models_dir)
+        print(f"removed {len(removed)} versions")
+    elif args.cmd == "import":
+        out = write_files(args.model, args.scaler, {"source": "import", "model_file": args.model}, args.models_dir)
+        print(f"published {publish(out, args.models_dir)}")
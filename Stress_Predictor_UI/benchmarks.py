@@ -0,0 +1,212 @@
+# benchmarks.py
+# Headless benchmark suite for the app's hot paths, with a baseline check.
+#
+# Builds synthetic users and history (HISTORY_COLUMNS) in a temporary SQLite
+# database at each size and times:
+#   predict.*    single-row (cold and cached) and 1000-row prediction
+#   history.*    single append, full load, per-user query
+#   dashboard.*  the History page's aggregate path (summary, distribution,
+#                7-day trend) and the raw-pandas equivalents on a loaded frame
+#                (value_counts, 7D resample, per-user filter) for reference
+#   auth.*       user lookup + password hash check, alone and after a history write
+#
+# Every case is repeated until it has run for --min-time seconds (at least
+# 3 times); the median is what gets compared. A case counts as a regression
+# when it is slower than the baseline by more than --threshold and by more
+# than --min-delta-ms, so timer noise on microsecond cases does not fail a run.
+#
+#   python benchmarks.py --sizes 1000,100000 -o bench.json
+#   python benchmarks.py --save-baseline bench_baseline.json
+#   python benchmarks.py --baseline bench_baseline.json --threshold 0.25   # exit 1 on regression
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from config import FEATURE_COLUMNS, MODEL_FILE, SCALER_FILE
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+
+
+def time_case(fn, min_time=0.2, min_repeats=3, max_repeats=1000):
+    """Run `fn` repeatedly; returns median/p95/min seconds and the repeat count."""
+    times = []
+    start = time.perf_counter()
+    while len(times) < min_repeats or (time.perf_counter() - start < min_time and len(times) < max_repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    times = np.array(times)
+    return {"median_s": float(np.median(times)), "p95_s": float(np.percentile(times, 95)),
+            "min_s": float(times.min()), "repeats": int(len(times))}
+
+
+def environment():
+    import sklearn
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "date": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+# ---------------------------
+# Cases
+# ---------------------------
+def bench_prediction(active, min_time, seed=0):
+    from prediction_cache import PredictionCache
+    rng = np.random.default_rng(seed)
+    row = rng.integers(1, 6, (1, len(FEATURE_COLUMNS))).astype(float)
+    batch = rng.integers(1, 6, (1000, len(FEATURE_COLUMNS))).astype(float)
+    cache = PredictionCache(max_entries=16, ttl_seconds=3600)
+    cache.predict(active, row)
+    return {
+        "predict.single": time_case(lambda: active.predictor.predict_proba(row), min_time),
+        "predict.single_cached": time_case(lambda: cache.predict(active, row), min_time),
+        "predict.batch_1000": time_case(lambda: active.predictor.predict_proba(batch), min_time),
+    }
+
+
+def bench_history(rows, workdir, min_time, seed=0):
+    from history_store import HistoryStore
+    from user_store import UserRepository, sha256_hash
+    from analytics import level_distribution, weekly_trend, entries_last_days
+    from columnar_history import synthetic_history
+
+    users = max(10, rows // 100)
+    df = synthetic_history(rows, users=users, seed=seed)
+    db = os.path.join(workdir, f"bench_{rows}.db")
+    store = HistoryStore(db, legacy_csv=None)
+    store.append_many(df)
+    who = df["username"].iloc[-1]
+    new_row = df.iloc[-1].to_dict()
+
+    repo = UserRepository(db, legacy_csv=None)
+    for i in range(users):
+        repo.add(f"user{i}", sha256_hash(f"pw{i}"))
+    login_name = f"USER{users // 2}"  # lookups are case-insensitive
+    login_hash = sha256_hash(f"pw{users // 2}")
+
+    def login():
+        user = repo.get(login_name)
+        assert user is not None and user["password"] == login_hash
+
+    def dashboard():
+        summary = store.summary()
+        level_distribution(summary["levels"])
+        weekly_trend(summary["daily"])
+        entries_last_days(summary["daily"], days=7)
+
+    loaded = store.load()
+
+    def pandas_resample():
+        hist = loaded.copy()
+        hist["dt_iso"] = pd.to_datetime(hist["dt_iso"])
+        return hist.set_index("dt_iso").resample("7D")["stress_level"].mean()
+
+    # The full load is slow at 1M rows; a couple of runs are enough there
+    heavy = dict(min_time=min_time, min_repeats=1 if rows >= 1_000_000 else 3)
+    out = {
+        "history.append": time_case(lambda: store.append(new_row), min_time),
+        "history.load": time_case(store.load, **heavy),
+        "history.user_query": time_case(lambda: store.user_history(who), min_time),
+        "dashboard.aggregates": time_case(dashboard, min_time),
+        "dashboard.pandas_value_counts": time_case(lambda: loaded["stress_level"].value_counts(), min_time),
+        "dashboard.pandas_resample_7d": time_case(pandas_resample, **heavy),
+        "dashboard.pandas_user_filter": time_case(lambda: loaded[loaded["username"] == who], min_time),
+        "auth.login": time_case(login, min_time),
+        # Users and history share the database file; a history write must not make the next login slow
+        "auth.login_after_write": time_case(lambda: (store.append(new_row), login()), min_time),
+    }
+    del loaded
+    return out
+
+
+def run(sizes=DEFAULT_SIZES, model_file=MODEL_FILE, scaler_file=SCALER_FILE, min_time=0.2, log=print):
+    from model_registry import ModelRegistry
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    results = {}
+    active = ModelRegistry(model_file, scaler_file, fallback_mode="off").get()
+    for name, res in bench_prediction(active, min_time).items():
+        results[name] = res
+        log(f"{name:<40} {res['median_s'] * 1000:>10.3f} ms")
+
+    workdir = tempfile.mkdtemp(prefix="stress_bench_")
+    try:
+        for rows in sizes:
+            start = time.perf_counter()
+            for name, res in bench_history(rows, workdir, min_time).items():
+                key = f"{name}@{rows}"
+                results[key] = res
+                log(f"{key:<40} {res['median_s'] * 1000:>10.3f} ms")
+            log(f"  ({rows:,} rows done in {time.perf_counter() - start:.1f}s)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {"environment": environment(), "engine": active.predictor.engine, "results": results}
+
+
+# ---------------------------
+# Baseline comparison
+# ---------------------------
+def compare(current, baseline, threshold=0.25, min_delta=50e-6):
+    """Rows of (case, baseline s, current s, ratio, regressed) for cases present in both."""
+    rows = []
+    for name, res in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        ratio = res["median_s"] / base["median_s"] if base["median_s"] else float("inf")
+        regressed = ratio > 1 + threshold and res["median_s"] - base["median_s"] > min_delta
+        rows.append((name, base["median_s"], res["median_s"], ratio, regressed))
+    return rows
+
+
+def print_comparison(rows, threshold):
+    print(f"\n{'case':<40} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}")
+    for name, base, cur, ratio, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<40} {base * 1000:>12.3f} {cur * 1000:>12.3f} {ratio:>6.2f}x{flag}")
+    bad = sum(r[4] for r in rows)
+    print(f"\n{bad} of {len(rows)} cases slower than baseline by more than {threshold:.0%}")
+    return bad
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark prediction, history I/O, auth and dashboard paths")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="history rows per run, comma-separated")
+    parser.add_argument("--model", default=MODEL_FILE)
+    parser.add_argument("--scaler", default=SCALER_FILE)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds to spend per case")
+    parser.add_argument("-o", "--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05,
+                        help="ignore slowdowns smaller than this in absolute terms")
+    parser.add_argument("--save-baseline", help="write results as the new baseline")
+    args = parser.parse_args()
+
+    current = run([int(s) for s in args.sizes.split(",")], args.model, args.scaler, args.min_time)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(current, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if print_comparison(compare(current, baseline, args.threshold, args.min_delta_ms / 1000), args.threshold):
+            sys.exit(1)
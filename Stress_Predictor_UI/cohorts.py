@@ -0,0 +1,381 @@
+# cohorts.py
+# Cohort queries for the Admin page over the whole prediction history.
+#
+# The engine keeps the history in memory as integer-coded NumPy columns: user
+# code (int32, one per distinct username), day (int32, days since 1970-01-01
+# from dt_iso, the same local date the dashboard aggregates use), stress level
+# and the 20 answers (int8, -1 for missing). About 30 bytes a row. Two CSR
+# indexes sit on top: rows by user and rows by day (argsort + offsets), so a
+# user's rows or a date range is a slice instead of a scan. Group-bys are a
+# np.bincount over a combined integer key. refresh() only reads rows with an
+# id above the last one loaded; results are memoized in the render cache
+# (render_cache.py) per history version, so a rerun with no new rows is a
+# dictionary lookup. Reading rows out of SQLite is the slow part (~10 us a
+# row), so the columns are also saved next to the database
+# (<db>.cohorts.npz) every SNAPSHOT_EVERY new rows; a new process starts from
+# that and reads only what came after.
+#
+# Queries:
+#   weekly_stress       mean stress per week, per user group (role or first-week cohort)
+#   high_share          share of HIGH predictions per answer value of one feature, or split at a threshold
+#   trajectories        weekly mean stress of selected users
+#
+#   python cohorts.py bench --rows 1000000     # query timings on a synthetic history
+
+import os
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from config import FEATURE_COLUMNS, LABEL_MAP
+from render_cache import get_render_cache
+
+GROUPINGS = ("role", "cohort", "all")
+HIGH = max(LABEL_MAP)
+SNAPSHOT_EVERY = 50_000
+_LOAD_COLUMNS = ["id", "username", "timestamp", "dt_iso", "stress_level"] + FEATURE_COLUMNS
+
+
+def _days(chunk):
+    """Days since the epoch from dt_iso's date part; rows without one fall back to the UTC day of timestamp."""
+    day = pd.to_datetime(chunk["dt_iso"].str[:10], format="%Y-%m-%d", errors="coerce")
+    out = day.to_numpy(dtype="datetime64[D]").astype(np.int64)
+    missing = day.isna().to_numpy()
+    if missing.any():
+        out[missing] = (chunk["timestamp"].to_numpy(np.float64)[missing] // 86400).astype(np.int64)
+    return out.astype(np.int32)
+
+
+def _small_ints(frame):
+    return frame.fillna(-1).to_numpy(np.int16).clip(-1, 127).astype(np.int8)
+
+
+def _week(day):
+    """Monday-based week number (1970-01-01 was a Thursday)."""
+    return (day + 3) // 7
+
+
+def _week_start(week):
+    return pd.to_datetime((np.asarray(week, dtype=np.int64) * 7 - 3).astype("datetime64[D]"))
+
+
+class _Index:
+    """CSR index: rows with key k are order[offsets[k]:offsets[k + 1]], in load order."""
+
+    def __init__(self, keys, n_keys):
+        self.order = np.argsort(keys, kind="stable").astype(np.int64)
+        self.offsets = np.zeros(n_keys + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=n_keys), out=self.offsets[1:])
+
+    def rows(self, start, stop=None):
+        """Rows with keys in [start, stop)."""
+        stop = start + 1 if stop is None else stop
+        return self.order[self.offsets[start]:self.offsets[stop]]
+
+
+class CohortEngine:
+    """Integer-coded, indexed copy of the history for cohort queries."""
+
+    def __init__(self, store, users=None, cache=None, snapshot=None):
+        self.store = store
+        self.users = users
+        self.cache = cache or get_render_cache()
+        # "" turns the snapshot off
+        self.snapshot = f"{store.path}.cohorts.npz" if snapshot is None else snapshot
+        self._unsaved = 0
+        self.usernames = []
+        self._codes = {}
+        self.seq = 0
+        self.version = None
+        self.user = np.empty(0, dtype=np.int32)
+        self.day = np.empty(0, dtype=np.int32)
+        self.stress = np.empty(0, dtype=np.int8)
+        self.features = np.empty((0, len(FEATURE_COLUMNS)), dtype=np.int8)
+        self.by_user = self.by_day = None
+        self.day0 = 0
+        self.refresh_seconds = None
+        self._lock = threading.Lock()
+
+    @property
+    def rows(self):
+        return len(self.user)
+
+    # ---------------------------
+    # Loading
+    # ---------------------------
+    def _encode_users(self, names):
+        inverse, uniques = pd.factorize(names)
+        lut = np.empty(len(uniques), dtype=np.int32)
+        for i, name in enumerate(uniques):
+            code = self._codes.get(name)
+            if code is None:
+                code = self._codes[name] = len(self.usernames)
+                self.usernames.append(name)
+            lut[i] = code
+        return lut[inverse]
+
+    def _last_timestamp(self, seq):
+        for chunk in self.store.iter_chunks(columns=["timestamp"], where="id = ?", params=(seq,)):
+            return float(chunk["timestamp"].iloc[0])
+        return None
+
+    def _load_snapshot(self, version):
+        try:
+            with np.load(self.snapshot) as z:
+                seq, last_ts = int(z["seq"]), float(z["last_ts"])
+                # Only if the database still holds the row it ended with (not replaced or restored)
+                if seq > version or self._last_timestamp(seq) != last_ts:
+                    return False
+                self.user, self.day, self.stress, self.features = z["user"], z["day"], z["stress"], z["features"]
+                self.usernames = z["usernames"].tolist()
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return False
+        self._codes = {name: i for i, name in enumerate(self.usernames)}
+        self.seq = seq
+        return True
+
+    def _save_snapshot(self):
+        tmp = f"{self.snapshot}.{os.getpid()}.tmp.npz"
+        try:
+            np.savez(tmp, user=self.user, day=self.day, stress=self.stress, features=self.features,
+                     usernames=np.array(self.usernames, dtype=str), seq=self.seq,
+                     last_ts=self._last_timestamp(self.seq))
+            os.replace(tmp, self.snapshot)
+            self._unsaved = 0
+        except OSError:
+            pass  # a read-only data directory only costs the next process a full load
+
+    def refresh(self):
+        """Load rows added since the last refresh and rebuild the indexes; no-op when nothing changed."""
+        version = self.store.version()
+        if version == self.version:
+            return False
+        with self._lock:
+            if version == self.version:
+                return False
+            start = time.perf_counter()
+            loaded = self.version is None and self.snapshot and self._load_snapshot(version)
+            parts = [(self.user, self.day, self.stress, self.features)]
+            for chunk in self.store.iter_chunks(columns=_LOAD_COLUMNS, where="id > ?", params=(self.seq,)):
+                self.seq = int(chunk["id"].max())
+                self._unsaved += len(chunk)
+                parts.append((self._encode_users(chunk["username"]), _days(chunk),
+                              _small_ints(chunk["stress_level"]), _small_ints(chunk[FEATURE_COLUMNS])))
+            if len(parts) > 1 or loaded:
+                user, day, stress, features = (np.concatenate(a) for a in zip(*parts))
+                self.day0 = int(day.min()) if len(day) else 0
+                self.by_user = _Index(user, len(self.usernames))
+                self.by_day = _Index(day - self.day0, int(day.max()) - self.day0 + 1 if len(day) else 0)
+                self.user, self.day, self.stress, self.features = user, day, stress, features
+            if self.snapshot and self._unsaved >= SNAPSHOT_EVERY:
+                self._save_snapshot()
+            self.version = version
+            self.refresh_seconds = time.perf_counter() - start
+            metrics.observe("cohorts.refresh", self.refresh_seconds)
+            return True
+
+    def _since(self, days):
+        """Rows of the last `days` days (all rows when None), from the day index."""
+        if days is None or not self.rows:
+            return None
+        first = int(self.day.max()) - days + 1 - self.day0
+        return self.by_day.rows(max(first, 0), len(self.by_day.offsets) - 1)
+
+    # ---------------------------
+    # Queries
+    # ---------------------------
+    def query(self, name, **params):
+        """Run query `name`, memoized per history version: {"result", "seconds", "cached"}."""
+        start = time.perf_counter()
+        self.refresh()
+        built = []
+
+        def build():
+            built.append(True)
+            with metrics.timer(f"cohorts.{name}"), self._lock:  # not while refresh() swaps the arrays
+                return getattr(self, name)(**params)
+
+        key = ("cohorts", name) + tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in params.items()))
+        if name == "weekly_stress" and params.get("group_by", "role") == "role" and self.users is not None:
+            # Role groups also go stale when a user's role changes
+            key += (("users", self.users.generation()),)
+        result = self.cache.get_or_build(key, self.version, build)
+        return {"result": result, "seconds": time.perf_counter() - start, "cached": not built}
+
+    def _groups(self, group_by):
+        """(group code per user, group labels)."""
+        n = len(self.usernames)
+        if group_by == "all":
+            return np.zeros(n, dtype=np.int64), ["everyone"]
+        if group_by == "role":
+            roles = []
+            for name in self.usernames:
+                user = self.users.get(name) if self.users is not None else None
+                roles.append(user["role"] if user else "unregistered")
+            codes, labels = pd.factorize(pd.Series(roles, dtype=object))
+            return codes.astype(np.int64), list(labels)
+        if group_by == "cohort":
+            # A user's cohort is the week of their first entry (their first row in the user index)
+            counts = np.diff(self.by_user.offsets)
+            first_row = self.by_user.order[np.minimum(self.by_user.offsets[:-1], self.rows - 1)]
+            first_week = np.where(counts > 0, _week(self.day[first_row]), -1)
+            weeks, codes = np.unique(first_week, return_inverse=True)
+            labels = [f"joined {d:%Y-%m-%d}" for d in _week_start(weeks)]
+            return codes.astype(np.int64), labels
+        raise ValueError(f"Unknown grouping {group_by!r}; choose from {', '.join(GROUPINGS)}")
+
+    def weekly_stress(self, group_by="role", days=None):
+        """Mean predicted stress per week (rows) and user group (columns)."""
+        if not self.rows:
+            return pd.DataFrame()
+        rows = self._since(days)
+        user = self.user if rows is None else self.user[rows]
+        stress = self.stress if rows is None else self.stress[rows]
+        week = _week(self.day if rows is None else self.day[rows]).astype(np.int64)
+        group_of_user, labels = self._groups(group_by)
+        ok = stress >= 0
+        group, week, stress = group_of_user[user[ok]], week[ok], stress[ok]
+        if not len(week):
+            return pd.DataFrame()
+        w0, n_weeks = int(week.min()), int(week.max() - week.min()) + 1
+        key = group * n_weeks + (week - w0)
+        size = len(labels) * n_weeks
+        total = np.bincount(key, weights=stress, minlength=size).reshape(len(labels), n_weeks)
+        count = np.bincount(key, minlength=size).reshape(len(labels), n_weeks)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+        out = pd.DataFrame(mean.T, index=_week_start(np.arange(w0, w0 + n_weeks)), columns=labels)
+        out.index.name = "week"
+        return out.dropna(how="all")
+
+    def high_share(self, feature, threshold=None, days=None):
+        """Share of HIGH predictions per answer value of `feature`, or for <= / > `threshold`."""
+        rows = self._since(days)
+        values = self.features[:, FEATURE_COLUMNS.index(feature)]
+        stress = self.stress
+        if rows is not None:
+            values, stress = values[rows], stress[rows]
+        ok = (values >= 0) & (stress >= 0)
+        values, high = values[ok].astype(np.int64), (stress[ok] == HIGH)
+        if threshold is not None:
+            values = (values > threshold).astype(np.int64)
+            labels = [f"<= {threshold}", f"> {threshold}"]
+        else:
+            labels = None
+        n_buckets = 2 if threshold is not None else (int(values.max()) + 1 if len(values) else 0)
+        count = np.bincount(values, minlength=n_buckets)
+        n_high = np.bincount(values, weights=high, minlength=n_buckets)
+        out = pd.DataFrame({"entries": count, "high": n_high.astype(np.int64)},
+                           index=pd.Index(labels or range(n_buckets), name=feature))
+        out = out[out["entries"] > 0]
+        out["high_share"] = out["high"] / out["entries"]
+        return out
+
+    def trajectories(self, usernames):
+        """Weekly mean stress of each user in `usernames` (weeks as rows, users as columns)."""
+        series = {}
+        for name in usernames:
+            code = self._codes.get(name)
+            if code is None:
+                continue
+            rows = self.by_user.rows(code)
+            stress = self.stress[rows]
+            ok = stress >= 0
+            week = _week(self.day[rows][ok]).astype(np.int64)
+            if not len(week):
+                continue
+            w0 = int(week.min())
+            total = np.bincount(week - w0, weights=stress[ok])
+            count = np.bincount(week - w0)
+            keep = count > 0
+            series[name] = pd.Series(total[keep] / count[keep], index=_week_start(np.arange(w0, w0 + len(count))[keep]))
+        out = pd.DataFrame(series)
+        out.index.name = "week"
+        return out
+
+    def most_active(self, n=10):
+        """Usernames with the most entries."""
+        if not self.rows:
+            return []
+        counts = np.diff(self.by_user.offsets)
+        top = np.argsort(-counts, kind="stable")[:n]
+        return [self.usernames[i] for i in top if counts[i] > 0]
+
+    def stats(self):
+        return {"rows": self.rows, "users": len(self.usernames),
+                "days": int(self.day.max() - self.day.min()) + 1 if self.rows else 0,
+                "bytes": self.user.nbytes + self.day.nbytes + self.stress.nbytes + self.features.nbytes
+                + (self.by_user.order.nbytes + self.by_day.order.nbytes if self.by_user is not None else 0),
+                "refresh_seconds": self.refresh_seconds}
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_cohort_engine(store, users=None):
+    """Process-wide CohortEngine per history store."""
+    with _engines_lock:
+        engine = _engines.get(id(store))
+        if engine is None:
+            engine = CohortEngine(store, users)
+            _engines[id(store)] = engine
+        return engine
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    from datetime import datetime
+    from history_store import HistoryStore
+    from render_cache import RenderCache
+
+    parser = argparse.ArgumentParser(description="Cohort query timings on a synthetic history")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    bench = sub.add_parser("bench")
+    bench.add_argument("--rows", type=int, default=1_000_000)
+    bench.add_argument("--users", type=int, default=5000)
+    bench.add_argument("--db", help="existing history database to query instead of a synthetic one")
+    args = parser.parse_args()
+
+    if args.db:
+        store = HistoryStore(args.db, legacy_csv=None)
+    else:
+        store = HistoryStore(os.path.join(tempfile.mkdtemp(prefix="stress_cohorts_"), "h.db"), legacy_csv=None)
+        rng = np.random.default_rng(0)
+        now = datetime.now().timestamp()
+        start = time.perf_counter()
+        for lo in range(0, args.rows, 100_000):
+            n = min(100_000, args.rows - lo)
+            ts = np.sort(rng.uniform(now - 365 * 86400, now, n))
+            frame = pd.DataFrame(rng.integers(1, 11, (n, len(FEATURE_COLUMNS))), columns=FEATURE_COLUMNS)
+            frame.insert(0, "username", [f"user{u}" for u in rng.integers(0, args.users, n)])
+            frame.insert(1, "timestamp", ts)
+            frame.insert(2, "dt_iso", pd.to_datetime(ts, unit="s").strftime("%Y-%m-%dT%H:%M:%S"))
+            frame.insert(3, "email", "")
+            frame.insert(4, "stress_level", rng.integers(0, 3, n))
+            store.append_many(frame)
+        print(f"wrote {args.rows:,} synthetic rows in {time.perf_counter() - start:.1f}s")
+
+    engine = CohortEngine(store, cache=RenderCache())
+    start = time.perf_counter()
+    engine.refresh()
+    st = engine.stats()
+    print(f"loaded {st['rows']:,} rows, {st['users']:,} users, {st['days']} days "
+          f"({st['bytes'] / 2**20:.1f} MB) in {time.perf_counter() - start:.2f}s")
+    queries = [
+        ("weekly_stress", {"group_by": "cohort"}),
+        ("weekly_stress", {"group_by": "all", "days": 30}),
+        ("high_share", {"feature": "sleep_quality"}),
+        ("high_share", {"feature": "sleep_quality", "threshold": 3}),
+        ("trajectories", {"usernames": engine.most_active(5)}),
+    ]
+    print(f"\n{'query':<52} {'first ms':>9} {'cached ms':>10}")
+    for name, params in queries:
+        first = engine.query(name, **params)["seconds"]
+        again = engine.query(name, **params)["seconds"]
+        label = name + " " + ", ".join(f"{k}={v}" for k, v in params.items() if k != "usernames")
+        print(f"{label:<52} {first * 1000:>9.2f} {again * 1000:>10.3f}")
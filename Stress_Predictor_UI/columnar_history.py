@@ -0,0 +1,299 @@
+# columnar_history.py
+# Read-optimized copy of the prediction history as month-partitioned Parquet.
+#
+# Layout: <root>/month=YYYY-MM/part-*.parquet, every file sorted by
+# (username, timestamp) and split into row groups, so a per-user or time-range
+# query only decodes the months and row groups whose min/max statistics can
+# match, and only the requested columns. The SQLite store stays the write path
+# (one row per prediction is a poor fit for Parquet); this copy is produced by
+# `convert` from history.csv / history.xlsx / the store and tidied by `compact`.
+# `convert` replaces the whole copy (built aside, then swapped in); --append
+# adds to it instead.
+#
+#   python columnar_history.py convert --source stress_app.db
+#   python columnar_history.py bench --rows 1000000
+
+import os
+import glob
+import time
+import uuid
+import shutil
+import numbers
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from config import COLUMNAR_DIR, HISTORY_CSV, HISTORY_COLUMNS, FEATURE_COLUMNS, LEGACY_HISTORY_COLUMNS
+from history_store import STORE_COLUMNS, normalize_frame
+
+ROW_GROUP_SIZE = 64_000
+_SMALL_INT_COLUMNS = ["stress_level"] + FEATURE_COLUMNS + LEGACY_HISTORY_COLUMNS
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("The columnar history needs pyarrow (pip install pyarrow)") from e
+    return pa, ds, pq
+
+
+def arrow_schema():
+    pa, _, _ = _require_pyarrow()
+    fields = [
+        pa.field("username", pa.string()),
+        pa.field("timestamp", pa.float64()),
+        pa.field("dt_iso", pa.string()),
+        pa.field("email", pa.string()),
+    ]
+    fields += [pa.field(c, pa.int16()) for c in _SMALL_INT_COLUMNS]
+    return pa.schema(fields)
+
+
+def _epoch(value):
+    # Numbers (NumPy scalars too) are epoch seconds; naive datetimes are local time, like datetime.timestamp()
+    if isinstance(value, numbers.Real):
+        return float(value)
+    return pd.Timestamp(value).to_pydatetime().timestamp()
+
+
+def _month_of(df):
+    return df["dt_iso"].astype(str).str.slice(0, 7)
+
+
+# ---------------------------
+# Writing
+# ---------------------------
+def write_frame(df, root=COLUMNAR_DIR, row_group_size=ROW_GROUP_SIZE):
+    """Append `df` (any history layout) as one sorted part file per month; returns rows written."""
+    pa, _, pq = _require_pyarrow()
+    df = normalize_frame(df)
+    df = df[df["timestamp"].notna() & df["username"].notna()]
+    for col in _SMALL_INT_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").round().astype("Int16")
+    schema = arrow_schema()
+    for month, part in df.groupby(_month_of(df), sort=True):
+        part = part.sort_values(["username", "timestamp"], kind="stable")
+        out_dir = os.path.join(root, f"month={month}")
+        os.makedirs(out_dir, exist_ok=True)
+        table = pa.Table.from_pandas(part[STORE_COLUMNS], schema=schema, preserve_index=False)
+        pq.write_table(table, os.path.join(out_dir, f"part-{uuid.uuid4().hex}.parquet"),
+                       row_group_size=row_group_size)
+    return len(df)
+
+
+def _read_source(source, chunksize):
+    ext = os.path.splitext(source)[1].lower()
+    if ext == ".csv":
+        yield from pd.read_csv(source, chunksize=chunksize)
+    elif ext in (".xlsx", ".xls"):
+        yield pd.read_excel(source)
+    elif ext == ".db":
+        from history_store import HistoryStore
+        yield from HistoryStore(source, legacy_csv=None).iter_chunks(chunksize, columns=STORE_COLUMNS)
+    else:
+        raise ValueError(f"Unsupported history source: {source}")
+
+
+def convert(source, root=COLUMNAR_DIR, chunksize=200_000, compact_after=True, append=False):
+    """Convert history.csv / history.xlsx / a store .db into the Parquet layout.
+
+    The copy is built next to `root` and swapped in when complete, so it
+    replaces whatever `root` held before (converting twice gives the same
+    data, not twice the rows). With `append` the rows are added to `root`.
+    """
+    if append:
+        written = sum(write_frame(chunk, root) for chunk in _read_source(source, chunksize))
+        if compact_after:
+            compact(root)
+        return written
+    parent = os.path.dirname(os.path.abspath(root))
+    os.makedirs(parent, exist_ok=True)
+    build = tempfile.mkdtemp(prefix=".convert-", dir=parent)
+    try:
+        written = sum(write_frame(chunk, build) for chunk in _read_source(source, chunksize))
+        if compact_after:
+            compact(build)
+        old = None
+        if os.path.exists(root):
+            old = f"{build}.old"
+            os.replace(root, old)
+        os.replace(build, root)
+        if old:
+            shutil.rmtree(old, ignore_errors=True)
+    finally:
+        shutil.rmtree(build, ignore_errors=True)
+    return written
+
+
+def compact(root=COLUMNAR_DIR, row_group_size=ROW_GROUP_SIZE):
+    """Rewrite each month with several part files as a single sorted file."""
+    pa, _, pq = _require_pyarrow()
+    for month_dir in sorted(glob.glob(os.path.join(root, "month=*"))):
+        parts = sorted(glob.glob(os.path.join(month_dir, "*.parquet")))
+        if len(parts) < 2:
+            continue
+        table = pa.concat_tables([pq.read_table(p, schema=arrow_schema()) for p in parts])
+        table = table.sort_by([("username", "ascending"), ("timestamp", "ascending")])
+        tmp = os.path.join(month_dir, f".compact-{uuid.uuid4().hex}.parquet.tmp")
+        pq.write_table(table, tmp, row_group_size=row_group_size)
+        os.replace(tmp, os.path.join(month_dir, f"part-{uuid.uuid4().hex}.parquet"))
+        for p in parts:
+            os.remove(p)
+
+
+# ---------------------------
+# Queries
+# ---------------------------
+class ColumnarHistory:
+    """Query API over the month-partitioned Parquet history."""
+
+    def __init__(self, root=COLUMNAR_DIR):
+        self.root = root
+
+    def months(self):
+        dirs = glob.glob(os.path.join(self.root, "month=*"))
+        return sorted(os.path.basename(d).split("=", 1)[1] for d in dirs)
+
+    def _scan(self, months, columns, flt):
+        _, ds, _ = _require_pyarrow()
+        files = []
+        for m in months:
+            files += sorted(glob.glob(os.path.join(self.root, f"month={m}", "*.parquet")))
+        if not files:
+            return pd.DataFrame(columns=columns)
+        dataset = ds.dataset(files, schema=arrow_schema(), format="parquet")
+        # The filter is pushed down to row-group statistics; only `columns` are decoded
+        return dataset.to_table(columns=columns, filter=flt).to_pandas()
+
+    def read(self, columns=None, username=None):
+        _, ds, _ = _require_pyarrow()
+        flt = ds.field("username") == username if username is not None else None
+        return self._scan(self.months(), columns or HISTORY_COLUMNS, flt)
+
+    def user_last_n(self, username, n=20, columns=None):
+        """A user's newest `n` rows, scanning months newest first and stopping early."""
+        _, ds, _ = _require_pyarrow()
+        columns = list(columns or HISTORY_COLUMNS)
+        scan_cols = columns if "timestamp" in columns else columns + ["timestamp"]
+        frames, found = [], 0
+        for month in reversed(self.months()):
+            part = self._scan([month], scan_cols, ds.field("username") == username)
+            if len(part):
+                frames.append(part)
+                found += len(part)
+            if found >= n:
+                break
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        out = pd.concat(frames, ignore_index=True).sort_values("timestamp", ascending=False).head(n)
+        return out[columns].reset_index(drop=True)
+
+    def time_range(self, start, end, columns=None, username=None):
+        """Rows with start <= timestamp < end (datetimes or epoch seconds)."""
+        _, ds, _ = _require_pyarrow()
+        start_ts, end_ts = _epoch(start), _epoch(end)
+        # Month partitions are named after local dt_iso; widen by a day for the UTC offset
+        first = pd.Timestamp.fromtimestamp(start_ts - 86400).strftime("%Y-%m")
+        last = pd.Timestamp.fromtimestamp(end_ts + 86400).strftime("%Y-%m")
+        months = [m for m in self.months() if first <= m <= last]
+        flt = (ds.field("timestamp") >= start_ts) & (ds.field("timestamp") < end_ts)
+        if username is not None:
+            flt = flt & (ds.field("username") == username)
+        out = self._scan(months, list(columns or HISTORY_COLUMNS), flt)
+        return out.reset_index(drop=True)
+
+
+# ---------------------------
+# Benchmark
+# ---------------------------
+def synthetic_history(rows, users=1000, days=365, seed=0):
+    """Random history rows in HISTORY_COLUMNS layout."""
+    rng = np.random.default_rng(seed)
+    end = time.time()
+    ts = np.sort(end - rng.uniform(0, days * 86400, rows))
+    df = pd.DataFrame({
+        "username": np.char.add("user", rng.integers(0, users, rows).astype(str)),
+        "timestamp": ts,
+        "dt_iso": pd.to_datetime(ts, unit="s").strftime("%Y-%m-%dT%H:%M:%S.%f"),
+        "email": "",
+        "stress_level": rng.integers(0, 3, rows),
+    })
+    for col in FEATURE_COLUMNS:
+        df[col] = rng.integers(0, 2, rows) if col in ("mental_health_history", "depression", "headache",
+                                                      "breathing_problem", "health_issues") \
+            else rng.integers(1, 11, rows)
+    return df[HISTORY_COLUMNS]
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - start, out
+
+
+def bench(rows, users=1000):
+    tmp = tempfile.mkdtemp(prefix="columnar_bench_")
+    try:
+        df = synthetic_history(rows, users)
+        csv_path = os.path.join(tmp, "history.csv")
+        df.to_csv(csv_path, index=False)
+        root = os.path.join(tmp, "parquet")
+        write_frame(df, root)
+        store = ColumnarHistory(root)
+        who = df["username"].iloc[-1]
+        end = pd.Timestamp.fromtimestamp(df["timestamp"].max())
+        start = end - pd.Timedelta(days=7)
+
+        def csv_user_recent():
+            hist = pd.read_csv(csv_path)
+            return hist[hist["username"] == who].sort_values("timestamp", ascending=False).head(20)
+
+        def csv_range():
+            hist = pd.read_csv(csv_path)
+            return hist[(hist["timestamp"] >= _epoch(start)) & (hist["timestamp"] < _epoch(end))]
+
+        def csv_column():
+            return pd.read_csv(csv_path, usecols=["stress_level"])
+
+        cases = [
+            ("user last 20", csv_user_recent, lambda: store.user_last_n(who, 20)),
+            ("last 7 days", csv_range, lambda: store.time_range(start, end)),
+            ("stress_level column", csv_column, lambda: store.read(columns=["stress_level"])),
+        ]
+        print(f"{rows:,} rows, {users:,} users")
+        print(f"{'query':<22} {'full CSV s':>11} {'parquet s':>10} {'speedup':>8}")
+        for name, slow, fast in cases:
+            t_slow, a = _timed(slow)
+            t_fast, b = _timed(fast)
+            assert len(a) == len(b), name
+            print(f"{name:<22} {t_slow:>11.3f} {t_fast:>10.3f} {t_slow/t_fast:>7.1f}x")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar (Parquet) prediction history")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    conv = sub.add_parser("convert", help="convert history.csv/.xlsx or a store .db to Parquet")
+    conv.add_argument("--source", default=HISTORY_CSV)
+    conv.add_argument("--out", default=COLUMNAR_DIR)
+    conv.add_argument("--append", action="store_true", help="add the rows to --out instead of replacing it")
+    comp = sub.add_parser("compact", help="merge each month's part files into one sorted file")
+    comp.add_argument("--root", default=COLUMNAR_DIR)
+    b = sub.add_parser("bench", help="compare against the full-CSV path on synthetic data")
+    b.add_argument("--rows", type=int, default=1_000_000)
+    b.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.cmd == "convert":
+        n = convert(args.source, args.out, append=args.append)
+        print(f"Wrote {n} rows from {args.source} to {args.out}/")
+    elif args.cmd == "compact":
+        compact(args.root)
+    elif args.cmd == "bench":
+        bench(args.rows, args.users)
@@ -0,0 +1,390 @@
+# compact_forest.py
+# Compact, memory-mapped export of the RandomForest in best_model.pkl.
+#
+# The export is one file (best_model.cforest next to the pickle) holding the
+# flattened node arrays of all trees in small dtypes:
+#   feature    int16    split feature per node
+#   threshold  float32  rounded *down* from sklearn's float64 threshold; the
+#                       trees compare float32 inputs, and for a float32 x
+#                       "x <= t" and "x <= largest float32 <= t" agree, so
+#                       every row takes exactly the same path as in sklearn
+#   children   int32    left/right child per node (leaves point to themselves)
+#   value      uint8    class distribution per node in 1/255 steps (uint16 with
+#                       --leaf-bits 16), rounded so each row sums to exactly 255
+#   cover      float32  training samples per node (for TreeSHAP)
+# plus the StandardScaler mean/scale and feature importances in float64.
+# That is 21 bytes per node with 3 classes, against 56 for CompiledForest and
+# about 90 inside a pickled sklearn tree. The only difference to the original
+# is the leaf quantization: each tree's probabilities move by at most
+# 1/(2 * 255), so predicted classes only change on near-ties (see `check`).
+#
+# load() maps the file read-only (np.memmap) instead of reading it, so load
+# time does not depend on the forest size and worker processes serving the
+# same file share one copy of its pages through the OS page cache. Loading
+# needs NumPy only, not sklearn or joblib.
+#
+#   python compact_forest.py export                 # best_model.pkl -> best_model.cforest + check
+#   python compact_forest.py check --tolerance 0.005
+#   python compact_forest.py report                 # load time and memory, pickle vs compact
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from types import SimpleNamespace
+
+import numpy as np
+
+import metrics
+from config import MODEL_FILE, SCALER_FILE, DATASET_FILE
+
+MAGIC = b"CFOREST1"
+ALIGN = 64
+EXTENSION = ".cforest"
+DEFAULT_LEAF_BITS = 8
+
+# Largest accuracy drop on StressLevelDataset that `check` accepts (0.005 = half a point)
+DEFAULT_TOLERANCE = 0.005
+
+
+def compact_path(model_file):
+    """Where the compact export of `model_file` lives: same name, .cforest extension."""
+    return os.path.splitext(model_file)[0] + EXTENSION
+
+
+def round_down_float32(values):
+    """Largest float32 <= each float64 value."""
+    values = np.asarray(values, dtype=np.float64)
+    out = values.astype(np.float32)
+    above = out.astype(np.float64) > values
+    out[above] = np.nextafter(out[above], np.float32(-np.inf))
+    return out
+
+
+def quantize_distributions(values, bits=DEFAULT_LEAF_BITS):
+    """Rows of probabilities -> unsigned integers summing to 2**bits - 1 (largest remainder rounding)."""
+    q = (1 << bits) - 1
+    scaled = np.asarray(values, dtype=np.float64) * q
+    base = np.floor(scaled)
+    short = np.rint(q - base.sum(axis=1)).astype(np.int64)
+    # Hand the missing units to the entries with the largest remainders
+    order = np.argsort(base - scaled, axis=1, kind="stable")
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(values.shape[1])[None, :], axis=1)
+    base += rank < short[:, None]
+    return base.astype(np.uint8 if bits <= 8 else np.uint16)
+
+
+# ---------------------------
+# File format: MAGIC, uint64 header length, JSON header, 64-byte aligned arrays
+# ---------------------------
+def _write_file(path, arrays, meta):
+    layout, offset = {}, 0
+    for name, arr in arrays.items():
+        layout[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset += -(-arr.nbytes // ALIGN) * ALIGN
+    header = json.dumps({"meta": meta, "arrays": layout}).encode("utf-8")
+    start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + np.uint64(len(header)).tobytes() + header)
+        for name, arr in arrays.items():
+            f.seek(start + layout[name]["offset"])
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(start + offset)
+    os.replace(tmp, path)
+
+
+def _read_file(path):
+    mm = np.memmap(path, dtype=np.uint8, mode="r")
+    if bytes(mm[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{path} is not a compact forest file")
+    header_len = int(mm[len(MAGIC):len(MAGIC) + 8].view(np.uint64)[0])
+    header = json.loads(bytes(mm[len(MAGIC) + 8:len(MAGIC) + 8 + header_len]).decode("utf-8"))
+    start = -(-(len(MAGIC) + 8 + header_len) // ALIGN) * ALIGN
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        begin = start + spec["offset"]
+        arrays[name] = mm[begin:begin + count * dtype.itemsize].view(dtype).reshape(spec["shape"])
+    return header["meta"], arrays
+
+
+def export(model, scaler, path, leaf_bits=DEFAULT_LEAF_BITS, source_version=None):
+    """Write the compact form of a fitted RandomForest/ExtraTrees classifier (+ StandardScaler)."""
+    from forest_engine import _leaf_values, is_supported
+    if not is_supported(model, scaler):
+        raise ValueError(f"{type(model).__name__} cannot be exported; only RandomForest/ExtraTrees classifiers")
+    if leaf_bits not in (8, 16):
+        raise ValueError("leaf_bits must be 8 or 16")
+    n_features = int(model.n_features_in_)
+    if n_features > np.iinfo(np.int16).max:
+        raise ValueError(f"{n_features} features do not fit int16 feature indices")
+
+    trees = [est.tree_ for est in model.estimators_]
+    n_classes = int(model.n_classes_)
+    counts = np.array([t.node_count for t in trees])
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    if counts.sum() * 2 > np.iinfo(np.int32).max:
+        raise ValueError("Too many nodes for int32 child indices")
+
+    feature, threshold, children, value, cover = [], [], [], [], []
+    for off, t in zip(offsets, trees):
+        is_leaf = t.children_left == -1
+        idx = np.arange(t.node_count) + off
+        children.append(np.stack([np.where(is_leaf, idx, t.children_left + off),
+                                  np.where(is_leaf, idx, t.children_right + off)], axis=1))
+        feature.append(np.where(is_leaf, 0, t.feature))
+        threshold.append(np.where(is_leaf, 0.0, t.threshold))
+        value.append(_leaf_values(t, n_classes))
+        cover.append(t.weighted_n_node_samples)
+
+    arrays = {
+        "roots": offsets.astype(np.int32),
+        "feature": np.concatenate(feature).astype(np.int16),
+        "threshold": round_down_float32(np.concatenate(threshold)),
+        "children": np.concatenate(children).astype(np.int32).ravel(),
+        "value": quantize_distributions(np.concatenate(value), leaf_bits),
+        "cover": np.concatenate(cover).astype(np.float32),
+    }
+    if scaler is not None and scaler.with_mean:
+        arrays["mean"] = scaler.mean_.astype(np.float64)
+    if scaler is not None and scaler.with_std:
+        arrays["scale"] = scaler.scale_.astype(np.float64)
+    importances = getattr(model, "feature_importances_", None)
+    if importances is not None:
+        arrays["importances"] = np.asarray(importances, dtype=np.float64)
+    meta = {
+        "estimator": type(model).__name__,
+        "n_trees": len(trees),
+        "n_features": n_features,
+        "classes": np.asarray(model.classes_).tolist(),
+        "max_depth": max(int(t.max_depth) for t in trees),
+        "leaf_bits": leaf_bits,
+        "source_version": source_version,
+    }
+    _write_file(path, arrays, meta)
+    return path
+
+
+class CompactForest:
+    """Predictor over a memory-mapped compact export; same interface as forest_engine.CompiledForest."""
+
+    engine = "compact"
+
+    def __init__(self, path):
+        start = time.perf_counter()
+        self.path = path
+        meta, arrays = _read_file(path)
+        self.meta = meta
+        self.source_version = meta.get("source_version")
+        self.n_trees = int(meta["n_trees"])
+        self.n_features = int(meta["n_features"])
+        self.max_depth = int(meta["max_depth"])
+        self.classes_ = np.asarray(meta["classes"])
+        self.roots = arrays["roots"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.children = arrays["children"]
+        self.value = arrays["value"]
+        self.cover = arrays["cover"]
+        self.mean = arrays.get("mean")
+        self.scale = arrays.get("scale")
+        self.feature_importances_ = arrays.get("importances")
+        self.quantum = float((1 << int(meta["leaf_bits"])) - 1)
+        self.load_seconds = time.perf_counter() - start
+
+    def transform(self, X):
+        X = np.array(X, dtype=np.float64)
+        if self.mean is not None:
+            X -= self.mean
+        if self.scale is not None:
+            X /= self.scale
+        return X
+
+    def apply(self, Xs):
+        """Leaf index (into the flattened arrays) of every row in every tree."""
+        X32 = np.ascontiguousarray(Xs, dtype=np.float32)
+        n, n_features = X32.shape
+        flat = X32.ravel()
+        row_base = (np.arange(n) * n_features)[:, None]
+        node = np.repeat(self.roots[None, :], n, axis=0)
+        for _ in range(self.max_depth):
+            go_right = ~(flat.take(row_base + self.feature.take(node)) <= self.threshold.take(node))
+            node = self.children.take(2 * node + go_right)
+        return node
+
+    def predict_proba(self, X):
+        from forest_engine import BLOCK_ROWS
+        with metrics.timer("inference.scale"):
+            Xs = self.transform(X)
+        with metrics.timer("inference.model"):
+            out = np.empty((Xs.shape[0], self.value.shape[1]))
+            for start in range(0, Xs.shape[0], BLOCK_ROWS):
+                leaves = self.apply(Xs[start:start + BLOCK_ROWS])
+                # Integer sum over trees, one division at the end
+                out[start:start + BLOCK_ROWS] = self.value[leaves].sum(axis=1, dtype=np.uint32)
+            out /= self.quantum * self.n_trees
+            return out
+
+    def predict(self, X):
+        return self.classes_.take(self.predict_proba(X).argmax(axis=1))
+
+    def tree_views(self):
+        """Per-tree (sklearn-Tree-like view, leaf distributions) pairs, for tree_shap.TreeExplainer."""
+        ends = np.append(self.roots[1:], len(self.feature))
+        for off, end in zip(self.roots.astype(np.int64), ends.astype(np.int64)):
+            idx = np.arange(off, end)
+            left, right = self.children[2 * off:2 * end:2] - off, self.children[2 * off + 1:2 * end:2] - off
+            is_leaf = left == idx - off
+            tree = SimpleNamespace(
+                children_left=np.where(is_leaf, -1, left),
+                children_right=np.where(is_leaf, -1, right),
+                feature=self.feature[off:end].astype(np.intp),
+                threshold=self.threshold[off:end].astype(np.float64),
+                weighted_n_node_samples=self.cover[off:end].astype(np.float64),
+            )
+            yield tree, self.value[off:end].astype(np.float64) / self.quantum
+
+
+def load(path):
+    return CompactForest(path)
+
+
+# ---------------------------
+# Accuracy check
+# ---------------------------
+def check(model, scaler, forest, dataset=DATASET_FILE):
+    """Accuracy of the original and the compact forest on the dataset, plus how far they differ."""
+    import pandas as pd
+    from forest_engine import SklearnPredictor
+    data = pd.read_csv(dataset)
+    X = data.drop(columns=["stress_level"]).to_numpy(dtype=float)
+    y = data["stress_level"].to_numpy()
+    ref = SklearnPredictor(model, scaler).predict_proba(X)
+    out = forest.predict_proba(X)
+    classes = np.asarray(forest.classes_)
+    acc_ref = float((classes[ref.argmax(axis=1)] == y).mean())
+    acc_out = float((classes[out.argmax(axis=1)] == y).mean())
+    return {
+        "rows": len(X),
+        "accuracy_original": acc_ref,
+        "accuracy_compact": acc_out,
+        "accuracy_drop": acc_ref - acc_out,
+        "prediction_agreement": float((ref.argmax(axis=1) == out.argmax(axis=1)).mean()),
+        "max_probability_error": float(np.abs(ref - out).max()),
+    }
+
+
+def print_check(res, tolerance):
+    print(f"StressLevelDataset ({res['rows']} rows): accuracy {res['accuracy_original']:.4f} -> "
+          f"{res['accuracy_compact']:.4f}, same class for {res['prediction_agreement']:.2%} of rows, "
+          f"max |probability difference| {res['max_probability_error']:.2e}")
+    ok = res["accuracy_drop"] <= tolerance
+    print(f"accuracy drop {res['accuracy_drop']:+.4f} {'within' if ok else 'OUTSIDE'} tolerance {tolerance}")
+    return ok
+
+
+# ---------------------------
+# Load time and memory
+# ---------------------------
+def memory_usage():
+    """RSS, PSS and private bytes of this process (Linux /proc; RSS only elsewhere, None if unknown)."""
+    try:
+        out = {}
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                    out[key] = int(rest.split()[0]) * 1024
+        return {"rss": out["Rss"], "pss": out["Pss"], "private": out["Private_Clean"] + out["Private_Dirty"]}
+    except (OSError, KeyError):
+        pass
+    try:
+        import psutil
+        return {"rss": psutil.Process().memory_info().rss, "pss": None, "private": None}
+    except ImportError:
+        return {"rss": None, "pss": None, "private": None}
+
+
+_PROBE = r"""
+import sys, json, time
+sys.path.insert(0, sys.argv[1])
+import numpy as np
+import compact_forest
+from config import FEATURE_COLUMNS
+mode, rows = sys.argv[2], int(sys.argv[5])
+before = compact_forest.memory_usage()
+start = time.perf_counter()
+if mode == "pickle":
+    import joblib
+    from forest_engine import make_predictor
+    predictor = make_predictor(joblib.load(sys.argv[3]), joblib.load(sys.argv[4]))
+else:
+    predictor = compact_forest.load(sys.argv[3])
+loaded = time.perf_counter() - start
+X = np.random.default_rng(0).integers(1, 11, (rows, len(FEATURE_COLUMNS))).astype(float)
+start = time.perf_counter()
+predictor.predict_proba(X)
+first = time.perf_counter() - start
+after = compact_forest.memory_usage()
+print(json.dumps({"load_seconds": loaded, "first_predict_seconds": first, "before": before, "after": after}))
+"""
+
+
+def measure(mode, model_file, scaler_file, compact_file, rows=1000):
+    """Load a predictor in a fresh interpreter; returns load time and memory before/after."""
+    target = compact_file if mode == "compact" else model_file
+    out = subprocess.run([sys.executable, "-c", _PROBE, os.path.dirname(os.path.abspath(__file__)),
+                          mode, target, scaler_file, str(rows)], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def print_report(model_file, scaler_file, compact_file):
+    mb = lambda v: "-" if v is None else f"{v / 2**20:.1f}"
+    print(f"{'':<8} {'file MB':>8} {'load ms':>9} {'1st predict ms':>15} {'+RSS MB':>8} {'+PSS MB':>8} {'+private MB':>12}")
+    for mode, size in (("pickle", os.path.getsize(model_file)), ("compact", os.path.getsize(compact_file))):
+        res = measure(mode, model_file, scaler_file, compact_file)
+        delta = {k: (res["after"][k] - res["before"][k]) if res["after"][k] is not None else None
+                 for k in ("rss", "pss", "private")}
+        print(f"{mode:<8} {size / 2**20:>8.2f} {res['load_seconds'] * 1000:>9.1f} "
+              f"{res['first_predict_seconds'] * 1000:>15.1f} {mb(delta['rss']):>8} {mb(delta['pss']):>8} "
+              f"{mb(delta['private']):>12}")
+    print("(fresh process each; load includes the imports it needs; 1000-row first predict. "
+          "Compact pages are file-backed and shared by every process mapping the same file.)")
+
+
+if __name__ == "__main__":
+    import warnings
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    parser = argparse.ArgumentParser(description="Export, check and measure the compact forest format")
+    parser.add_argument("command", choices=["export", "check", "report"])
+    parser.add_argument("--model", default=MODEL_FILE)
+    parser.add_argument("--scaler", default=SCALER_FILE)
+    parser.add_argument("-o", "--output", help="compact file (default: next to the model, .cforest)")
+    parser.add_argument("--leaf-bits", type=int, default=DEFAULT_LEAF_BITS, choices=[8, 16])
+    parser.add_argument("--dataset", default=DATASET_FILE)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="largest accepted accuracy drop on the dataset")
+    args = parser.parse_args()
+    output = args.output or compact_path(args.model)
+
+    if args.command == "report":
+        print_report(args.model, args.scaler, output)
+        sys.exit(0)
+
+    import joblib
+    from model_registry import content_hash
+    model, scaler = joblib.load(args.model), joblib.load(args.scaler)
+    if args.command == "export":
+        export(model, scaler, output, args.leaf_bits, source_version=content_hash(args.model, args.scaler))
+        print(f"Wrote {output} ({os.path.getsize(output) / 2**20:.2f} MB; "
+              f"pickle {os.path.getsize(args.model) / 2**20:.2f} MB)")
+    if os.path.exists(args.dataset):
+        if not print_check(check(model, scaler, load(output), args.dataset), args.tolerance):
+            sys.exit(1)
+    elif args.command == "check":
+        raise SystemExit(f"{args.dataset} not found")
@@ -0,0 +1,105 @@
+# config.py
+# Shared constants for the Streamlit app and the helper modules next to it.
+
+import os
+
+# ---------------------------
+# Files
+# ---------------------------
+# Directory for users, history and models (default: the working directory).
+# Every worker of a multi-process deployment points it at the same place.
+DATA_DIR = os.environ.get("STRESS_DATA_DIR", "")
+
+USERS_CSV = os.path.join(DATA_DIR, "users.csv")
+HISTORY_CSV = os.path.join(DATA_DIR, "history.csv")
+MODEL_FILE = os.path.join(DATA_DIR, "best_model.pkl")
+SCALER_FILE = os.path.join(DATA_DIR, "scaler.pkl")
+DB_FILE = os.path.join(DATA_DIR, "stress_app.db")
+COLUMNAR_DIR = os.path.join(DATA_DIR, "history_parquet")
+
+# Storage backend for users and history (storage.py): "sqlite" or "sqlite-split"
+STORAGE_BACKEND = os.environ.get("STRESS_STORAGE", "sqlite")
+
+# Training (train_pipeline.py)
+DATASET_FILE = os.path.join("..", "StressLevelDataset.xls")   # CSV text despite the extension
+MODELS_DIR = os.path.join(DATA_DIR, "models")   # versioned artifacts: models/<version>/, models/CURRENT
+TRAIN_CACHE_DIR = ".train_cache"     # per-fold CV scores, so reruns only fit new grid points
+
+# ---------------------------
+# Inference
+# ---------------------------
+# Use the flattened NumPy forest (forest_engine.py) instead of sklearn's predict
+USE_COMPILED_FOREST = os.environ.get("STRESS_COMPILED_FOREST", "1") != "0"
+
+# What to do when best_model.pkl / scaler.pkl are missing:
+#   "background" - train the placeholder model on a thread, serve once it is ready
+#   "sync"       - train it inside the first request (old behaviour)
+#   "off"        - do nothing; run `python fallback_model.py` offline
+FALLBACK_MODE = os.environ.get("STRESS_FALLBACK_MODEL", "background")
+
+# Serve the memory-mapped compact export (compact_forest.py: best_model.cforest
+# next to the pickle) when there is one made from the same model files; the
+# pickle, and sklearn, are then not loaded at all
+USE_COMPACT_MODEL = os.environ.get("STRESS_COMPACT_MODEL", "1") != "0"
+
+# Prediction cache (prediction_cache.py): entries kept (0 disables), seconds an
+# entry stays valid, and how many of the most frequent history vectors to
+# pre-compute after each model load (0 disables warming)
+PREDICTION_CACHE_SIZE = int(os.environ.get("STRESS_PREDICTION_CACHE", 4096))
+PREDICTION_CACHE_TTL = float(os.environ.get("STRESS_PREDICTION_CACHE_TTL", 3600))
+PREDICTION_CACHE_WARM = int(os.environ.get("STRESS_PREDICTION_CACHE_WARM", 256))
+
+# Memory budget for memoized History page tables and chart specs (render_cache.py)
+RENDER_CACHE_BYTES = int(float(os.environ.get("STRESS_RENDER_CACHE_MB", 64)) * 1024 * 1024)
+
+# Background history writer (history_writer.py): "async" returns as soon as a
+# row is queued, "fsync" waits until its group commit is on disk. The queue
+# holds this many submissions before append blocks; one commit takes at most
+# HISTORY_BATCH_ROWS rows
+HISTORY_DURABILITY = os.environ.get("STRESS_HISTORY_DURABILITY", "async")
+HISTORY_QUEUE_SIZE = int(os.environ.get("STRESS_HISTORY_QUEUE", 10_000))
+HISTORY_BATCH_ROWS = int(os.environ.get("STRESS_HISTORY_BATCH", 500))
+
+# ---------------------------
+# Drift monitor (drift_monitor.py)
+# ---------------------------
+# Sliding window of recent predictions compared with StressLevelDataset, and
+# the smallest window that gets a verdict
+DRIFT_WINDOW = int(os.environ.get("STRESS_DRIFT_WINDOW", 1000))
+DRIFT_MIN_SAMPLES = int(os.environ.get("STRESS_DRIFT_MIN_SAMPLES", 100))
+# PSI above WARN marks a feature "watch", above ALERT (or a KS test failing at
+# KS_ALPHA) "drift"; retraining is recommended when at least RETRAIN_SHARE of
+# the features drift or the predicted stress levels do
+DRIFT_PSI_WARN = 0.1
+DRIFT_PSI_ALERT = 0.25
+DRIFT_KS_ALPHA = 0.05
+DRIFT_RETRAIN_SHARE = 0.25
+
+# ---------------------------
+# Metrics (metrics.py)
+# ---------------------------
+# Stage timers and counters on the prediction path; "0" turns recording off entirely
+METRICS_ENABLED = os.environ.get("STRESS_METRICS", "1") != "0"
+# Port for the /metrics and /metrics.json endpoint of the Streamlit process (0 = none)
+METRICS_PORT = int(os.environ.get("STRESS_METRICS_PORT", 0))
+
+# ---------------------------
+# Columns (20 feature set + metadata)
+# ---------------------------
+FEATURE_COLUMNS = [
+    "anxiety_level","self_esteem","mental_health_history","depression","headache",
+    "blood_pressure","sleep_quality","breathing_problem","living_conditions","safety",
+    "basic_needs","academic_performance","study_load","teacher_student_relationship","future_career_concerns",
+    "social_support","peer_pressure","extracurricular_activities","screen_time","health_issues"
+]
+
+HISTORY_COLUMNS = ["username","timestamp","dt_iso","email","stress_level"] + FEATURE_COLUMNS
+
+# Yes/no inputs (0/1); every other feature is a 1-10 slider on the Analyze page
+BINARY_FEATURES = ["mental_health_history","depression","headache","breathing_problem","health_issues"]
+
+# Model output classes
+LABEL_MAP = {0:("LOW","🌟"), 1:("MODERATE","⚠"), 2:("HIGH","🚨")}
+
+# Columns written by older versions of the app that are still present in history.csv
+LEGACY_HISTORY_COLUMNS = ["noise_level", "bullying"]
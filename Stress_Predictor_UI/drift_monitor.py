@@ -0,0 +1,243 @@
+# drift_monitor.py
+# Streaming input-drift monitor: incoming feature vectors and predicted
+# stress levels against the training data in StressLevelDataset.
+#
+# The reference for each model input is the dataset column the model was
+# trained on at that position (the model reads the 20 inputs positionally, see
+# train_pipeline.py), so the comparison is between what the model learned from
+# and what it is asked now. The dataset does not use the app's input contract
+# (1-10 sliders and yes/no boxes): anxiety runs 0-21, self-esteem 0-30, most
+# others 0-5, and some yes/no inputs are 0-5 or 0-27 scores there. Comparing
+# raw values would flag nearly every feature on any traffic, so both sides are
+# put on a shared grid first: each column gets as many bins as the coarser of
+# its two scales has values, and each side is mapped linearly onto them
+# (0-5 against 1-10 gives six bins; a 0-27 score against a yes/no box gives
+# two). Means and histograms are reported on the app's scale. The statistics
+# are then exact over those bins:
+#   PSI  sum (live - ref) * ln(live / ref) over bins (shares smoothed by 1e-4)
+#   KS   largest gap between the two cumulative distributions, compared with
+#        the two-sample critical value at DRIFT_KS_ALPHA
+# The window is a ring buffer of the last DRIFT_WINDOW observations, stored as
+# bin indices. Each prediction adds one to its bins and subtracts one from the
+# bins of the observation it replaces, so memory is fixed and history is
+# never rescanned. At startup the window is filled once from the newest
+# history rows. The monitor is per process; every worker judges its own traffic.
+#
+#   python drift_monitor.py            # fill the window from history and print the report
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from config import (
+    FEATURE_COLUMNS, BINARY_FEATURES, LABEL_MAP, DATASET_FILE,
+    DRIFT_WINDOW, DRIFT_MIN_SAMPLES, DRIFT_PSI_WARN, DRIFT_PSI_ALERT, DRIFT_KS_ALPHA, DRIFT_RETRAIN_SHARE,
+)
+
+TARGET = "stress_level"
+COLUMNS = FEATURE_COLUMNS + [TARGET]
+PSI_EPSILON = 1e-4
+
+# Value range the app accepts per input (Analyze page sliders and yes/no boxes)
+_LIVE_RANGE = {c: (0, 1) if c in BINARY_FEATURES else (1, 10) for c in FEATURE_COLUMNS}
+_LIVE_RANGE[TARGET] = (min(LABEL_MAP), max(LABEL_MAP))
+
+
+def load_reference(path=DATASET_FILE):
+    """Training inputs under the app's names (positional, as the model sees them) plus stress_level."""
+    data = pd.read_csv(path)
+    X = data.drop(columns=[TARGET]).iloc[:, :len(FEATURE_COLUMNS)]
+    X.columns = FEATURE_COLUMNS
+    X[TARGET] = data[TARGET].to_numpy()
+    return X.round().astype(np.int64)
+
+
+def _grid(values, low, step, bins):
+    """Bin index of each value on a grid of `bins` points starting at `low`, `step` apart.
+
+    Values between points go to the nearest one (halves round up); out-of-range
+    values land in the first/last bin.
+    """
+    idx = np.floor((values - low) / np.where(step > 0, step, 1) + 0.5)
+    return np.clip(idx, 0, bins - 1).astype(np.int64)
+
+
+def ks_critical(n, m, alpha=DRIFT_KS_ALPHA):
+    """Two-sample KS critical value for sample sizes n and m."""
+    return np.sqrt(-np.log(alpha / 2) / 2) * np.sqrt((n + m) / (n * m))
+
+
+class DriftMonitor:
+    """Sliding-window histograms of incoming vectors, with PSI/KS against a reference sample."""
+
+    def __init__(self, reference, window=DRIFT_WINDOW):
+        self.window = int(window)
+        self.reference_rows = len(reference)
+        self.low, self.step, self.bins, self.offsets, self.values = [], [], [], [], []
+        ref_counts = []
+        offset = 0
+        for col in COLUMNS:
+            lo_live, hi_live = _LIVE_RANGE[col]
+            lo_ref, hi_ref = int(reference[col].min()), int(reference[col].max())
+            bins = min(hi_live - lo_live, hi_ref - lo_ref) + 1
+            # Live values map onto the grid with lo_live + step * bin
+            step = (hi_live - lo_live) / max(bins - 1, 1)
+            self.low.append(lo_live)
+            self.step.append(step)
+            self.bins.append(bins)
+            self.offsets.append(offset)
+            self.values.append(lo_live + step * np.arange(bins))
+            ref_step = (hi_ref - lo_ref) / max(bins - 1, 1)
+            ref_idx = _grid(reference[col].to_numpy(), lo_ref, ref_step, bins)
+            ref_counts.append(np.bincount(ref_idx, minlength=bins))
+            offset += bins
+        self.low = np.array(self.low, dtype=np.float64)
+        self.step = np.array(self.step)
+        self.bins = np.array(self.bins)
+        self.offsets = np.array(self.offsets)
+        self.reference = np.concatenate(ref_counts).astype(np.float64)
+        self.reference_mean = np.array([(self.reference[o:o + b] * v).sum() / self.reference_rows
+                                        for o, b, v in zip(self.offsets, self.bins, self.values)])
+
+        self._buffer = np.zeros((self.window, len(COLUMNS)), dtype=np.int32)   # bin index per column
+        self._counts = np.zeros(offset, dtype=np.int64)
+        self._size = 0
+        self._pos = 0
+        self.observed = 0
+        self._lock = threading.Lock()
+        self.seeded = False
+
+    def _bin_rows(self, X, preds):
+        values = np.column_stack([np.asarray(X, dtype=np.float64), np.asarray(preds, dtype=np.float64)])
+        return (_grid(values, self.low, self.step, self.bins) + self.offsets).astype(np.int32)
+
+    def observe(self, X, preds):
+        """Add rows of the 20 features and their predicted stress levels to the window."""
+        rows = self._bin_rows(np.atleast_2d(X), np.atleast_1d(preds))
+        if len(rows) > self.window:
+            rows = rows[-self.window:]
+        k = len(rows)
+        with metrics.timer("drift.observe"), self._lock:
+            slots = (self._pos + np.arange(k)) % self.window
+            # Until the window is full the slots ahead of _pos are empty
+            evicted = slots if self._size == self.window else slots[self.window - self._size:]
+            np.subtract.at(self._counts, self._buffer[evicted].ravel(), 1)
+            self._buffer[slots] = rows
+            np.add.at(self._counts, rows.ravel(), 1)
+            self._size = min(self.window, self._size + k)
+            self._pos = (self._pos + k) % self.window
+            self.observed += k
+        metrics.inc("drift.observations", k)
+
+    def seed(self, frame):
+        """Fill the window from history rows (oldest first) once per process."""
+        if self.seeded:
+            return
+        self.seeded = True
+        frame = frame.dropna(subset=COLUMNS)
+        if len(frame):
+            self.observe(frame[FEATURE_COLUMNS].to_numpy(), frame[TARGET].to_numpy())
+
+    def reset(self):
+        with self._lock:
+            self._counts[:] = 0
+            self._size = self._pos = 0
+
+    def histograms(self, column):
+        """(values, reference share, window share) for one column."""
+        j = COLUMNS.index(column)
+        sl = slice(self.offsets[j], self.offsets[j] + self.bins[j])
+        with self._lock:
+            live = self._counts[sl].astype(np.float64)
+            n = self._size
+        ref = self.reference[sl] / self.reference_rows
+        return self.values[j], ref, live / n if n else live
+
+    def report(self):
+        """Per-column PSI/KS over the current window and the overall verdict."""
+        with self._lock:
+            counts = self._counts.astype(np.float64)
+            n = self._size
+            observed = self.observed
+        m = self.reference_rows
+        rows = []
+        for j, col in enumerate(COLUMNS):
+            sl = slice(self.offsets[j], self.offsets[j] + self.bins[j])
+            ref = self.reference[sl] / m
+            values = self.values[j]
+            if n:
+                live = counts[sl] / n
+                p, q = np.clip(live, PSI_EPSILON, None), np.clip(ref, PSI_EPSILON, None)
+                psi = float(((p - q) * np.log(p / q)).sum())
+                ks = float(np.abs(np.cumsum(live) - np.cumsum(ref)).max())
+                mean = float((live * values).sum())
+            else:
+                psi = ks = mean = float("nan")
+            crit = float(ks_critical(n, m)) if n else float("nan")
+            if n < DRIFT_MIN_SAMPLES:
+                status = "collecting"
+            elif psi >= DRIFT_PSI_ALERT or ks > crit:
+                status = "drift"
+            elif psi >= DRIFT_PSI_WARN:
+                status = "watch"
+            else:
+                status = "ok"
+            rows.append({"column": col, "reference_mean": float(self.reference_mean[j]), "window_mean": mean,
+                         "psi": psi, "ks": ks, "ks_critical": crit, "status": status})
+
+        table = pd.DataFrame(rows)
+        features = table[table["column"] != TARGET]
+        drifted = int((features["status"] == "drift").sum())
+        target = table[table["column"] == TARGET].iloc[0]
+        retrain = n >= DRIFT_MIN_SAMPLES and (
+            drifted / len(features) >= DRIFT_RETRAIN_SHARE or target["status"] == "drift")
+        return {
+            "window": n,
+            "window_size": self.window,
+            "observed": observed,
+            "reference_rows": m,
+            "drifted_features": drifted,
+            "prediction_drift": target["status"] == "drift",
+            "retrain": bool(retrain),
+            "table": table,
+        }
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_drift_monitor(dataset=DATASET_FILE):
+    """Process-wide DriftMonitor; None when the reference dataset is not available."""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            try:
+                _monitor = DriftMonitor(load_reference(dataset))
+            except (FileNotFoundError, KeyError, ValueError):
+                return None
+        return _monitor
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import DB_FILE
+    from history_store import HistoryStore
+
+    parser = argparse.ArgumentParser(description="Input drift of the newest history rows vs StressLevelDataset")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--dataset", default=DATASET_FILE)
+    parser.add_argument("--window", type=int, default=DRIFT_WINDOW)
+    args = parser.parse_args()
+
+    monitor = DriftMonitor(load_reference(args.dataset), window=args.window)
+    store = HistoryStore(args.db, legacy_csv=None)
+    monitor.seed(store.recent(args.window, columns=COLUMNS).iloc[::-1])
+    rep = monitor.report()
+    with pd.option_context("display.width", 120, "display.max_rows", 50):
+        print(rep["table"].round(4).to_string(index=False))
+    print(f"\nwindow {rep['window']}/{rep['window_size']} rows; {rep['drifted_features']} of "
+          f"{len(FEATURE_COLUMNS)} features drifted; prediction drift: {rep['prediction_drift']}")
+    print("RETRAIN RECOMMENDED" if rep["retrain"] else "no retraining needed")
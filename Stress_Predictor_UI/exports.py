@@ -0,0 +1,190 @@
+# exports.py
+# Streaming exports of the history and user tables.
+#
+# Rows are read from the store in chunks (HistoryStore.iter_chunks) and written
+# straight to a file, so producing an export takes the same memory at 1k or 10M
+# rows. Formats: CSV, gzip-compressed CSV, Parquet (needs pyarrow) and XLSX
+# (openpyxl write-only mode; limited to Excel's 1,048,576 rows per sheet).
+# The app only builds a file when the user asks for it.
+#
+#   python exports.py history history.csv.gz
+#   python exports.py history mine.xlsx --username Ayush
+#   python exports.py users users.xlsx
+
+import os
+import gzip
+import weakref
+import argparse
+import tempfile
+
+import pandas as pd
+
+from config import DB_FILE, HISTORY_COLUMNS
+
+# format -> (file extension, MIME type)
+FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+XLSX_MAX_ROWS = 1_048_575  # plus the header row
+DEFAULT_CHUNKSIZE = 50_000
+
+USER_EXPORT_COLUMNS = ["username", "password", "role"]
+
+
+def format_for(path):
+    for fmt, (ext, _) in sorted(FORMATS.items(), key=lambda kv: -len(kv[1][0])):
+        if path.lower().endswith(ext):
+            return fmt
+    raise ValueError(f"Unknown export format for {path}; use one of {', '.join(e for e, _ in FORMATS.values())}")
+
+
+# ---------------------------
+# Writers: consume an iterator of DataFrames, return rows written
+# ---------------------------
+def _write_csv(chunks, f):
+    rows = 0
+    header = True
+    for chunk in chunks:
+        chunk.to_csv(f, index=False, header=header)
+        header = False
+        rows += len(chunk)
+    return rows
+
+
+def _write_parquet(chunks, path, columns):
+    from columnar_history import _require_pyarrow, arrow_schema
+    pa, _, pq = _require_pyarrow()
+    known = arrow_schema()
+    schema = pa.schema([known.field(c) if c in known.names else pa.field(c, pa.string()) for c in columns])
+    rows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            chunk = chunk.copy()
+            for field in schema:
+                if pa.types.is_integer(field.type):
+                    chunk[field.name] = pd.to_numeric(chunk[field.name], errors="coerce").round().astype("Int16")
+            writer.write_table(pa.Table.from_pandas(chunk[columns], schema=schema, preserve_index=False))
+            rows += len(chunk)
+    return rows
+
+
+def _write_xlsx(chunks, path, columns, sheet):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet)
+    ws.append(columns)
+    rows = 0
+    for chunk in chunks:
+        if rows + len(chunk) > XLSX_MAX_ROWS:
+            raise ValueError(f"Too many rows for one XLSX sheet ({XLSX_MAX_ROWS:,}); use CSV or Parquet")
+        # NaN/NA become empty cells
+        for record in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None):
+            ws.append(record)
+        rows += len(chunk)
+    wb.save(path)
+    return rows
+
+
+def write_chunks(chunks, path, fmt=None, columns=None, sheet="data"):
+    """Write an iterator of same-layout DataFrames to `path`; the file appears only when complete."""
+    fmt = fmt or format_for(path)
+    columns = list(columns) if columns is not None else None
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        if fmt == "csv":
+            with open(tmp, "w", newline="", encoding="utf-8") as f:
+                rows = _write_csv(chunks, f)
+        elif fmt == "csv.gz":
+            with gzip.open(tmp, "wt", newline="", encoding="utf-8", compresslevel=6) as f:
+                rows = _write_csv(chunks, f)
+        elif fmt == "parquet":
+            rows = _write_parquet(chunks, tmp, columns)
+        elif fmt == "xlsx":
+            rows = _write_xlsx(chunks, tmp, columns, sheet)
+        else:
+            raise ValueError(f"Unknown export format: {fmt}")
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return rows
+
+
+# ---------------------------
+# Exports
+# ---------------------------
+def export_history(store, path, fmt=None, username=None, columns=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Export the history (or one user's rows) from a HistoryStore in insertion order."""
+    columns = columns or HISTORY_COLUMNS
+    where, params = ("username = ?", (username,)) if username is not None else (None, ())
+    chunks = store.iter_chunks(chunksize, columns=columns, where=where, params=params)
+    return write_chunks(chunks, path, fmt, columns, sheet="history")
+
+
+def export_users(repo, path, fmt=None):
+    users = repo.to_frame(include_passwords=True)[USER_EXPORT_COLUMNS]
+    return write_chunks(iter([users]), path, fmt, USER_EXPORT_COLUMNS, sheet="users")
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class TempExport:
+    """An export file in the temp directory; removed once read, or when the object is dropped."""
+
+    def __init__(self, path, rows, file_name, mime):
+        self.path = path
+        self.rows = rows
+        self.file_name = file_name
+        self.mime = mime
+        self._remove = weakref.finalize(self, _remove_file, path)
+
+    def read(self):
+        """The file's bytes; the file is removed afterwards."""
+        try:
+            with open(self.path, "rb") as f:
+                return f.read()
+        finally:
+            self.discard()
+
+    def discard(self):
+        self._remove()
+
+
+def export_to_temp(kind, fmt, build, prefix="export"):
+    """Run `build(path, fmt)` into a new temp file and return it as a TempExport."""
+    ext, mime = FORMATS[fmt]
+    fd, path = tempfile.mkstemp(prefix=f"{prefix}_", suffix=ext)
+    os.close(fd)
+    try:
+        rows = build(path, fmt)
+    except BaseException:
+        _remove_file(path)
+        raise
+    return TempExport(path, rows, f"{kind}{ext}", mime)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export history or users as CSV / CSV.gz / Parquet / XLSX")
+    parser.add_argument("table", choices=["history", "users"])
+    parser.add_argument("output", help="target file; the format follows the extension")
+    parser.add_argument("--username", help="only this user's history")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args()
+
+    if args.table == "history":
+        from history_store import HistoryStore
+        n = export_history(HistoryStore(args.db, legacy_csv=None), args.output,
+                           username=args.username, chunksize=args.chunksize)
+    else:
+        from user_store import UserRepository
+        n = export_users(UserRepository(args.db, legacy_csv=None), args.output)
+    print(f"Wrote {n} rows to {args.output}")
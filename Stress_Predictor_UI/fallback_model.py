@@ -0,0 +1,41 @@
+# fallback_model.py
+# Placeholder model/scaler for a fresh checkout without best_model.pkl.
+#
+# This is an offline step:
+#
+#   python fallback_model.py
+#
+# The app only calls it when the model files are missing, and by default does
+# so on a background thread (see FALLBACK_MODE in config.py) so the first
+# request is not blocked by training. sklearn is imported here, not at app import.
+
+import os
+
+import numpy as np
+
+from config import FEATURE_COLUMNS, MODEL_FILE, SCALER_FILE
+
+
+def create_and_save_fallback_model(model_file=MODEL_FILE, scaler_file=SCALER_FILE):
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    X = np.random.rand(1000, len(FEATURE_COLUMNS)) * 9 + 1
+    y = np.random.choice([0,1,2], size=X.shape[0], p=[0.5,0.35,0.15])
+    scaler = StandardScaler()
+    Xs = scaler.fit_transform(X)
+    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model.fit(Xs, y)
+
+    # Write to temp names first so the registry never sees a half-written pair
+    for obj, path in ((scaler, scaler_file), (model, model_file)):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        joblib.dump(obj, tmp)
+        os.replace(tmp, path)
+    return model, scaler
+
+
+if __name__ == "__main__":
+    create_and_save_fallback_model()
+    print(f"Wrote placeholder {MODEL_FILE} and {SCALER_FILE}")
@@ -0,0 +1,224 @@
+# forest_engine.py
+# Compiled inference for the tree-ensemble in best_model.pkl.
+#
+# sklearn's RandomForestClassifier.predict spends most of a one-row call in
+# input validation and joblib dispatch over the estimators. CompiledForest
+# flattens every tree (and the fitted StandardScaler) into contiguous NumPy
+# arrays once, then walks all trees for all rows together, one depth level per
+# step. The arithmetic mirrors sklearn exactly (float64 scaling, float32 split
+# comparisons, per-tree probabilities summed in estimator order), so the
+# predictions and probabilities are bit-identical. The per-call overhead win
+# matters for small batches; big batches still go through sklearn's Cython
+# tree walk after the fused scaling (see LARGE_BATCH_ROWS).
+#
+#   python forest_engine.py --bench      # verify on StressLevelDataset + latency table
+
+import os
+import time
+import argparse
+
+import numpy as np
+
+import metrics
+
+# Rows per traversal block; bounds the (rows x trees) node-index matrix
+BLOCK_ROWS = 1024
+
+# Above this many rows sklearn's Cython traversal wins over the NumPy one, so
+# large batches are handed to the original estimator (same results either way)
+LARGE_BATCH_ROWS = 2048
+
+
+class SklearnPredictor:
+    """Plain sklearn path: scaler.transform + model.predict_proba."""
+
+    engine = "sklearn"
+
+    def __init__(self, model, scaler):
+        self.model = model
+        self.scaler = scaler
+        self.classes_ = model.classes_
+
+    def transform(self, X):
+        return self.scaler.transform(np.asarray(X, dtype=float))
+
+    def predict_proba(self, X):
+        with metrics.timer("inference.scale"):
+            Xs = self.transform(X)
+        with metrics.timer("inference.model"):
+            return self.model.predict_proba(Xs)
+
+    def predict(self, X):
+        return self.classes_.take(self.predict_proba(X).argmax(axis=1))
+
+
+def _leaf_values(tree, n_classes):
+    value = tree.value[:, 0, :n_classes].astype(np.float64)
+    sums = value.sum(axis=1)
+    if np.allclose(sums, 1.0):
+        # sklearn >= 1.4 stores per-node class fractions and returns them as-is
+        return value
+    # Older versions store weighted counts and normalize in predict_proba
+    sums[sums == 0.0] = 1.0
+    return value / sums[:, None]
+
+
+class CompiledForest:
+    """Flattened RandomForest/ExtraTrees classifier with an optional fused StandardScaler."""
+
+    engine = "compiled"
+
+    def __init__(self, model, scaler=None, large_batch_rows=LARGE_BATCH_ROWS):
+        self.model = model
+        self.large_batch_rows = large_batch_rows
+        trees = [est.tree_ for est in model.estimators_]
+        n_classes = int(model.n_classes_)
+        counts = np.array([t.node_count for t in trees])
+        offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+        self.classes_ = model.classes_
+        self.n_trees = len(trees)
+        self.roots = offsets.astype(np.intp)
+        self.max_depth = max(int(t.max_depth) for t in trees)
+
+        feature, threshold, children, value = [], [], [], []
+        for off, t in zip(offsets, trees):
+            is_leaf = t.children_left == -1
+            idx = np.arange(t.node_count) + off
+            # Leaves point to themselves so extra traversal steps are no-ops
+            left = np.where(is_leaf, idx, t.children_left + off)
+            right = np.where(is_leaf, idx, t.children_right + off)
+            children.append(np.stack([left, right], axis=1))
+            feature.append(np.where(is_leaf, 0, t.feature))
+            threshold.append(t.threshold)
+            value.append(_leaf_values(t, n_classes))
+        self.feature = np.ascontiguousarray(np.concatenate(feature), dtype=np.intp)
+        self.threshold = np.ascontiguousarray(np.concatenate(threshold), dtype=np.float64)
+        # children[2*node] is the left child, children[2*node + 1] the right one
+        self.children = np.ascontiguousarray(np.concatenate(children).ravel(), dtype=np.intp)
+        self.value = np.ascontiguousarray(np.concatenate(value))
+
+        self.mean = self.scale = None
+        if scaler is not None:
+            self.mean = scaler.mean_.astype(np.float64) if scaler.with_mean else None
+            self.scale = scaler.scale_.astype(np.float64) if scaler.with_std else None
+
+    def transform(self, X):
+        X = np.array(X, dtype=np.float64)  # copy, like StandardScaler(copy=True)
+        if self.mean is not None:
+            X -= self.mean
+        if self.scale is not None:
+            X /= self.scale
+        return X
+
+    def apply(self, Xs):
+        """Leaf index (into the flattened arrays) of every row in every tree."""
+        X32 = np.ascontiguousarray(Xs, dtype=np.float32)
+        n, n_features = X32.shape
+        flat = X32.ravel()
+        row_base = (np.arange(n) * n_features)[:, None]
+        node = np.repeat(self.roots[None, :], n, axis=0)
+        for _ in range(self.max_depth):
+            # "not <=" rather than ">" so NaN goes right, as in sklearn
+            go_right = ~(flat.take(row_base + self.feature.take(node)) <= self.threshold.take(node))
+            node = self.children.take(2 * node + go_right)
+        return node
+
+    def predict_proba(self, X):
+        with metrics.timer("inference.scale"):
+            Xs = self.transform(X)
+        with metrics.timer("inference.model"):
+            if self.model is not None and Xs.shape[0] >= self.large_batch_rows:
+                return self.model.predict_proba(Xs)
+            out = np.zeros((Xs.shape[0], self.value.shape[1]))
+            for start in range(0, Xs.shape[0], BLOCK_ROWS):
+                leaves = self.apply(Xs[start:start + BLOCK_ROWS])
+                acc = out[start:start + BLOCK_ROWS]
+                # Sequential sum in estimator order, as sklearn accumulates it
+                for t in range(self.n_trees):
+                    acc += self.value.take(leaves[:, t], axis=0)
+            out /= self.n_trees
+            return out
+
+    def predict(self, X):
+        return self.classes_.take(self.predict_proba(X).argmax(axis=1))
+
+
+def is_supported(model, scaler):
+    from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier
+    from sklearn.preprocessing import StandardScaler
+    return (
+        isinstance(model, (RandomForestClassifier, ExtraTreesClassifier))
+        and getattr(model, "n_outputs_", 1) == 1
+        and (scaler is None or isinstance(scaler, StandardScaler))
+    )
+
+
+def make_predictor(model, scaler, compiled=True):
+    """CompiledForest when the model/scaler pair supports it, else the sklearn path."""
+    if compiled and is_supported(model, scaler):
+        return CompiledForest(model, scaler)
+    return SklearnPredictor(model, scaler)
+
+
+# ---------------------------
+# Verification & benchmark
+# ---------------------------
+def _time_call(fn, X, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def verify(model, scaler, X):
+    """Compare the compiled (NumPy traversal) and sklearn outputs on X bit for bit."""
+    ref = SklearnPredictor(model, scaler)
+    fast = CompiledForest(model, scaler, large_batch_rows=np.inf)
+    p_ref, p_fast = ref.predict_proba(X), fast.predict_proba(X)
+    same_pred = np.array_equal(ref.predict(X), fast.predict(X))
+    same_proba = np.array_equal(p_ref, p_fast)
+    return same_pred, same_proba
+
+
+if __name__ == "__main__":
+    import warnings
+    import joblib
+    import pandas as pd
+    from config import MODEL_FILE, SCALER_FILE
+
+    parser = argparse.ArgumentParser(description="Compiled forest verification and latency benchmark")
+    parser.add_argument("--bench", action="store_true", help="run the latency benchmark")
+    parser.add_argument("--dataset", default=os.path.join("..", "StressLevelDataset.xls"))
+    parser.add_argument("--model", default=MODEL_FILE)
+    parser.add_argument("--scaler", default=SCALER_FILE)
+    parser.add_argument("--sizes", default="1,100,100000")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    model, scaler = joblib.load(args.model), joblib.load(args.scaler)
+    if not is_supported(model, scaler):
+        raise SystemExit(f"{type(model).__name__} is not supported by the compiled engine")
+
+    # StressLevelDataset.xls is a CSV; the model was trained on its 20 feature columns in order
+    data = pd.read_csv(args.dataset)
+    X_data = data.drop(columns=["stress_level"]).to_numpy(dtype=float)
+    same_pred, same_proba = verify(model, scaler, X_data)
+    print(f"StressLevelDataset ({len(X_data)} rows): predictions identical={same_pred}, "
+          f"probabilities bit-identical={same_proba}")
+
+    if args.bench:
+        ref = SklearnPredictor(model, scaler)
+        fast = CompiledForest(model, scaler)
+        numpy_only = CompiledForest(model, scaler, large_batch_rows=np.inf)
+        rng = np.random.default_rng(0)
+        print(f"{'batch':>8} {'sklearn ms':>12} {'compiled ms':>12} {'numpy-only ms':>14} {'speedup':>8}")
+        for n in [int(s) for s in args.sizes.split(",")]:
+            X = X_data[rng.integers(0, len(X_data), n)]
+            repeat = 50 if n <= 100 else 3
+            t_ref = _time_call(ref.predict_proba, X, repeat)
+            t_fast = _time_call(fast.predict_proba, X, repeat)
+            t_np = _time_call(numpy_only.predict_proba, X, repeat)
+            print(f"{n:>8} {t_ref*1000:>12.3f} {t_fast*1000:>12.3f} {t_np*1000:>14.3f} {t_ref/t_fast:>7.1f}x")
@@ -0,0 +1,289 @@
+# history_store.py
+# Append-only prediction history backed by a SQLite table in WAL mode.
+#
+# Every prediction is a single INSERT, so recording one costs the same no matter
+# how many rows are already stored, and WAL lets several Streamlit sessions (or
+# processes) write while others read.
+
+import os
+import sqlite3
+import threading
+import argparse
+from datetime import datetime
+
+import pandas as pd
+
+import analytics
+import metrics
+from config import DB_FILE, HISTORY_CSV, HISTORY_COLUMNS, FEATURE_COLUMNS, LEGACY_HISTORY_COLUMNS
+
+# Column order inside the table: current columns first, then the legacy ones
+# still found in history.csv written by older versions of the app.
+STORE_COLUMNS = HISTORY_COLUMNS + LEGACY_HISTORY_COLUMNS
+
+_INTEGER_COLUMNS = ["stress_level"] + FEATURE_COLUMNS + LEGACY_HISTORY_COLUMNS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    dt_iso TEXT,
+    email TEXT,
+    stress_level INTEGER,
+    {features}
+);
+CREATE INDEX IF NOT EXISTS idx_history_user_ts ON history (username, timestamp);
+CREATE INDEX IF NOT EXISTS idx_history_ts ON history (timestamp);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+""".format(features=",\n    ".join(f"{c} INTEGER" for c in FEATURE_COLUMNS + LEGACY_HISTORY_COLUMNS))
+
+_INSERT_SQL = "INSERT INTO history ({cols}) VALUES ({marks})".format(
+    cols=", ".join(STORE_COLUMNS), marks=", ".join("?" for _ in STORE_COLUMNS)
+)
+
+
+def _clean(value):
+    # sqlite3 only understands plain Python scalars; NaN/NA become NULL
+    if value is None:
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if hasattr(value, "item"):
+        value = value.item()
+    return value
+
+
+def normalize_frame(df):
+    """Bring a history export (any app version) to STORE_COLUMNS."""
+    df = df.reindex(columns=STORE_COLUMNS)
+    # Old rows have no dt_iso; derive it from the epoch timestamp
+    missing_iso = df["dt_iso"].isna() & df["timestamp"].notna()
+    if missing_iso.any():
+        df["dt_iso"] = df["dt_iso"].astype(object)
+        df.loc[missing_iso, "dt_iso"] = df.loc[missing_iso, "timestamp"].map(
+            lambda ts: datetime.fromtimestamp(float(ts)).isoformat()
+        )
+    df["email"] = df["email"].astype(object).where(df["email"].notna(), "")
+    return df
+
+
+def _frame_values(df):
+    # Vectorized equivalent of _row_values for a whole DataFrame
+    frame = df.reindex(columns=STORE_COLUMNS)
+    for col in _INTEGER_COLUMNS:
+        frame[col] = pd.to_numeric(frame[col], errors="coerce").round().astype("Int64")
+    frame = frame.astype(object)
+    return frame.where(frame.notna(), None).values.tolist()
+
+
+def _row_values(row):
+    values = []
+    for col in STORE_COLUMNS:
+        v = _clean(row.get(col))
+        if v is not None and col in _INTEGER_COLUMNS:
+            v = int(v)
+        values.append(v)
+    return values
+
+
+class HistoryStore:
+    """Prediction history in a SQLite table; writes are single-row or bulk appends."""
+
+    def __init__(self, path=DB_FILE, legacy_csv=HISTORY_CSV):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        analytics.install(conn)
+        if legacy_csv and os.path.exists(legacy_csv):
+            self.migrate_csv(legacy_csv)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: we issue BEGIN/COMMIT ourselves
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, sql_rows):
+        conn = self._conn()
+        with metrics.timer("history.write"):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(_INSERT_SQL, sql_rows)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        metrics.inc("history.writes")
+        metrics.inc("history.rows_written", len(sql_rows))
+
+    def sync_commits(self):
+        """Make this thread's commits wait for fsync (the default NORMAL may lose the last ones on power loss)."""
+        self._conn().execute("PRAGMA synchronous=FULL")
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+    def append(self, row):
+        """Append one history row (a dict keyed by HISTORY_COLUMNS)."""
+        self._write([_row_values(row)])
+
+    def append_many(self, rows):
+        """Append many rows in one transaction; accepts a DataFrame or a list of dicts."""
+        if isinstance(rows, pd.DataFrame):
+            values = _frame_values(rows)
+        else:
+            values = [_row_values(r) for r in rows]
+        if values:
+            self._write(values)
+        return len(values)
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+    def load(self, columns=None):
+        """Return the stored history as a DataFrame (HISTORY_COLUMNS by default)."""
+        columns = columns or HISTORY_COLUMNS
+        sql = "SELECT {} FROM history ORDER BY id".format(", ".join(columns))
+        return pd.read_sql_query(sql, self._conn())
+
+    def iter_chunks(self, chunksize=50_000, columns=None, where=None, params=()):
+        """Yield the history as DataFrames of at most `chunksize` rows, in insertion order."""
+        columns = columns or HISTORY_COLUMNS
+        sql = "SELECT {} FROM history".format(", ".join(columns))
+        if where:
+            sql += " WHERE " + where
+        sql += " ORDER BY id"
+        # A dedicated connection so a long export does not hold the session's cursor
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            cur = conn.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(chunksize)
+                if not rows:
+                    break
+                yield pd.DataFrame.from_records(rows, columns=columns)
+        finally:
+            conn.close()
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def version(self):
+        """Monotonic history version: the last id handed out (AUTOINCREMENT keeps it in sqlite_sequence)."""
+        row = self._conn().execute("SELECT seq FROM sqlite_sequence WHERE name = 'history'").fetchone()
+        return row[0] if row else 0
+
+    def user_history(self, username, limit=None, columns=None):
+        """A user's rows, newest first (served by the (username, timestamp) index)."""
+        columns = columns or HISTORY_COLUMNS
+        sql = "SELECT {} FROM history WHERE username = ? ORDER BY timestamp DESC".format(", ".join(columns))
+        params = [username]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return pd.read_sql_query(sql, self._conn(), params=params)
+
+    def recent(self, limit=50, columns=None):
+        """The newest rows across all users."""
+        columns = columns or HISTORY_COLUMNS
+        sql = "SELECT {} FROM history ORDER BY timestamp DESC LIMIT ?".format(", ".join(columns))
+        return pd.read_sql_query(sql, self._conn(), params=[int(limit)])
+
+    def top_vectors(self, limit=256):
+        """The most frequently submitted feature vectors, as (feature tuple, count) pairs."""
+        cols = ", ".join(FEATURE_COLUMNS)
+        complete = " AND ".join(f"{c} IS NOT NULL" for c in FEATURE_COLUMNS)
+        sql = f"SELECT {cols}, COUNT(*) AS n FROM history WHERE {complete} GROUP BY {cols} ORDER BY n DESC LIMIT ?"
+        rows = self._conn().execute(sql, (int(limit),)).fetchall()
+        return [(tuple(r[:-1]), r[-1]) for r in rows]
+
+    # ---------------------------
+    # Aggregates (see analytics.py)
+    # ---------------------------
+    def summary(self):
+        return analytics.summary(self._conn())
+
+    def rebuild_aggregates(self):
+        analytics.rebuild(self._conn())
+
+    def verify_aggregates(self):
+        return analytics.verify(self._conn())
+
+    # ---------------------------
+    # Migration
+    # ---------------------------
+    def migrate_csv(self, csv_path, chunksize=50_000):
+        """Import a history.csv once; returns the number of rows imported (0 if done before)."""
+        key = "migrated:" + os.path.abspath(csv_path)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM store_meta WHERE key = ?", (key,)).fetchone():
+                conn.execute("ROLLBACK")
+                return 0
+            imported = 0
+            for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+                values = _frame_values(normalize_frame(chunk))
+                conn.executemany(_INSERT_SQL, values)
+                imported += len(values)
+            conn.execute(
+                "INSERT INTO store_meta (key, value) VALUES (?, ?)",
+                (key, datetime.now().isoformat()),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return imported
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_history_store(path=DB_FILE, legacy_csv=HISTORY_CSV):
+    """Process-wide HistoryStore per database path (Streamlit reruns reuse it)."""
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = HistoryStore(path, legacy_csv)
+            _stores[path] = store
+        return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prediction history store utilities")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    mig = sub.add_parser("migrate", help="import a history.csv into the SQLite store")
+    mig.add_argument("--csv", default=HISTORY_CSV)
+    mig.add_argument("--db", default=DB_FILE)
+    for name, help_text in (("verify-aggregates", "compare dashboard aggregates with the raw log"),
+                            ("rebuild-aggregates", "recompute dashboard aggregates from the raw log")):
+        agg = sub.add_parser(name, help=help_text)
+        agg.add_argument("--db", default=DB_FILE)
+    args = parser.parse_args()
+
+    if args.cmd == "migrate":
+        store = HistoryStore(args.db, legacy_csv=None)
+        n = store.migrate_csv(args.csv)
+        print(f"Imported {n} rows from {args.csv} into {args.db} ({store.count()} total)")
+    elif args.cmd == "verify-aggregates":
+        bad = HistoryStore(args.db, legacy_csv=None).verify_aggregates()
+        print("Aggregates match the raw log" if not bad else f"Mismatch in: {', '.join(bad)}")
+        raise SystemExit(1 if bad else 0)
+    elif args.cmd == "rebuild-aggregates":
+        HistoryStore(args.db, legacy_csv=None).rebuild_aggregates()
+        print("Aggregates rebuilt")
@@ -0,0 +1,244 @@
+# history_writer.py
+# Background writer for the history store: a bounded queue in front of one
+# writer thread that commits whatever has queued up as a single transaction.
+#
+# The Analyze click (and the API) only enqueue the row; the disk work happens
+# on the writer thread, and rows that arrive while a commit is running share
+# the next one (group commit). STRESS_HISTORY_DURABILITY picks what append
+# waits for:
+#   async  nothing: the row is queued and the caller moves on (the default)
+#   fsync  the commit of its group, made with PRAGMA synchronous=FULL so the
+#          row is on disk when append returns
+# When the queue is full append blocks until there is room, so a stalled disk
+# slows requests down instead of dropping rows or growing memory. flush()
+# waits for everything queued so far; close() (also run at exit) flushes and
+# stops the thread.
+
+import time
+import queue
+import atexit
+import threading
+
+import pandas as pd
+
+import metrics
+from config import HISTORY_DURABILITY, HISTORY_QUEUE_SIZE, HISTORY_BATCH_ROWS
+
+DURABILITY_MODES = ("async", "fsync")
+_STOP = object()
+
+
+class _Done(threading.Event):
+    """Set once the rows it was queued with are committed (or failed: see .error)."""
+    error = None
+
+
+class HistoryWriter:
+    """Queue history rows for `store` and commit them in groups on a background thread."""
+
+    def __init__(self, store, durability=HISTORY_DURABILITY, max_queue=HISTORY_QUEUE_SIZE,
+                 max_batch=HISTORY_BATCH_ROWS):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability {durability!r}; choose from {', '.join(DURABILITY_MODES)}")
+        self.store = store
+        self.durability = durability
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.committed = 0
+        self.commits = 0
+        self.errors = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.last_commit_seconds = None
+        self.last_error = None
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    # ---------------------------
+    # Producer side
+    # ---------------------------
+    def append(self, row):
+        """Queue one history row (a dict keyed by HISTORY_COLUMNS)."""
+        return self._submit([row])
+
+    def append_many(self, rows):
+        """Queue many rows (a DataFrame or a list of dicts); they are committed together."""
+        if isinstance(rows, pd.DataFrame):
+            rows = rows.to_dict("records")
+        return self._submit(list(rows)) if len(rows) else 0
+
+    def _submit(self, rows):
+        if self._thread is None:
+            self._start()
+        done = _Done() if self.durability == "fsync" else None
+        item = (rows, time.perf_counter(), done)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            metrics.inc("history_writer.queue_full")
+            with metrics.timer("history_writer.queue_wait"):
+                self._queue.put(item)
+        depth = self._queue.qsize()
+        with self._lock:
+            self.enqueued += len(rows)
+            self.max_depth = max(self.max_depth, depth)
+        if done is not None:
+            done.wait()
+            if done.error is not None:
+                raise done.error
+        return len(rows)
+
+    def flush(self, timeout=None):
+        """Wait until everything queued before this call is committed; False on timeout."""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = _Done()
+        self._queue.put(([], time.perf_counter(), done))
+        return done.wait(timeout)
+
+    def close(self, timeout=30):
+        """Commit what is queued and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    # ---------------------------
+    # Writer thread
+    # ---------------------------
+    def _take_batch(self):
+        """Block for the next submission, then add whatever else is queued, up to max_batch rows."""
+        batch = [self._queue.get()]
+        rows = 0 if batch[0] is _STOP else len(batch[0][0])
+        while rows < self.max_batch and batch[-1] is not _STOP:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item is not _STOP:
+                rows += len(item[0])
+        return batch
+
+    def _run(self):
+        if self.durability == "fsync":
+            self.store.sync_commits()
+        while True:
+            batch = self._take_batch()
+            items = [item for item in batch if item is not _STOP]
+            rows = [row for item in items for row in item[0]]
+            error = None
+            if rows:
+                start = time.perf_counter()
+                try:
+                    with metrics.timer("history_writer.commit"):
+                        self.store.append_many(rows)
+                except Exception as e:
+                    error = e
+                seconds = time.perf_counter() - start
+                with self._lock:
+                    self.last_commit_seconds = seconds
+                    if error is None:
+                        self.committed += len(rows)
+                        self.commits += 1
+                    else:
+                        self.errors += 1
+                        self.dropped += len(rows)
+                        self.last_error = f"{type(error).__name__}: {error}"
+                if error is None:
+                    metrics.inc("history_writer.commits")
+                    metrics.inc("history_writer.rows", len(rows))
+                else:
+                    metrics.inc("history_writer.errors")
+            now = time.perf_counter()
+            for queued_rows, queued_at, done in items:
+                if queued_rows:
+                    # Time from append to durable row: queue wait plus commit
+                    metrics.observe("history_writer.lag", now - queued_at)
+                if done is not None:
+                    done.error = error
+                    done.set()
+            if len(items) < len(batch):
+                return
+
+    def stats(self):
+        with self._lock:
+            return {
+                "durability": self.durability,
+                "running": self._thread is not None and self._thread.is_alive(),
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "max_depth": self.max_depth,
+                "enqueued": self.enqueued,
+                "committed": self.committed,
+                "commits": self.commits,
+                "rows_per_commit": self.committed / self.commits if self.commits else None,
+                "last_commit_seconds": self.last_commit_seconds,
+                "errors": self.errors,
+                "dropped": self.dropped,
+                "last_error": self.last_error,
+            }
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_history_writer(store, durability=HISTORY_DURABILITY):
+    """Process-wide HistoryWriter per history store."""
+    with _writers_lock:
+        writer = _writers.get(id(store))
+        if writer is None:
+            writer = HistoryWriter(store, durability)
+            _writers[id(store)] = writer
+        return writer
+
+
+if __name__ == "__main__":
+    import os
+    import argparse
+    import tempfile
+    from datetime import datetime
+    from config import FEATURE_COLUMNS
+    from history_store import HistoryStore
+
+    parser = argparse.ArgumentParser(description="Latency of recording a history row: inline vs background writer")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--db", help="database to write to (default: a temporary one)")
+    args = parser.parse_args()
+
+    def row(i):
+        now = datetime.now()
+        r = {"username": "bench", "timestamp": now.timestamp(), "dt_iso": now.isoformat(), "email": str(i),
+             "stress_level": i % 3}
+        r.update({c: 1 + i % 10 for c in FEATURE_COLUMNS})
+        return r
+
+    tmp = tempfile.mkdtemp(prefix="stress_writer_")
+    print(f"{'mode':>8} {'p50 ms':>8} {'p95 ms':>8} {'rows/commit':>12} {'total s':>8}")
+    for mode in ("inline",) + DURABILITY_MODES:
+        store = HistoryStore(args.db or os.path.join(tmp, f"{mode}.db"), legacy_csv=None)
+        writer = None if mode == "inline" else HistoryWriter(store, mode)
+        latencies = []
+        start = time.perf_counter()
+        for i in range(args.rows):
+            t0 = time.perf_counter()
+            (store if writer is None else writer).append(row(i))
+            latencies.append(time.perf_counter() - t0)
+        if writer is not None:
+            writer.close()
+        total = time.perf_counter() - start
+        per_commit = writer.stats()["rows_per_commit"] if writer is not None else 1.0
+        ms = pd.Series(latencies) * 1000
+        print(f"{mode:>8} {ms.quantile(0.5):>8.3f} {ms.quantile(0.95):>8.3f} {per_commit:>12.1f} {total:>8.2f}")
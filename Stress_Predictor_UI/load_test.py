@@ -0,0 +1,210 @@
+# load_test.py
+# Multi-process load test for the shared-storage deployment mode.
+#
+# Starts N worker processes (spawned, like separate app servers) on one data
+# directory and has each run the Analyze request path: get the model from a
+# ModelRegistry that follows models/CURRENT, predict one row, append it to
+# history, and every LOGIN_EVERY requests look up and check a user's password.
+# Once half of the rows are in, the parent publishes a second model version,
+# so the hot swap happens under load. Afterwards it checks that
+#   - history holds exactly the rows each worker wrote (none lost or doubled),
+#   - every prediction used one of the two published (model, scaler) pairs,
+#   - no request failed.
+# Each worker count gets a fresh data directory. Throughput can only scale
+# with the number of cores; the report prints the CPU count next to it.
+#
+#   python load_test.py --workers 1,2,4 --requests 500
+#   python load_test.py --storage sqlite-split -o load_test.json   # exit 1 on a failed check
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import warnings
+import multiprocessing as mp
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+from config import FEATURE_COLUMNS, MODEL_FILE, SCALER_FILE, STORAGE_BACKEND
+
+LOGIN_EVERY = 10
+USERS = 100
+
+
+def _paths(data_dir):
+    return (os.path.join(data_dir, os.path.basename(MODEL_FILE)),
+            os.path.join(data_dir, os.path.basename(SCALER_FILE)),
+            os.path.join(data_dir, "models"))
+
+
+def _worker(worker_id, data_dir, backend, requests, barrier, results):
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    from storage import open_storage
+    from model_registry import ModelRegistry
+    from user_store import sha256_hash
+
+    model_file, scaler_file, models_dir = _paths(data_dir)
+    registry = ModelRegistry(model_file, scaler_file, fallback_mode="off", models_dir=models_dir)
+    storage = open_storage(backend, data_dir)
+    registry.get()
+    rng = np.random.default_rng(worker_id)
+    username = f"loadtest-{worker_id}"
+    versions, errors, latencies = Counter(), [], []
+
+    barrier.wait()
+    start = time.time()
+    for i in range(requests):
+        t0 = time.perf_counter()
+        try:
+            x = rng.integers(1, 11, (1, len(FEATURE_COLUMNS))).astype(float)
+            active = registry.get()
+            proba = active.predictor.predict_proba(x)
+            row = {"username": username, "timestamp": time.time(), "dt_iso": datetime.now().isoformat(),
+                   "email": str(i), "stress_level": int(active.predictor.classes_[proba[0].argmax()])}
+            row.update(zip(FEATURE_COLUMNS, (int(v) for v in x[0])))
+            storage.history.append(row)
+            versions[active.version] += 1
+            if i % LOGIN_EVERY == 0:
+                u = i % USERS
+                user = storage.users.get(f"user{u}")
+                if user is None or user["password"] != sha256_hash(f"pw{u}"):
+                    errors.append(f"login user{u} failed")
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+        latencies.append(time.perf_counter() - t0)
+    results.put({"worker": worker_id, "start": start, "end": time.time(), "versions": dict(versions),
+                 "errors": errors[:10], "error_count": len(errors),
+                 "latencies": latencies})
+
+
+def prepare(data_dir, backend, model_file=MODEL_FILE, scaler_file=SCALER_FILE):
+    """Users, and two model versions: the current model (published) and a placeholder to swap in."""
+    import artifacts
+    from storage import open_storage
+    from user_store import sha256_hash
+    from model_registry import content_hash
+    from fallback_model import create_and_save_fallback_model
+
+    storage = open_storage(backend, data_dir)
+    for u in range(USERS):
+        storage.users.add(f"user{u}", sha256_hash(f"pw{u}"))
+    _, _, models_dir = _paths(data_dir)
+    tmp = os.path.join(data_dir, "placeholder")
+    os.makedirs(tmp)
+    alt_model, alt_scaler = os.path.join(tmp, "m.pkl"), os.path.join(tmp, "s.pkl")
+    create_and_save_fallback_model(alt_model, alt_scaler)
+    if not (os.path.exists(model_file) and os.path.exists(scaler_file)):
+        model_file, scaler_file = alt_model, alt_scaler
+    first = artifacts.write_files(model_file, scaler_file, {"source": "load test"}, models_dir)
+    second = artifacts.write_files(alt_model, alt_scaler, {"source": "load test swap"}, models_dir)
+    artifacts.publish(first, models_dir)
+    versions = {content_hash(os.path.join(d, artifacts.MODEL_NAME), os.path.join(d, artifacts.SCALER_NAME))
+                for d in (first, second)}
+    return storage, second, versions
+
+
+def run_once(workers, requests, backend, data_dir, swap=True):
+    import artifacts
+    storage, second, known_versions = prepare(data_dir, backend)
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers + 1)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(w, data_dir, backend, requests, barrier, results))
+             for w in range(workers)]
+    for p in procs:
+        p.start()
+    barrier.wait(timeout=300)  # every worker has loaded the model and opened storage
+    start = time.time()
+
+    total = workers * requests
+    swapped = not swap
+    out = []
+    while len(out) < workers:
+        if not swapped and storage.history.version() >= total // 2:
+            artifacts.publish(second, _paths(data_dir)[2])
+            swapped = True
+        try:
+            out.append(results.get(timeout=0.02))
+        except Exception:
+            if not any(p.is_alive() for p in procs) and results.empty():
+                break
+    for p in procs:
+        p.join()
+    wall = max(r["end"] for r in out) - start if out else float("nan")
+
+    per_user = Counter()
+    for chunk in storage.history.iter_chunks(columns=["username", "email"]):
+        per_user.update(chunk["username"] + "#" + chunk["email"])
+    duplicates = sum(c - 1 for c in per_user.values() if c > 1)
+    stored = sum(per_user.values())
+    versions = Counter()
+    for r in out:
+        versions.update(r["versions"])
+    latencies = np.concatenate([r["latencies"] for r in out]) if out else np.array([np.nan])
+    res = {
+        "workers": workers,
+        "requests": total,
+        "seconds": wall,
+        "requests_per_sec": total / wall,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "rows_expected": total,
+        "rows_stored": stored,
+        "duplicate_rows": duplicates,
+        "errors": sum(r["error_count"] for r in out) + (workers - len(out)),
+        "error_samples": [e for r in out for e in r["errors"]][:10],
+        "versions_seen": dict(versions),
+        "unknown_versions": sorted(set(versions) - known_versions),
+    }
+    res["ok"] = (stored == total and not duplicates and not res["errors"] and not res["unknown_versions"])
+    return res
+
+
+def print_report(rows):
+    print(f"\n{'workers':>7} {'req/s':>9} {'scaling':>8} {'effic.':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'rows':>13} {'versions':>8} {'errors':>6}  check")
+    base = min(rows, key=lambda r: r["workers"])
+    for r in rows:
+        scaling = r["requests_per_sec"] / base["requests_per_sec"]
+        efficiency = scaling / (r["workers"] / base["workers"])
+        print(f"{r['workers']:>7} {r['requests_per_sec']:>9.0f} {scaling:>7.2f}x {efficiency:>7.0%} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+              f"{r['rows_stored']:>6}/{r['rows_expected']:<6} {len(r['versions_seen']):>8} {r['errors']:>6}  "
+              f"{'ok' if r['ok'] else 'FAILED'}")
+    print(f"({os.cpu_count()} CPUs; scaling is throughput relative to the smallest run, "
+          f"efficiency is that divided by the increase in workers)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-process load test on shared storage")
+    parser.add_argument("--workers", default="1,2,4", help="worker counts to run, comma-separated")
+    parser.add_argument("--requests", type=int, default=500, help="requests per worker")
+    parser.add_argument("--storage", default=STORAGE_BACKEND, help="storage backend (see storage.py)")
+    parser.add_argument("--data-dir", help="parent directory for the runs (default: a temporary one)")
+    parser.add_argument("--no-swap", action="store_true", help="do not publish a new model during the run")
+    parser.add_argument("--keep", action="store_true", help="keep the data directories")
+    parser.add_argument("-o", "--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    root = args.data_dir or tempfile.mkdtemp(prefix="stress_load_")
+    rows = []
+    try:
+        for n in (int(w) for w in args.workers.split(",")):
+            res = run_once(n, args.requests, args.storage, os.path.join(root, f"workers_{n}"), swap=not args.no_swap)
+            print(f"{n} workers: {res['requests_per_sec']:.0f} req/s, {res['rows_stored']}/{res['rows_expected']} rows, "
+                  f"{res['errors']} errors" + ("" if res["ok"] else f"  {res['error_samples']}"))
+            rows.append(res)
+    finally:
+        if not args.keep and not args.data_dir:
+            shutil.rmtree(root, ignore_errors=True)
+    print_report(rows)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"storage": args.storage, "cpus": os.cpu_count(), "runs": rows}, f, indent=2)
+    if not all(r["ok"] for r in rows):
+        sys.exit(1)
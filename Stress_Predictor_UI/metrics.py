@@ -0,0 +1,216 @@
+# metrics.py
+# In-process counters and latency histograms for the prediction hot path.
+#
+# Stages are timed with `with metrics.timer("inference.model"): ...` and land in
+# log-spaced histograms (4 buckets per doubling, so p50/p95/p99 are within ~9%
+# of the true value), counters with `metrics.inc("predictions")`. Recording is
+# a bisect and two additions under a per-histogram lock; with STRESS_METRICS=0
+# `timer` returns a shared no-op and nothing is recorded at all.
+#
+# Export: snapshot() (dict, used by the Metrics page), to_json(), and
+# prometheus_text(). serve(port) exposes /metrics and /metrics.json over HTTP
+# from a daemon thread (STRESS_METRICS_PORT for the Streamlit process).
+
+import json
+import time
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+
+from config import METRICS_ENABLED
+
+# Bucket upper bounds in seconds: 1 µs * 2**(i/4), up to ~2 minutes
+_BOUNDS = [1e-6 * 2 ** (i / 4) for i in range(4 * 27 + 1)]
+QUANTILES = (0.5, 0.95, 0.99)
+
+_enabled = METRICS_ENABLED
+_started = time.time()
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_NULL = nullcontext()
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max", "_lock")
+
+    def __init__(self):
+        self.counts = [0] * (len(_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        idx = bisect_left(_BOUNDS, seconds)
+        with self._lock:
+            self.counts[idx] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q):
+        with self._lock:
+            counts, count, top = list(self.counts), self.count, self.max
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for idx, c in enumerate(counts):
+            seen += c
+            if seen >= rank and c:
+                if idx == len(_BOUNDS):
+                    return top
+                low = _BOUNDS[idx - 1] if idx else 0.0
+                # Geometric middle of the bucket, never above the largest value seen
+                return min((low * _BOUNDS[idx]) ** 0.5 if low else _BOUNDS[idx], top)
+        return top
+
+    def summary(self):
+        out = {"count": self.count, "sum": self.total,
+               "mean": self.total / self.count if self.count else None, "max": self.max}
+        for q in QUANTILES:
+            out[f"p{int(q * 100)}"] = self.quantile(q)
+        return out
+
+
+class _Timer:
+    __slots__ = ("hist", "start")
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start)
+        return False
+
+
+def _histogram(name):
+    hist = _histograms.get(name)
+    if hist is None:
+        with _lock:
+            hist = _histograms.setdefault(name, Histogram())
+    return hist
+
+
+# ---------------------------
+# Recording
+# ---------------------------
+def enabled():
+    return _enabled
+
+
+def set_enabled(flag):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def timer(name):
+    """Context manager timing one execution of stage `name` (a no-op when disabled)."""
+    if not _enabled:
+        return _NULL
+    return _Timer(_histogram(name))
+
+
+def observe(name, seconds):
+    if _enabled:
+        _histogram(name).observe(seconds)
+
+
+def inc(name, n=1):
+    if _enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+
+def reset():
+    global _started
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _started = time.time()
+
+
+# ---------------------------
+# Export
+# ---------------------------
+def snapshot():
+    with _lock:
+        counters = dict(_counters)
+        histograms = dict(_histograms)
+    return {
+        "enabled": _enabled,
+        "since": _started,
+        "uptime_seconds": time.time() - _started,
+        "counters": dict(sorted(counters.items())),
+        "stages": {name: histograms[name].summary() for name in sorted(histograms)},
+    }
+
+
+def to_json():
+    return json.dumps(snapshot(), indent=2)
+
+
+def _metric_name(name):
+    return "stress_" + "".join(ch if ch.isalnum() else "_" for ch in name)
+
+
+def prometheus_text():
+    """Prometheus text exposition: one counter per name, stage latencies as a summary."""
+    snap = snapshot()
+    lines = []
+    for name, value in snap["counters"].items():
+        metric = _metric_name(name) + "_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    if snap["stages"]:
+        lines.append("# TYPE stress_stage_seconds summary")
+        for name, s in snap["stages"].items():
+            for q in QUANTILES:
+                value = s[f"p{int(q * 100)}"]
+                lines.append(f'stress_stage_seconds{{stage="{name}",quantile="{q}"}} {value if value is not None else "NaN"}')
+            lines.append(f'stress_stage_seconds_sum{{stage="{name}"}} {s["sum"]}')
+            lines.append(f'stress_stage_seconds_count{{stage="{name}"}} {s["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+_server = None
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve /metrics (Prometheus) and /metrics.json on a daemon thread; once per process."""
+    global _server
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, ctype = prometheus_text(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, ctype = to_json(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    with _lock:
+        if _server is not None:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host, port), Handler)
+        except OSError:
+            return None  # another process (e.g. a second Streamlit worker) already serves this port
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
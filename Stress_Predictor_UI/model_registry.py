@@ -0,0 +1,249 @@
+# model_registry.py
+# Process-wide model/scaler cache with hot-swap.
+#
+# Streamlit re-executes app.py.py on every interaction, but imported modules
+# are kept, so the registry below deserializes best_model.pkl / scaler.pkl once
+# per process and shares them across sessions. Each access compares the files'
+# (mtime, size) with what was loaded; a new upload from the Admin panel is
+# loaded in the background of that call and swapped in atomically.
+#
+# With `models_dir`, the files come from the version that models/CURRENT
+# points to (artifacts.py) and the flat files are only used until something
+# is published; this is how several worker processes switch versions together.
+# If a compact export of the same files sits next to the pickle
+# (compact_forest.py), it is memory-mapped instead of unpickling the forest.
+
+import os
+import time
+import hashlib
+import threading
+from dataclasses import dataclass, field
+
+import artifacts
+from config import MODEL_FILE, SCALER_FILE, USE_COMPILED_FOREST, USE_COMPACT_MODEL, FALLBACK_MODE
+from forest_engine import make_predictor
+from compact_forest import CompactForest, compact_path
+from storage import file_lock
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    model: object
+    scaler: object
+    version: str
+    status: str            # "loaded" or "fallback"
+    load_seconds: float
+    predictor: object      # forest_engine CompiledForest or SklearnPredictor
+    loaded_at: float = field(default_factory=time.time)
+
+
+def _signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def content_hash(*paths):
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()[:12]
+
+
+class ModelRegistry:
+    """Loads the model and scaler once and reloads them only when the files change."""
+
+    def __init__(self, model_file=MODEL_FILE, scaler_file=SCALER_FILE, fallback=None,
+                 compiled=USE_COMPILED_FOREST, fallback_mode=FALLBACK_MODE, models_dir=None,
+                 compact=USE_COMPACT_MODEL):
+        self.model_file = model_file
+        self.scaler_file = scaler_file
+        self.models_dir = models_dir
+        self.fallback = fallback
+        self.fallback_mode = fallback_mode
+        self.compiled = compiled
+        self.compact = compact
+        self._fallback_thread = None
+        self._preload_thread = None
+        self._fallback_built = False
+        self.current = None
+        self.loads = 0
+        self.swaps = 0
+        self.last_error = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def paths(self):
+        """(model file, scaler file) to serve: the published version if there is one, else the flat files."""
+        if self.models_dir:
+            version_dir = artifacts.current_dir(self.models_dir)
+            if version_dir and os.path.isdir(version_dir):
+                return (os.path.join(version_dir, artifacts.MODEL_NAME),
+                        os.path.join(version_dir, artifacts.SCALER_NAME))
+        return self.model_file, self.scaler_file
+
+    def _files_signature(self):
+        paths = self.paths()
+        try:
+            sig = (paths, _signature(paths[0]), _signature(paths[1]))
+        except FileNotFoundError:
+            return None
+        if self.compact:
+            try:
+                sig += (_signature(compact_path(paths[0])),)
+            except FileNotFoundError:
+                pass
+        return sig
+
+    def _load_compact(self, model_file, version):
+        """The compact export of `model_file`, if there is one made from this version."""
+        path = compact_path(model_file)
+        if not self.compact or not os.path.exists(path):
+            return None
+        forest = CompactForest(path)
+        # An export left over from an earlier model must not be served
+        return forest if forest.source_version == version else None
+
+    def _run_fallback(self):
+        # One process trains the placeholder; the others wait here and then load its files
+        with file_lock(self.model_file + ".lock"):
+            if self._files_signature() is None:
+                self.fallback()
+
+    def _build_fallback_in_background(self):
+        def run():
+            try:
+                self._run_fallback()
+                self._fallback_built = True
+            except Exception as e:
+                self.last_error = f"Fallback model failed: {type(e).__name__}: {e}"
+
+        if self._fallback_thread is None or not self._fallback_thread.is_alive():
+            self._fallback_thread = threading.Thread(target=run, name="fallback-model", daemon=True)
+            self._fallback_thread.start()
+
+    @property
+    def preparing(self):
+        """True while the background fallback model is being trained."""
+        return self._fallback_thread is not None and self._fallback_thread.is_alive()
+
+    def refresh(self):
+        """Load or swap the model if the files changed; returns True if this call paid the load.
+
+        With no model files and fallback_mode "background", this starts the
+        fallback trainer and returns with `current` still None.
+        """
+        sig = self._files_signature()
+        if self.current is not None and sig == self._signature:
+            return False
+        with self._lock:
+            sig = self._files_signature()
+            if self.current is not None and sig == self._signature:
+                return False  # another session already swapped it in
+
+            status = "fallback" if self._fallback_built else "loaded"
+            if sig is None:
+                if self.current is not None:
+                    return False  # files removed under us: keep serving what we have
+                if self.fallback is None or self.fallback_mode == "off":
+                    raise FileNotFoundError(f"{self.model_file} / {self.scaler_file} not found")
+                if self.fallback_mode == "background":
+                    self._build_fallback_in_background()
+                    return False
+                self._run_fallback()
+                self._fallback_built = True
+                status = "fallback"
+                sig = self._files_signature()
+                if sig is None:
+                    raise FileNotFoundError(f"{self.model_file} / {self.scaler_file} not found")
+
+            start = time.perf_counter()
+            model_file, scaler_file = sig[0]
+            try:
+                version = content_hash(model_file, scaler_file)
+                compact = self._load_compact(model_file, version)
+                if compact is not None:
+                    model, scaler, predictor = compact, None, compact
+                else:
+                    import joblib  # pulls in sklearn when unpickling; only paid when a load happens
+                    model = joblib.load(model_file)
+                    scaler = joblib.load(scaler_file)
+                    predictor = make_predictor(model, scaler, compiled=self.compiled)
+            except Exception as e:
+                # Half-written or invalid upload: keep serving the previous version
+                self.last_error = f"{type(e).__name__}: {e}"
+                if self.current is not None:
+                    self._signature = sig
+                    return False
+                raise
+            loaded = LoadedModel(model, scaler, version, status, time.perf_counter() - start, predictor)
+
+            if self.current is not None and self.current.version != version:
+                self.swaps += 1
+            self.loads += 1
+            self.last_error = None
+            self._fallback_built = False  # later loads are real uploads
+            self._signature = sig
+            self.current = loaded  # single reference assignment: readers see old or new, never a mix
+            return True
+
+    def get(self):
+        self.refresh()
+        return self.current
+
+    def preload(self):
+        """Load the model on a background thread (once), so the first page render does not wait."""
+        if self.current is not None or self._preload_thread is not None:
+            return
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+
+        self._preload_thread = threading.Thread(target=run, name="model-preload", daemon=True)
+        self._preload_thread.start()
+
+    def stats(self):
+        cur = self.current
+        return {
+            "version": cur.version if cur else None,
+            "status": cur.status if cur else None,
+            "load_seconds": cur.load_seconds if cur else None,
+            "engine": cur.predictor.engine if cur else None,
+            "loaded_at": cur.loaded_at if cur else None,
+            "loads": self.loads,
+            "swaps": self.swaps,
+            "last_error": self.last_error,
+            "preparing": self.preparing,
+            "published": artifacts.current_version(self.models_dir) if self.models_dir else None,
+        }
+
+
+def write_atomic(path, data):
+    """Replace `path` with `data` so readers never see a partially written file."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_model_registry(model_file=MODEL_FILE, scaler_file=SCALER_FILE, fallback=None, models_dir=None):
+    """Process-wide ModelRegistry per (model, scaler, models directory)."""
+    key = (os.path.abspath(model_file), os.path.abspath(scaler_file), models_dir and os.path.abspath(models_dir))
+    with _registries_lock:
+        reg = _registries.get(key)
+        if reg is None:
+            reg = ModelRegistry(model_file, scaler_file, fallback, models_dir=models_dir)
+            _registries[key] = reg
+        elif fallback is not None and reg.fallback is None:
+            reg.fallback = fallback
+        return reg
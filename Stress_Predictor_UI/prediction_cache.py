@@ -0,0 +1,162 @@
+# prediction_cache.py
+# Bounded LRU/TTL cache of predictions, in front of the model.
+#
+# The input space is small and discrete (20 integer features), and many users
+# submit the same vectors, so a repeat submission is answered from here without
+# scaling or running the forest. Keys are (model version, feature tuple): an
+# upload from the Admin panel changes the version, which also drops every entry
+# computed by the previous model.
+
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+from config import PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL, PREDICTION_CACHE_WARM
+
+
+class PredictionCache:
+    """Thread-safe LRU cache of (predicted class, probabilities) with a per-entry TTL."""
+
+    def __init__(self, max_entries=PREDICTION_CACHE_SIZE, ttl_seconds=PREDICTION_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()   # key -> (expires_at, pred, proba)
+        self._lock = threading.Lock()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.warmed = 0
+        self._warm_thread = None
+        self._warmed_version = None
+
+    @staticmethod
+    def key(features):
+        return tuple(int(v) for v in np.asarray(features).ravel())
+
+    def _check_version(self, version):
+        # Caller holds the lock
+        if version != self.version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.version = version
+
+    def get(self, version, key):
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                metrics.inc("prediction_cache.misses")
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                metrics.inc("prediction_cache.misses")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        metrics.inc("prediction_cache.hits")
+        return entry[1], entry[2]
+
+    def put(self, version, key, pred, proba):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (time.monotonic() + self.ttl, pred, proba)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._warmed_version = None
+
+    def predict(self, active, features):
+        """(pred, proba, hit) for one feature row, using `active` (a LoadedModel) on a miss."""
+        metrics.inc("predictions")
+        key = self.key(features)
+        if self.max_entries > 0:
+            cached = self.get(active.version, key)
+            if cached is not None:
+                return cached[0], cached[1], True
+        X = np.asarray(key, dtype=float).reshape(1, -1)
+        proba = active.predictor.predict_proba(X)[0]
+        pred = int(active.predictor.classes_[int(proba.argmax())])
+        self.put(active.version, key, pred, proba)
+        return pred, proba, False
+
+    # ---------------------------
+    # Warming
+    # ---------------------------
+    def warm(self, active, vectors):
+        """Pre-compute `vectors` (feature tuples) with one batched predict; returns how many were added."""
+        vectors = [tuple(int(v) for v in vec) for vec in vectors][: self.max_entries]
+        if not vectors:
+            return 0
+        proba = active.predictor.predict_proba(np.asarray(vectors, dtype=float))
+        classes = active.predictor.classes_
+        for vec, row in zip(vectors, proba):
+            self.put(active.version, vec, int(classes[int(row.argmax())]), row)
+        self.warmed += len(vectors)
+        return len(vectors)
+
+    def warm_in_background(self, active, source, limit=PREDICTION_CACHE_WARM):
+        """Warm once per model version on a thread; `source(limit)` returns feature tuples."""
+        if limit <= 0 or self.max_entries <= 0 or self._warmed_version == active.version:
+            return
+        if self._warm_thread is not None and self._warm_thread.is_alive():
+            return
+        self._warmed_version = active.version
+
+        def run():
+            try:
+                self.warm(active, source(limit))
+            except Exception:
+                self._warmed_version = None  # try again after the next load
+
+        self._warm_thread = threading.Thread(target=run, name="prediction-cache-warm", daemon=True)
+        self._warm_thread.start()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "warmed": self.warmed,
+            "version": self.version,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    """Process-wide PredictionCache shared by all sessions."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PredictionCache()
+        return _cache
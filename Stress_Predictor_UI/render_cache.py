@@ -0,0 +1,114 @@
+# render_cache.py
+# Process-wide memo of rendered page parts (derived tables, chart specs).
+#
+# Entries are keyed by the caller, e.g. ("history", history version, username,
+# role), and hold plain objects: DataFrames and Vega-Lite spec dicts. The
+# History page re-runs on every interaction; with the memo, an unchanged rerun
+# skips the queries, pandas and Altair work and only sends the cached objects
+# to the browser. A newer history version makes every older entry unreachable,
+# so they are dropped as soon as it is seen. The total size (DataFrame memory
+# + JSON size of specs) is kept under a byte budget by LRU eviction.
+
+import json
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import metrics
+from config import RENDER_CACHE_BYTES
+
+
+def estimate_size(value):
+    """Rough bytes held by `value` (DataFrames, spec dicts, and containers of them)."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, dict) and not any(isinstance(v, pd.DataFrame) for v in value.values()):
+        try:
+            return len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            pass
+    if isinstance(value, dict):
+        return sum(estimate_size(v) for v in value.values()) + 64 * len(value)
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value) + 8 * len(value)
+    if isinstance(value, str):
+        return len(value)
+    return 64
+
+
+class RenderCache:
+    """LRU memo with a byte budget, shared by all sessions."""
+
+    def __init__(self, max_bytes=RENDER_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (version, size, value)
+        self._lock = threading.Lock()
+        self.version = None
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop_older(self, version):
+        # Caller holds the lock
+        if self.version is not None and version <= self.version:
+            return
+        self.version = version
+        for key in [k for k, (v, _, _) in self._entries.items() if v < version]:
+            self.bytes -= self._entries.pop(key)[1]
+
+    def get_or_build(self, key, version, build):
+        """Cached value for `key` at `version`, else `build()` (stored if it fits the budget)."""
+        with self._lock:
+            self._drop_older(version)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.inc("render_cache.hits")
+                return entry[2]
+            self.misses += 1
+        metrics.inc("render_cache.misses")
+
+        value = build()
+        size = estimate_size(value)
+        if self.max_bytes <= 0 or size > self.max_bytes:
+            return value
+        with self._lock:
+            if self.version is not None and version < self.version:
+                return value  # a newer version arrived while building
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (version, size, value)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+        return {"entries": entries, "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_render_cache():
+    """Process-wide RenderCache shared by all sessions."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RenderCache()
+        return _cache
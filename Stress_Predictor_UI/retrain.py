@@ -0,0 +1,321 @@
+# retrain.py
+# Incremental retraining: grow the served forest with trees fitted on
+# StressLevelDataset plus the verified rows of prediction history.
+#
+# A full search (train_pipeline.py) refits every model from scratch. Here the
+# published model is kept as it is and warm_start adds RETRAIN_ADD_TREES new
+# trees, fitted on the dataset's training split and the history rows, scaled
+# with the served scaler so old and new trees read the same features:
+#   - preprocessing is cached under TRAIN_CACHE_DIR per scaler: the scaled
+#     dataset split once, the history rows incrementally (only rows with an id
+#     above the last one read are fetched, checked and scaled);
+#   - history rows are used only if they are complete and inside the input
+#     contract of the app and API (0/1 answers, 1-10 scales, a known label).
+#     Their labels are the model's own predictions, so they steer the new
+#     trees towards the inputs users actually send, not towards new truths;
+#   - the new model is cross-validated on a process pool (every fold grows
+#     its own copy) next to a full refit of the same size, for comparison;
+#   - it becomes a version only if its accuracy on the dataset's held-out
+#     split (never trained on) is not below the current model's; --publish
+#     then serves it. Nothing happens until RETRAIN_MIN_NEW_ROWS verified rows
+#     have arrived since the model was last grown.
+#
+#   python retrain.py                   # evaluate, and write a version if it does not regress
+#   python retrain.py --publish --jobs 4
+
+import os
+import copy
+import time
+import hashlib
+import argparse
+import warnings
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import artifacts
+from config import (
+    DATASET_FILE, MODELS_DIR, MODEL_FILE, SCALER_FILE, TRAIN_CACHE_DIR,
+    FEATURE_COLUMNS, BINARY_FEATURES, LABEL_MAP,
+)
+from train_pipeline import TARGET, load_dataset, write_artifact, publish
+
+RETRAIN_ADD_TREES = 50
+RETRAIN_MIN_NEW_ROWS = 100
+# Above this many trees grow no further: run train_pipeline.py for a fresh model
+RETRAIN_MAX_TREES = 1000
+
+
+def verify_rows(frame):
+    """Mask of history rows that are complete and inside the app's input contract."""
+    ok = frame[FEATURE_COLUMNS + [TARGET]].notna().all(axis=1)
+    for col in FEATURE_COLUMNS:
+        lo, hi = (0, 1) if col in BINARY_FEATURES else (1, 10)
+        ok &= frame[col].between(lo, hi)
+    return ok & frame[TARGET].isin(list(LABEL_MAP))
+
+
+def _scale(scaler, X):
+    with warnings.catch_warnings():
+        # History rows carry the app's column names, the scaler the dataset's
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        return scaler.transform(np.asarray(X, dtype=np.float64))
+
+
+def _save_npz(path, **arrays):
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+def _row_timestamp(store, row_id):
+    for chunk in store.iter_chunks(columns=["timestamp"], where="id = ?", params=(row_id,)):
+        return float(chunk["timestamp"].iloc[0])
+    return None
+
+
+# ---------------------------
+# Cached preprocessing
+# ---------------------------
+class PreprocessCache:
+    """Scaled dataset split and history rows for one scaler, as .npz files under `root`."""
+
+    def __init__(self, scaler, root=TRAIN_CACHE_DIR):
+        self.scaler = scaler
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        h = hashlib.sha256()
+        h.update(np.ascontiguousarray(scaler.mean_, dtype=np.float64).tobytes())
+        h.update(np.ascontiguousarray(scaler.scale_, dtype=np.float64).tobytes())
+        self.scaler_key = h.hexdigest()[:12]
+
+    def dataset(self, path=DATASET_FILE, test_size=0.2, seed=0):
+        """(X_train, X_test, y_train, y_test): the notebook's stratified split, scaled."""
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            h.update(f.read())
+        h.update(f"{self.scaler_key}-{test_size}-{seed}".encode())
+        cached = os.path.join(self.root, f"dataset-{h.hexdigest()[:16]}.npz")
+        if os.path.exists(cached):
+            with np.load(cached) as z:
+                return z["X_train"], z["X_test"], z["y_train"], z["y_test"]
+        from sklearn.model_selection import train_test_split
+        X, y = load_dataset(path)
+        # The split depends only on y and the seed, so indices give the same one as prepare()
+        train, test = train_test_split(np.arange(len(y)), test_size=test_size, random_state=seed, stratify=y)
+        Xs = _scale(self.scaler, X.to_numpy())
+        out = {"X_train": Xs[train], "X_test": Xs[test], "y_train": y[train], "y_test": y[test]}
+        _save_npz(cached, **out)
+        return out["X_train"], out["X_test"], out["y_train"], out["y_test"]
+
+    def history(self, store):
+        """(X, y, ids, rows read now, rows rejected now) for all verified history rows so far."""
+        key = hashlib.sha256(os.path.abspath(store.path).encode()).hexdigest()[:12]
+        cached = os.path.join(self.root, f"history-{self.scaler_key}-{key}.npz")
+        X = np.empty((0, len(FEATURE_COLUMNS)))
+        y = ids = np.empty(0, dtype=np.int64)
+        seq = 0
+        if os.path.exists(cached):
+            with np.load(cached) as z:
+                # Only if the database still holds the row the cache ended with (not replaced or restored)
+                if ("last_ts" in z and int(z["seq"]) <= store.version()
+                        and _row_timestamp(store, int(z["seq"])) == float(z["last_ts"])):
+                    X, y, ids, seq = z["X"], z["y"], z["ids"], int(z["seq"])
+        read = rejected = 0
+        parts = [(X, y, ids)]
+        for chunk in store.iter_chunks(columns=["id"] + FEATURE_COLUMNS + [TARGET], where="id > ?", params=(seq,)):
+            seq = int(chunk["id"].max())
+            ok = verify_rows(chunk)
+            read += len(chunk)
+            rejected += int((~ok).sum())
+            good = chunk[ok]
+            parts.append((_scale(self.scaler, good[FEATURE_COLUMNS]), good[TARGET].to_numpy(np.int64),
+                          good["id"].to_numpy(np.int64)))
+        if read:
+            X, y, ids = (np.concatenate(a) for a in zip(*parts))
+            _save_npz(cached, X=X, y=y, ids=ids, seq=seq, last_ts=_row_timestamp(store, seq))
+        return X, y, ids, read, rejected
+
+
+# ---------------------------
+# Growing and evaluation (fold tasks run in the worker processes)
+# ---------------------------
+def grow(model, X, y, add_trees=RETRAIN_ADD_TREES):
+    """A copy of `model` with `add_trees` more trees fitted on (X, y); the existing trees are kept."""
+    est = copy.deepcopy(model)
+    est.set_params(warm_start=True, n_estimators=model.n_estimators + add_trees)
+    est.fit(X, y)
+    est.set_params(warm_start=False)
+    return est
+
+
+_worker = {}
+
+
+def _init_worker(model, X, y, folds, X_test, y_test):
+    warnings.filterwarnings("ignore")
+    _worker.update(model=model, X=X, y=y, folds=folds, X_test=X_test, y_test=y_test)
+
+
+def _fold_task(fold, add_trees):
+    model, X, y = _worker["model"], _worker["X"], _worker["y"]
+    train_idx, valid_idx = _worker["folds"][fold]
+    start = time.perf_counter()
+    est = grow(model, X[train_idx], y[train_idx], add_trees)
+    fit_seconds = time.perf_counter() - start
+    return {"fold": fold, "score": float((est.predict(X[valid_idx]) == y[valid_idx]).mean()),
+            "fit_seconds": fit_seconds}
+
+
+def _grow_task(add_trees):
+    start = time.perf_counter()
+    est = grow(_worker["model"], _worker["X"], _worker["y"], add_trees)
+    return est, time.perf_counter() - start
+
+
+def _full_refit_task(n_estimators):
+    """The same forest, all trees fitted from scratch on the same data: the cost warm_start avoids."""
+    from sklearn.base import clone
+    est = clone(_worker["model"]).set_params(n_estimators=n_estimators, warm_start=False)
+    start = time.perf_counter()
+    est.fit(_worker["X"], _worker["y"])
+    fit_seconds = time.perf_counter() - start
+    accuracy = float((est.predict(_worker["X_test"]) == _worker["y_test"]).mean())
+    return {"fit_seconds": fit_seconds, "holdout_accuracy": accuracy}
+
+
+# ---------------------------
+# Job
+# ---------------------------
+def run(store, dataset=DATASET_FILE, models_dir=MODELS_DIR, add_trees=RETRAIN_ADD_TREES,
+        min_new_rows=RETRAIN_MIN_NEW_ROWS, max_trees=RETRAIN_MAX_TREES, n_folds=5, jobs=None,
+        compare_full=True, cache_dir=TRAIN_CACHE_DIR, seed=0, log=print):
+    """Grow the served model from history; returns (artifact directory or None, metadata)."""
+    import joblib
+    from sklearn.model_selection import StratifiedKFold
+    from model_registry import ModelRegistry, content_hash
+    started = time.perf_counter()
+
+    model_file, scaler_file = ModelRegistry(MODEL_FILE, SCALER_FILE, fallback_mode="off",
+                                            models_dir=models_dir).paths()
+    parent = content_hash(model_file, scaler_file)
+    current = artifacts.current_version(models_dir)
+    parent_meta = artifacts.read_metadata(current, models_dir) if current else {}
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore")
+        model, scaler = joblib.load(model_file), joblib.load(scaler_file)
+    if not ("warm_start" in model.get_params() and "n_estimators" in model.get_params()):
+        raise ValueError(f"{type(model).__name__} cannot grow incrementally; run train_pipeline.py for a full refit")
+    if model.n_estimators + add_trees > max_trees:
+        raise ValueError(f"The model already has {model.n_estimators} trees (limit {max_trees}); "
+                         "run train_pipeline.py for a fresh one")
+
+    start = time.perf_counter()
+    cache = PreprocessCache(scaler, cache_dir)
+    X_ds, X_test, y_ds, y_test = cache.dataset(dataset, seed=seed)
+    X_hist, y_hist, ids, read, rejected = cache.history(store)
+    preprocess_seconds = time.perf_counter() - start
+    new_rows = int((ids > parent_meta.get("history_seq", 0)).sum())
+    log(f"parent {parent} ({model.n_estimators} trees); {len(y_ds)} dataset rows, {len(y_hist)} verified history "
+        f"rows ({new_rows} new; {read} read and {rejected} rejected this run) in {preprocess_seconds:.2f}s")
+
+    metadata = {
+        "created_at": datetime.now().isoformat(),
+        "candidate": parent_meta.get("candidate", type(model).__name__),
+        "retrained_from": parent,
+        "history_seq": int(ids.max()) if len(ids) else parent_meta.get("history_seq", 0),
+        "history_rows": int(len(y_hist)),
+        "new_history_rows": new_rows,
+        "dataset_rows": int(len(y_ds)),
+        "n_estimators": model.n_estimators + add_trees,
+        "added_trees": add_trees,
+        "preprocess_seconds": preprocess_seconds,
+    }
+    if new_rows < min_new_rows:
+        metadata["skipped"] = f"{new_rows} new verified history rows, need {min_new_rows}"
+        metadata["wall_seconds"] = time.perf_counter() - started
+        return None, metadata
+
+    X = np.vstack([X_ds, X_hist])
+    y = np.concatenate([y_ds, y_hist])
+    skf = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed)
+    folds = list(skf.split(X, y))
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(model, X, y, folds, X_test, y_test)) as pool:
+        grown = pool.submit(_grow_task, add_trees)
+        full = pool.submit(_full_refit_task, model.n_estimators + add_trees) if compare_full else None
+        fold_results = list(pool.map(_fold_task, range(n_folds), [add_trees] * n_folds))
+        new_model, grow_seconds = grown.result()
+        full_result = full.result() if full is not None else None
+    eval_seconds = time.perf_counter() - start
+
+    current_accuracy = float((model.predict(X_test) == y_test).mean())
+    new_accuracy = float((new_model.predict(X_test) == y_test).mean())
+    accepted = new_accuracy >= current_accuracy
+    metadata.update({
+        "cv_score": float(np.mean([r["score"] for r in fold_results])),
+        "fold_scores": [r["score"] for r in fold_results],
+        "test_accuracy": new_accuracy,
+        "parent_test_accuracy": current_accuracy,
+        "retrain_seconds": grow_seconds,
+        "full_refit": full_result,
+        "eval_seconds": eval_seconds,
+        "accepted": accepted,
+        "wall_seconds": time.perf_counter() - started,
+    })
+    if not accepted:
+        return None, metadata
+    out = write_artifact(new_model, scaler, metadata, models_dir)
+    metadata["version"] = os.path.basename(out)
+    return out, metadata
+
+
+def print_report(metadata):
+    if "skipped" in metadata:
+        print(f"nothing to do: {metadata['skipped']}")
+        return
+    print(f"\nholdout accuracy {metadata['parent_test_accuracy']:.4f} -> {metadata['test_accuracy']:.4f}  "
+          f"({'accepted' if metadata['accepted'] else 'rejected: accuracy would drop'})")
+    print(f"cv over {len(metadata['fold_scores'])} folds {metadata['cv_score']:.4f} "
+          f"({' '.join(f'{s:.4f}' for s in metadata['fold_scores'])})")
+    print(f"\n{'step':<28} {'seconds':>8}")
+    print(f"{'preprocessing (cached)':<28} {metadata['preprocess_seconds']:>8.2f}")
+    print(f"{'warm start +' + str(metadata['added_trees']) + ' trees':<28} {metadata['retrain_seconds']:>8.2f}")
+    full = metadata["full_refit"]
+    if full:
+        print(f"{'full refit ' + str(metadata['n_estimators']) + ' trees':<28} {full['fit_seconds']:>8.2f}  "
+              f"(holdout {full['holdout_accuracy']:.4f}; warm start is "
+              f"{full['fit_seconds'] / metadata['retrain_seconds']:.1f}x faster)")
+    print(f"{'evaluation (pool, wall)':<28} {metadata['eval_seconds']:>8.2f}")
+    print(f"{'total':<28} {metadata['wall_seconds']:>8.2f}")
+
+
+if __name__ == "__main__":
+    from history_store import HistoryStore
+    from storage import get_storage
+
+    parser = argparse.ArgumentParser(description="Grow the served forest from verified prediction history")
+    parser.add_argument("--db", help="history database (default: the configured storage)")
+    parser.add_argument("--dataset", default=DATASET_FILE)
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--add-trees", type=int, default=RETRAIN_ADD_TREES)
+    parser.add_argument("--min-new-rows", type=int, default=RETRAIN_MIN_NEW_ROWS)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--no-compare", action="store_true", help="skip the full refit used for comparison")
+    parser.add_argument("--cache-dir", default=TRAIN_CACHE_DIR)
+    parser.add_argument("--publish", action="store_true", help="serve the result if it was accepted")
+    args = parser.parse_args()
+
+    store = HistoryStore(args.db, legacy_csv=None) if args.db else get_storage().history
+    out, meta = run(store, args.dataset, args.models_dir, args.add_trees, args.min_new_rows, n_folds=args.folds,
+                    jobs=args.jobs, compare_full=not args.no_compare, cache_dir=args.cache_dir)
+    print_report(meta)
+    if out:
+        print(f"artifact: {out}")
+        if args.publish:
+            print(f"published {publish(out, args.models_dir)}")
+    elif meta.get("accepted") is False:
+        raise SystemExit(1)
@@ -0,0 +1,119 @@
+# startup_report.py
+# Startup timing: per-run phase timings recorded by app.py.py, plus a CLI that
+# measures a cold start in a fresh interpreter.
+#
+# Phases: "import" (script start -> helper modules imported), "init" (stores
+# opened), "model_load" (deserialization paid by this run, 0 when cached) and
+# "render" (the page itself). The first run of the process is kept separately,
+# since that is the cold start users wait for.
+#
+#   python startup_report.py            # cold start of app.py.py, as JSON
+#
+# Set STRESS_STARTUP_REPORT=1 to also print the first run's timings to stdout.
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import threading
+
+_lock = threading.Lock()
+_local = threading.local()
+_first_run = None
+_last_run = None
+_runs = 0
+
+
+def begin_run(started):
+    _local.started = started
+    _local.phases = {}
+    _local.mark = started
+
+
+def mark(phase, seconds=None):
+    """Record `phase`; without `seconds`, it is the time since the previous mark."""
+    now = time.perf_counter()
+    if not hasattr(_local, "phases"):
+        begin_run(now)
+    if seconds is None:
+        seconds = now - _local.mark
+    _local.phases[phase] = _local.phases.get(phase, 0.0) + seconds
+    _local.mark = now
+
+
+def finish_run():
+    global _first_run, _last_run, _runs
+    if not hasattr(_local, "phases"):
+        return
+    phases = dict(_local.phases)
+    phases["total"] = time.perf_counter() - _local.started
+    with _lock:
+        _runs += 1
+        _last_run = phases
+        if _first_run is None:
+            _first_run = phases
+            if os.environ.get("STRESS_STARTUP_REPORT") == "1":
+                print("startup:", json.dumps({k: round(v, 4) for k, v in phases.items()}), flush=True)
+    del _local.phases
+
+
+def report():
+    with _lock:
+        return {"first_run": _first_run, "last_run": _last_run, "runs": _runs}
+
+
+# ---------------------------
+# Cold-start measurement in a fresh interpreter
+# ---------------------------
+_PROBE = r"""
+import sys, json, time
+HEAVY = ("sklearn", "altair", "joblib")
+t0 = time.perf_counter()
+import streamlit, numpy, pandas
+import config, history_store, user_store, model_registry, batch_predict, analytics, fallback_model
+out = {"import": time.perf_counter() - t0}
+out["heavy_modules_after_import"] = sorted(m for m in HEAVY if m in sys.modules)
+
+# Same process-wide registry the app will use, so the render below does not load it again
+t1 = time.perf_counter()
+reg = model_registry.get_model_registry(config.MODEL_FILE, config.SCALER_FILE, models_dir=config.MODELS_DIR)
+reg.fallback_mode = "off"
+try:
+    reg.get()
+    out["model_load"] = time.perf_counter() - t1
+except FileNotFoundError:
+    out["model_load"] = None
+
+try:
+    from streamlit.testing.v1 import AppTest
+except ImportError:
+    out["first_render"] = None
+else:
+    t2 = time.perf_counter()
+    at = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+    out["first_render"] = time.perf_counter() - t2
+    out["render_exception"] = [str(e.value) for e in at.exception] or None
+print(json.dumps(out))
+"""
+
+
+def measure_cold_start(app_path="app.py.py"):
+    """Run the probe in a new interpreter so nothing is pre-imported or cached."""
+    proc = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", _PROBE, app_path],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(app_path)) or ".",
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "probe failed")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the app's cold-start phases")
+    parser.add_argument("--app", default="app.py.py")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+    results = [measure_cold_start(args.app) for _ in range(args.repeat)]
+    print(json.dumps(results[0] if args.repeat == 1 else results, indent=2))
@@ -0,0 +1,113 @@
+# storage.py
+# Pluggable storage for users and history, plus a cross-process file lock.
+#
+# A backend is a factory `data_dir -> (history store, user repository)`
+# registered under a name; STRESS_STORAGE picks one (config.STORAGE_BACKEND).
+# Built in:
+#   sqlite        both tables in stress_app.db (the default, as before)
+#   sqlite-split  history and users in separate database files, so logins and
+#                 sign-ups never wait behind history writers
+# Both use WAL with busy_timeout, and every write is a BEGIN IMMEDIATE
+# transaction, so any number of worker processes can share the files. For a
+# multi-worker deployment point STRESS_DATA_DIR of every worker at the same
+# local directory (SQLite locking is not reliable on network file systems).
+
+import os
+import threading
+from contextlib import contextmanager
+from collections import namedtuple
+
+from config import DATA_DIR, STORAGE_BACKEND, DB_FILE, USERS_CSV, HISTORY_CSV
+
+Storage = namedtuple("Storage", ["backend", "history", "users"])
+
+BACKENDS = {}
+
+
+def register_backend(name, factory):
+    """Make `factory(data_dir)` -> (history store, user repository) available as STRESS_STORAGE=name."""
+    BACKENDS[name] = factory
+
+
+def _sqlite(data_dir):
+    from history_store import get_history_store
+    from user_store import get_user_repository
+    db = os.path.join(data_dir, os.path.basename(DB_FILE))
+    return (get_history_store(db, legacy_csv=os.path.join(data_dir, os.path.basename(HISTORY_CSV))),
+            get_user_repository(db, legacy_csv=os.path.join(data_dir, os.path.basename(USERS_CSV))))
+
+
+def _sqlite_split(data_dir):
+    from history_store import get_history_store
+    from user_store import get_user_repository
+    return (get_history_store(os.path.join(data_dir, "stress_history.db"),
+                              legacy_csv=os.path.join(data_dir, os.path.basename(HISTORY_CSV))),
+            get_user_repository(os.path.join(data_dir, "stress_users.db"),
+                                legacy_csv=os.path.join(data_dir, os.path.basename(USERS_CSV))))
+
+
+register_backend("sqlite", _sqlite)
+register_backend("sqlite-split", _sqlite_split)
+
+
+def open_storage(backend=STORAGE_BACKEND, data_dir=DATA_DIR):
+    factory = BACKENDS.get(backend)
+    if factory is None:
+        raise ValueError(f"Unknown storage backend {backend!r}; choose from {', '.join(BACKENDS)}")
+    if data_dir:
+        os.makedirs(data_dir, exist_ok=True)
+    history, users = factory(data_dir)
+    return Storage(backend, history, users)
+
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+def get_storage(backend=STORAGE_BACKEND, data_dir=DATA_DIR):
+    """Process-wide Storage per (backend, data directory)."""
+    key = (backend, os.path.abspath(data_dir or "."))
+    with _storages_lock:
+        storage = _storages.get(key)
+        if storage is None:
+            storage = open_storage(backend, data_dir)
+            _storages[key] = storage
+        return storage
+
+
+# ---------------------------
+# File lock
+# ---------------------------
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock on `path` across processes (and threads of this process); blocks until free."""
+    path = os.path.abspath(path)
+    with _thread_locks_guard:
+        local = _thread_locks.setdefault(path, threading.Lock())
+    with local:
+        with open(path, "a+b") as f:
+            if os.name == "nt":
+                import msvcrt
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass  # LK_LOCK gives up after ~10 s; keep waiting
+                try:
+                    yield
+                finally:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
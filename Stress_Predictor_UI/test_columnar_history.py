@@ -0,0 +1,24 @@
+# test_columnar_history.py
+# time_range bounds given as NumPy scalars, as they come out of a DataFrame.
+#
+#   python -m pytest -q test_columnar_history.py      (run from Stress_Predictor_UI/)
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from columnar_history import ColumnarHistory, synthetic_history, write_frame
+
+
+def test_time_range_numpy_bounds(tmp_path):
+    df = synthetic_history(2000, users=20, days=90)
+    write_frame(df, root=str(tmp_path))
+    ts = df["timestamp"].to_numpy()
+    start, end = np.int64(ts[500]), np.int64(ts[1500])
+    assert isinstance(start, np.integer)
+
+    got = ColumnarHistory(str(tmp_path)).time_range(start, end, columns=["timestamp"])
+    expected = ts[(ts >= int(start)) & (ts < int(end))]
+    assert len(got) == len(expected) > 0
+    assert np.allclose(np.sort(got["timestamp"].to_numpy()), expected)
@@ -0,0 +1,342 @@
+# train_pipeline.py
+# Scripted version of the model selection in "Stress_Level_Prediction (1).ipynb".
+#
+# Same data preparation as the notebook (StandardScaler on the 20 dataset
+# columns, 80/20 stratified split with random_state=0), but:
+#   - every (candidate, grid point, CV fold) fit is a task on a process pool,
+#     so models and folds train concurrently instead of one after another;
+#   - grid points are compared by successive halving: all of them are scored
+#     on a small share of the training data, the best 1/factor move on to a
+#     share `factor` times larger, until the last rung uses all of it;
+#   - each fold's score is cached under TRAIN_CACHE_DIR, keyed on the data,
+#     model, parameters, fold and sample count, so an interrupted or repeated
+#     run only fits what it has not seen before;
+#   - the winner is refit and written as models/<version>/ (best_model.pkl,
+#     scaler.pkl, metadata.json, and best_model.cforest for forests, see
+#     compact_forest.py); --publish also points models/CURRENT at it,
+#     which the app's ModelRegistry follows and hot-swaps (artifacts.py).
+#
+# SVC is searched with probability=False (Platt scaling is only needed by the
+# final model, so only the refit pays for it). XGBoost is included when installed.
+#
+#   python train_pipeline.py --jobs 4
+#   python train_pipeline.py --candidates random_forest,gradient_boosting --publish
+
+import os
+import json
+import math
+import time
+import shutil
+import hashlib
+import argparse
+import itertools
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import artifacts
+from config import DATASET_FILE, MODELS_DIR, TRAIN_CACHE_DIR
+
+TARGET = "stress_level"
+
+# name -> parameter grid (the RF and XGBoost grids are the notebook's)
+SEARCH_SPACE = {
+    "logistic_regression": {"C": [0.1, 1.0, 10.0]},
+    "random_forest": {"n_estimators": [100, 200, 300], "max_depth": [5, 10, None]},
+    "svm": {"C": [0.5, 1.0, 2.0]},
+    "gradient_boosting": {"n_estimators": [100, 200], "learning_rate": [0.05, 0.1]},
+    "xgboost": {"n_estimators": [100, 200, 300], "max_depth": [3, 5, 7], "learning_rate": [0.01, 0.1, 0.2]},
+}
+
+
+def xgboost_available():
+    try:
+        import xgboost  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_estimator(name, params, final=False):
+    """A fresh estimator for `name`; `final` enables what only the shipped model needs."""
+    if name == "logistic_regression":
+        from sklearn.linear_model import LogisticRegression
+        return LogisticRegression(max_iter=1000, **params)
+    if name == "random_forest":
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(random_state=0, n_jobs=1, **params)
+    if name == "svm":
+        from sklearn.svm import SVC
+        return SVC(kernel="rbf", gamma="scale", probability=final, **params)
+    if name == "gradient_boosting":
+        from sklearn.ensemble import GradientBoostingClassifier
+        return GradientBoostingClassifier(random_state=0, **params)
+    if name == "xgboost":
+        from xgboost import XGBClassifier
+        return XGBClassifier(random_state=0, eval_metric="mlogloss", n_jobs=1, **params)
+    raise ValueError(f"Unknown candidate: {name}")
+
+
+def grid_points(names):
+    points = []
+    for name in names:
+        grid = SEARCH_SPACE[name]
+        keys = sorted(grid)
+        for values in itertools.product(*(grid[k] for k in keys)):
+            points.append((name, dict(zip(keys, values))))
+    return points
+
+
+# ---------------------------
+# Data
+# ---------------------------
+def load_dataset(path=DATASET_FILE):
+    # StressLevelDataset.xls is CSV text; fall back to Excel for a real workbook
+    try:
+        df = pd.read_csv(path)
+    except (UnicodeDecodeError, pd.errors.ParserError):
+        df = pd.read_excel(path)
+    X = df.drop(columns=[TARGET])
+    return X, df[TARGET].to_numpy()
+
+
+def prepare(X, y, test_size=0.2, seed=0):
+    """Scaler fitted on all of X and a stratified split, exactly as in the notebook."""
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.model_selection import train_test_split
+    scaler = StandardScaler().fit(X)
+    X_train, X_test, y_train, y_test = train_test_split(
+        scaler.transform(X), y, test_size=test_size, random_state=seed, stratify=y)
+    return scaler, X_train, X_test, y_train, y_test
+
+
+def data_hash(X, y):
+    h = hashlib.sha256()
+    h.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(y, dtype=np.int64).tobytes())
+    return h.hexdigest()[:16]
+
+
+# ---------------------------
+# Fold tasks (run in the worker processes)
+# ---------------------------
+_worker = {}
+
+
+def _init_worker(X, y, folds):
+    import warnings
+    warnings.filterwarnings("ignore")
+    _worker.update(X=X, y=y, folds=folds)
+
+
+def _fit_fold(name, params, fold, n_samples):
+    """Fit on the first `n_samples`-share of the fold's (shuffled) training part, score on its validation part."""
+    X, y, folds = _worker["X"], _worker["y"], _worker["folds"]
+    train_idx, valid_idx = folds[fold]
+    take = max(1, int(round(len(train_idx) * n_samples / len(X))))
+    train_idx = train_idx[:take]
+    est = build_estimator(name, params)
+    start = time.perf_counter()
+    est.fit(X[train_idx], y[train_idx])
+    fit_seconds = time.perf_counter() - start
+    score = float((est.predict(X[valid_idx]) == y[valid_idx]).mean())
+    return {"score": score, "fit_seconds": fit_seconds}
+
+
+class FoldCache:
+    """One small JSON file per finished fold fit, written atomically."""
+
+    def __init__(self, root=TRAIN_CACHE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(dataset, name, params, fold, n_folds, n_samples, seed):
+        import sklearn
+        raw = json.dumps([dataset, name, params, fold, n_folds, n_samples, seed, sklearn.__version__],
+                         sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()[:24]
+
+    def get(self, key):
+        try:
+            with open(os.path.join(self.root, key + ".json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, key, result):
+        path = os.path.join(self.root, key + ".json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp, path)
+
+
+# ---------------------------
+# Successive halving
+# ---------------------------
+def successive_halving(points, X, y, n_folds=5, factor=3, min_samples=100, jobs=None,
+                       cache=None, seed=0, log=print):
+    """Score grid `points` with successive halving; returns (ranked results, per-candidate cost)."""
+    from sklearn.model_selection import StratifiedKFold
+    rng = np.random.default_rng(seed)
+    skf = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed)
+    # Shuffle each fold's training part once, so every rung's subsample is a prefix of the next
+    folds = [(rng.permutation(tr), va) for tr, va in skf.split(X, y)]
+    dataset = data_hash(X, y)
+    cache = cache or FoldCache()
+
+    n_rungs = 1 + int(math.floor(math.log(max(len(points), 1), factor)))
+    while n_rungs > 1 and len(X) / factor ** (n_rungs - 1) < min_samples:
+        n_rungs -= 1
+
+    cost = {}
+    survivors = [(name, params) for name, params in points]
+    ranked = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(X, y, folds)) as pool:
+        for rung in range(n_rungs):
+            n_samples = len(X) if rung == n_rungs - 1 else int(len(X) / factor ** (n_rungs - 1 - rung))
+            scores = {i: [None] * n_folds for i in range(len(survivors))}
+            pending = {}
+            fits = hits = 0
+            for i, (name, params) in enumerate(survivors):
+                for fold in range(n_folds):
+                    key = FoldCache.key(dataset, name, params, fold, n_folds, n_samples, seed)
+                    cached = cache.get(key)
+                    if cached is not None:
+                        scores[i][fold] = cached["score"]
+                        cost.setdefault(name, {"fits": 0, "cached": 0, "fit_seconds": 0.0})["cached"] += 1
+                        hits += 1
+                        continue
+                    fut = pool.submit(_fit_fold, name, params, fold, n_samples)
+                    pending[fut] = (i, fold, key)
+            for fut in as_completed(pending):
+                i, fold, key = pending[fut]
+                result = fut.result()
+                cache.put(key, result)  # saved as soon as it finishes, so an interrupted run resumes here
+                scores[i][fold] = result["score"]
+                c = cost.setdefault(survivors[i][0], {"fits": 0, "cached": 0, "fit_seconds": 0.0})
+                c["fits"] += 1
+                c["fit_seconds"] += result["fit_seconds"]
+                fits += 1
+
+            ranked = sorted(
+                ({"name": name, "params": params, "cv_score": float(np.mean(scores[i])), "n_samples": n_samples}
+                 for i, (name, params) in enumerate(survivors)),
+                key=lambda r: r["cv_score"], reverse=True,
+            )
+            log(f"rung {rung}: {len(survivors)} configs x {n_folds} folds on {n_samples} samples "
+                f"({fits} fitted, {hits} cached); best {ranked[0]['name']} {ranked[0]['params']} "
+                f"cv={ranked[0]['cv_score']:.4f}")
+            keep = max(1, math.ceil(len(survivors) / factor))
+            survivors = [(r["name"], r["params"]) for r in ranked[:keep]]
+    return ranked, cost
+
+
+# ---------------------------
+# Artifact
+# ---------------------------
+def write_artifact(model, scaler, metadata, models_dir=MODELS_DIR):
+    """Write models/<version>/ and return its path; the directory appears only when complete."""
+    import joblib
+    import compact_forest
+    from forest_engine import is_supported
+    # Forests also get the memory-mapped compact export the registry prefers
+    extras = {}
+    if is_supported(model, scaler):
+        extras[compact_forest.compact_path(artifacts.MODEL_NAME)] = \
+            lambda path, digest: compact_forest.export(model, scaler, path, source_version=digest)
+    # Same hash the ModelRegistry reports, so the app's "Version" matches the directory name
+    return artifacts.write_version({
+        artifacts.MODEL_NAME: lambda path: joblib.dump(model, path),
+        artifacts.SCALER_NAME: lambda path: joblib.dump(scaler, path),
+    }, metadata, models_dir, extras)
+
+
+def publish(artifact_dir, models_dir=MODELS_DIR):
+    """Make an artifact the served model: models/CURRENT is switched in one atomic rename."""
+    return artifacts.publish(artifact_dir, models_dir)
+
+
+def run(candidates=None, dataset=DATASET_FILE, n_folds=5, factor=3, jobs=None, seed=0,
+        cache_dir=TRAIN_CACHE_DIR, models_dir=MODELS_DIR, log=print):
+    """The whole pipeline; returns (artifact directory, metadata)."""
+    import sklearn
+    started = time.perf_counter()
+    names = candidates or [n for n in SEARCH_SPACE if n != "xgboost" or xgboost_available()]
+    X_df, y = load_dataset(dataset)
+    scaler, X_train, X_test, y_train, y_test = prepare(X_df, y, seed=seed)
+    points = grid_points(names)
+    log(f"{len(points)} grid points over {', '.join(names)}; {len(X_train)} training rows, "
+        f"{jobs or os.cpu_count()} workers")
+
+    ranked, cost = successive_halving(points, X_train, y_train, n_folds=n_folds, factor=factor,
+                                      jobs=jobs, cache=FoldCache(cache_dir), seed=seed, log=log)
+    best = ranked[0]
+
+    start = time.perf_counter()
+    model = build_estimator(best["name"], best["params"], final=True)
+    model.fit(X_train, y_train)
+    refit_seconds = time.perf_counter() - start
+    test_accuracy = float((model.predict(X_test) == y_test).mean())
+
+    metadata = {
+        "created_at": datetime.now().isoformat(),
+        "candidate": best["name"],
+        "params": best["params"],
+        "cv_score": best["cv_score"],
+        "test_accuracy": test_accuracy,
+        "feature_columns": list(X_df.columns),
+        "dataset": os.path.abspath(dataset),
+        "dataset_hash": data_hash(X_train, y_train),
+        "sklearn_version": sklearn.__version__,
+        "search": {"n_folds": n_folds, "factor": factor, "grid_points": len(points), "cost": cost},
+        "refit_seconds": refit_seconds,
+        "wall_seconds": time.perf_counter() - started,
+    }
+    out = write_artifact(model, scaler, metadata, models_dir)
+    metadata["version"] = os.path.basename(out)
+    return out, metadata
+
+
+def print_report(metadata):
+    cost = metadata["search"]["cost"]
+    print(f"\n{'candidate':<22} {'fits':>6} {'cached':>7} {'fit s':>9} {'s/fit':>8}")
+    for name, c in sorted(cost.items(), key=lambda kv: -kv[1]["fit_seconds"]):
+        per_fit = c["fit_seconds"] / c["fits"] if c["fits"] else 0.0
+        print(f"{name:<22} {c['fits']:>6} {c['cached']:>7} {c['fit_seconds']:>9.2f} {per_fit:>8.3f}")
+    serial = sum(c["fit_seconds"] for c in cost.values())
+    print(f"\nbest: {metadata['candidate']} {metadata['params']}  cv={metadata['cv_score']:.4f}  "
+          f"test={metadata['test_accuracy']:.4f}")
+    print(f"wall clock {metadata['wall_seconds']:.2f}s (fit time summed over workers {serial:.2f}s, "
+          f"final refit {metadata['refit_seconds']:.2f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel, resumable model selection")
+    parser.add_argument("--dataset", default=DATASET_FILE)
+    parser.add_argument("--candidates", help="comma-separated subset of: " + ", ".join(SEARCH_SPACE))
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--factor", type=int, default=3, help="successive-halving reduction factor")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--cache-dir", default=TRAIN_CACHE_DIR)
+    parser.add_argument("--clear-cache", action="store_true")
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--publish", action="store_true", help="serve the result (points models/CURRENT at it)")
+    args = parser.parse_args()
+
+    if args.clear_cache:
+        shutil.rmtree(args.cache_dir, ignore_errors=True)
+    names = args.candidates.split(",") if args.candidates else None
+    for name in names or []:
+        if name not in SEARCH_SPACE:
+            raise SystemExit(f"Unknown candidate {name!r}; choose from {', '.join(SEARCH_SPACE)}")
+
+    out, meta = run(names, args.dataset, args.folds, args.factor, args.jobs, cache_dir=args.cache_dir,
+                    models_dir=args.models_dir)
+    print_report(meta)
+    print(f"artifact: {out}")
+    if args.publish:
+        print(f"published {publish(out, args.models_dir)}")
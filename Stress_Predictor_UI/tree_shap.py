@@ -0,0 +1,263 @@
+# tree_shap.py
+# Exact per-prediction feature attributions (path-dependent TreeSHAP) for the
+# RandomForest in best_model.pkl, vectorized over the flattened trees.
+#
+# Every root-to-leaf path is reduced once, at build time, to its unique
+# features: for each one the interval the input must fall in to follow the
+# path, and z = the share of training samples that follow it (the product of
+# cover ratios of that feature's splits). For a row x, o = 1 where x is inside
+# the interval. The SHAP value of feature i from one path with d unique
+# features and leaf value v is
+#
+#     v * (o_i - z_i) * sum_k w(k, d) * [t^k] prod_{j != i} (z_j + o_j t),
+#     w(k, d) = k! (d - k - 1)! / d!
+#
+# (the EXTEND/UNWIND recursion of TreeSHAP written as polynomial
+# coefficients). Paths are grouped by d. Since o is 0/1, a path with d <= 6
+# has at most 64 possible o-patterns, and the coefficients for all of them are
+# computed at build time; at prediction time a row only needs the comparisons,
+# a bitmask and a gather. Longer paths (unlimited-depth models) evaluate the
+# polynomials per row. The per-feature sums are one sparse matmul, and rows
+# are processed in blocks of BLOCK_ROWS, which bounds memory for batch use.
+#
+#   python tree_shap.py      # check additivity on StressLevelDataset and time it
+
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from forest_engine import _leaf_values, is_supported
+
+# Rows per block; temporaries are about rows x paths x d floats (x d^2 for
+# paths longer than TABLE_MAX_DEPTH)
+BLOCK_ROWS = 256
+
+# Paths with up to this many unique features use the precomputed pattern table
+TABLE_MAX_DEPTH = 6
+
+
+def _path_conditions(tree, values):
+    """Yield (conditions, leaf value) per leaf; conditions map feature -> (z, low, high, has_high)."""
+    left, right = tree.children_left, tree.children_right
+    feature, threshold = tree.feature, tree.threshold
+    cover = tree.weighted_n_node_samples
+    stack = [(0, {})]
+    while stack:
+        node, conds = stack.pop()
+        if left[node] == -1:
+            yield conds, values[node]
+            continue
+        f, t = int(feature[node]), float(threshold[node])
+        for child, goes_left in ((left[node], True), (right[node], False)):
+            z, low, high, has_high = conds.get(f, (1.0, -np.inf, np.inf, False))
+            z *= cover[child] / cover[node]
+            if goes_left:
+                high, has_high = min(high, t), True
+            else:
+                low = max(low, t)
+            child_conds = dict(conds)
+            child_conds[f] = (z, low, high, has_high)
+            stack.append((child, child_conds))
+
+
+def _coefficients(o, z, weights):
+    """(n, P, d) coefficient of each path position for 0/1 matrix `o` (n, P, d) and covers `z` (P, d)."""
+    d, n = z.shape[1], o.shape[0]
+    z = z[None]
+    # Coefficients of prod_j (z_j + o_j t), lowest degree first
+    poly = np.zeros((n, z.shape[1], d + 1))
+    poly[..., 0] = 1.0
+    for j in range(d):
+        shifted = poly[..., :-1] * o[..., j, None]
+        poly *= z[..., j, None]
+        poly[..., 1:] += shifted
+
+    # Divide out each feature's own factor, for all features at once: (n, P, d_i, d_k)
+    # o_i = 1: synthetic division by (z_i + t), from the top coefficient down
+    q_in = np.empty(o.shape + (d,))
+    q_in[..., d - 1] = poly[..., None, d]
+    for k in range(d - 1, 0, -1):
+        q_in[..., k - 1] = poly[..., None, k] - z * q_in[..., k]
+    # o_i = 0: the factor is the constant z_i
+    q_out = poly[..., None, :d] / z[..., None]
+    q = np.where(o[..., None] > 0, q_in, q_out)
+    return (o - z) * (q @ weights)
+
+
+class _PathGroup:
+    """All paths with the same number `d` of unique features."""
+
+    def __init__(self, d, paths, n_features, n_classes):
+        from scipy import sparse
+        self.d = d
+        self.feature = np.array([[f for f in conds] for conds, _ in paths], dtype=np.intp)
+        cond = np.array([[conds[f] for f in conds] for conds, _ in paths], dtype=np.float64)
+        self.z = cond[:, :, 0]
+        self.low = cond[:, :, 1]
+        self.high = cond[:, :, 2]
+        self.no_high = cond[:, :, 3] == 0.0
+        self.value = np.array([v for _, v in paths])                      # (paths, classes)
+        self.weights = np.array([math.factorial(k) * math.factorial(d - k - 1) / math.factorial(d)
+                                 for k in range(d)])
+        n_paths = len(paths)
+
+        self.table = None
+        if d <= TABLE_MAX_DEPTH:
+            # Coefficients for every o-pattern: table[p, mask] with bit k of mask = o_k
+            masks = np.arange(2 ** d)
+            o_all = ((masks[:, None] >> np.arange(d)) & 1).astype(np.float64)      # (2^d, d)
+            o_all = np.broadcast_to(o_all[:, None, :], (2 ** d, n_paths, d))
+            self.table = np.ascontiguousarray(_coefficients(o_all, self.z, self.weights).transpose(1, 0, 2))
+            self.bits = 1 << np.arange(d)
+
+        # Scatter matrix: (path, position) -> (feature, class), scaled by the leaf value
+        rows = np.repeat(np.arange(n_paths * d), n_classes)
+        cols = (self.feature.ravel()[:, None] * n_classes + np.arange(n_classes)).ravel()
+        vals = np.repeat(self.value, d, axis=0).ravel()
+        self.scatter = sparse.csr_matrix((vals, (rows, cols)), shape=(n_paths * d, n_features * n_classes))
+
+    def expected_value(self):
+        return (self.value * self.z.prod(axis=1)[:, None]).sum(axis=0)
+
+    def contributions(self, X32):
+        """(rows, paths * d) coefficient of each path position, before the leaf value."""
+        n = X32.shape[0]
+        xv = X32[:, self.feature]                                              # (n, P, d)
+        # Same comparison as the tree walk: left is x <= t, right is "not <=" (NaN goes right)
+        o = ((xv <= self.high) | self.no_high) & ~(xv <= self.low)
+        if self.table is not None:
+            mask = o @ self.bits                                               # (n, P)
+            coef = self.table[np.arange(self.table.shape[0]), mask]            # (n, P, d)
+        else:
+            coef = _coefficients(o.astype(np.float64), self.z, self.weights)
+        return coef.reshape(n, -1)
+
+
+class TreeExplainer:
+    """Path-dependent TreeSHAP for a fitted RandomForest/ExtraTrees classifier (+ StandardScaler).
+
+    `model` may also be a compact_forest.CompactForest, which carries its own scaler.
+    """
+
+    def __init__(self, model, scaler=None):
+        self.classes_ = np.asarray(model.classes_)
+        self.n_classes = len(self.classes_)
+        self.mean = self.scale = None
+        if hasattr(model, "tree_views"):
+            trees = list(model.tree_views())
+            self.n_features = model.n_features
+            self.mean, self.scale = model.mean, model.scale
+        else:
+            trees = [(est.tree_, _leaf_values(est.tree_, self.n_classes)) for est in model.estimators_]
+            self.n_features = int(model.n_features_in_)
+        if scaler is not None:
+            self.mean = scaler.mean_.astype(np.float64) if scaler.with_mean else None
+            self.scale = scaler.scale_.astype(np.float64) if scaler.with_std else None
+
+        by_depth = {}
+        for t, values in trees:
+            # predict_proba averages the trees, so each leaf counts 1/n_trees
+            values = values / len(trees)
+            for conds, v in _path_conditions(t, values):
+                by_depth.setdefault(len(conds), []).append((conds, v))
+        self.groups = [_PathGroup(d, paths, self.n_features, self.n_classes)
+                       for d, paths in sorted(by_depth.items()) if d > 0]
+        # A tree that is a single leaf adds its value to the base for every row
+        self.expected_value = sum((g.expected_value() for g in self.groups), np.zeros(self.n_classes))
+        for _, v in by_depth.get(0, []):
+            self.expected_value += v
+
+    def transform(self, X):
+        X = np.array(X, dtype=np.float64)
+        if self.mean is not None:
+            X -= self.mean
+        if self.scale is not None:
+            X /= self.scale
+        return X
+
+    def shap_values(self, X, block_rows=BLOCK_ROWS):
+        """(rows, features, classes) attributions; expected_value + their sum over features = predict_proba."""
+        X32 = np.ascontiguousarray(self.transform(np.atleast_2d(X)), dtype=np.float32)
+        out = np.empty((X32.shape[0], self.n_features * self.n_classes))
+        for start in range(0, X32.shape[0], block_rows):
+            block = X32[start:start + block_rows]
+            acc = np.zeros((block.shape[0], self.n_features * self.n_classes))
+            for g in self.groups:
+                acc += np.asarray(g.scatter.T @ g.contributions(block).T).T
+            out[start:start + block_rows] = acc
+        return out.reshape(-1, self.n_features, self.n_classes)
+
+    def explain(self, X, classes=None, block_rows=BLOCK_ROWS):
+        """(rows, features) attributions towards `classes` (one class index per row; default: predicted)."""
+        phi = self.shap_values(X, block_rows)
+        if classes is None:
+            proba = self.expected_value + phi.sum(axis=1)
+            classes = proba.argmax(axis=1)
+        return phi[np.arange(len(phi)), :, np.asarray(classes)]
+
+
+# ---------------------------
+# Per-version cache
+# ---------------------------
+_explainers = OrderedDict()
+_importances = OrderedDict()
+_cache_lock = threading.Lock()
+_KEEP_VERSIONS = 2
+
+
+def _cached(cache, version, build):
+    with _cache_lock:
+        if version in cache:
+            cache.move_to_end(version)
+            return cache[version]
+    value = build()
+    with _cache_lock:
+        cache[version] = value
+        while len(cache) > _KEEP_VERSIONS:
+            cache.popitem(last=False)
+    return value
+
+
+def get_explainer(active):
+    """TreeExplainer for a ModelRegistry LoadedModel, built once per model version; None if unsupported."""
+    if not (hasattr(active.model, "tree_views") or is_supported(active.model, active.scaler)):
+        return None
+    return _cached(_explainers, active.version, lambda: TreeExplainer(active.model, active.scaler))
+
+
+def global_importances(active):
+    """The model's feature_importances_ (or None), computed once per model version."""
+    def build():
+        fi = getattr(active.model, "feature_importances_", None)
+        return None if fi is None else np.asarray(fi, dtype=float)
+    return _cached(_importances, active.version, build)
+
+
+if __name__ == "__main__":
+    import os
+    import time
+    import warnings
+    import joblib
+    import pandas as pd
+    from config import MODEL_FILE, SCALER_FILE, DATASET_FILE
+    from forest_engine import CompiledForest
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    model, scaler = joblib.load(MODEL_FILE), joblib.load(SCALER_FILE)
+    start = time.perf_counter()
+    explainer = TreeExplainer(model, scaler)
+    print(f"built in {(time.perf_counter() - start) * 1000:.1f} ms, "
+          f"{sum(len(g.z) for g in explainer.groups)} paths")
+    X = pd.read_csv(DATASET_FILE).drop(columns=["stress_level"]).to_numpy(dtype=float) \
+        if os.path.exists(DATASET_FILE) else np.random.default_rng(0).integers(1, 11, (1000, 20)).astype(float)
+    phi = explainer.shap_values(X)
+    proba = CompiledForest(model, scaler).predict_proba(X)
+    err = np.abs(explainer.expected_value + phi.sum(axis=1) - proba).max()
+    print(f"{len(X)} rows: max |base + sum(shap) - predict_proba| = {err:.2e}")
+    for n in (1, 100, len(X)):
+        start = time.perf_counter()
+        explainer.shap_values(X[:n])
+        t = time.perf_counter() - start
+        print(f"{n:>6} rows: {t * 1000:8.2f} ms ({t / n * 1000:.3f} ms/row)")
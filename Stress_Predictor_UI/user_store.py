@@ -0,0 +1,199 @@
+# user_store.py
+# User accounts in a SQLite table with a case-insensitive unique key.
+#
+# Logins are answered from an in-memory dict keyed on the lower-cased username.
+# The dict is rebuilt only when another connection (another session thread or
+# worker process) has changed the users table: PRAGMA data_version says some
+# commit happened, and a generation counter kept by triggers on `users` says
+# whether it touched users (history writes share the database file and must
+# not invalidate the index). Registrations from this process update it in place.
+
+import os
+import re
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from config import DB_FILE, USERS_CSV
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username_key TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    password TEXT NOT NULL,
+    role TEXT NOT NULL DEFAULT 'user'
+);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('users_generation', '0');
+"""
+
+_GENERATION_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS trg_users_generation_{event} AFTER {event} ON users
+BEGIN
+    UPDATE store_meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'users_generation';
+END;
+"""
+
+_SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+
+
+def sha256_hash(s: str) -> str:
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+
+def _key(username):
+    return str(username).strip().lower()
+
+
+class UserRepository:
+    """Users keyed case-insensitively; lookups come from a cached index."""
+
+    def __init__(self, path=DB_FILE, legacy_csv=USERS_CSV):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.executescript(SCHEMA)
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            self._conn.executescript(_GENERATION_TRIGGER.format(event=event))
+        self._index = None
+        self._data_version = None
+        self._generation = None
+        if legacy_csv and os.path.exists(legacy_csv):
+            self.import_csv(legacy_csv)
+
+    # ---------------------------
+    # Cache
+    # ---------------------------
+    def _current_generation(self):
+        row = self._conn.execute("SELECT value FROM store_meta WHERE key = 'users_generation'").fetchone()
+        return row[0] if row else None
+
+    def _fresh_index(self):
+        # Caller holds self._lock
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._index is not None and version == self._data_version:
+            return self._index
+        self._data_version = version
+        generation = self._current_generation()
+        if self._index is None or generation != self._generation:
+            rows = self._conn.execute("SELECT username_key, username, password, role FROM users")
+            self._index = {k: {"username": u, "password": p, "role": r} for k, u, p, r in rows}
+            self._generation = generation
+        return self._index
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+    def get(self, username):
+        """The user record (username, password hash, role) or None."""
+        with self._lock:
+            return self._fresh_index().get(_key(username))
+
+    def generation(self):
+        """Changes on every write to the users table, from this process or another."""
+        with self._lock:
+            return self._current_generation()
+
+    def exists(self, username):
+        return self.get(username) is not None
+
+    def usernames(self):
+        with self._lock:
+            return sorted(u["username"] for u in self._fresh_index().values())
+
+    def to_frame(self, include_passwords=False):
+        with self._lock:
+            df = pd.DataFrame(list(self._fresh_index().values()), columns=["username", "password", "role"])
+        if not include_passwords:
+            df = df.drop(columns=["password"])
+        return df.sort_values("username", key=lambda c: c.str.lower()).reset_index(drop=True)
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+    def add(self, username, password_hash, role="user"):
+        """Insert a new user; returns False if the name is taken (any case)."""
+        key = _key(username)
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO users (username_key, username, password, role) VALUES (?, ?, ?, ?)",
+                    (key, username, password_hash, role),
+                )
+            except sqlite3.IntegrityError:
+                return False
+            self._fresh_index()[key] = {"username": username, "password": password_hash, "role": role}
+            self._generation = self._current_generation()  # our own change is already in the index
+            return True
+
+    def set_role(self, username, role):
+        key = _key(username)
+        with self._lock:
+            cur = self._conn.execute("UPDATE users SET role = ? WHERE username_key = ?", (role, key))
+            index = self._fresh_index()
+            if cur.rowcount and key in index:
+                index[key] = dict(index[key], role=role)
+            self._generation = self._current_generation()
+            return cur.rowcount > 0
+
+    # ---------------------------
+    # Migration
+    # ---------------------------
+    def import_csv(self, csv_path):
+        """Import users.csv once; plaintext passwords are hashed, missing roles become "user"."""
+        meta_key = "users_imported:" + os.path.abspath(csv_path)
+        df = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+        if "role" not in df.columns:
+            df["role"] = "user"
+        rows = []
+        for r in df.itertuples(index=False):
+            if not r.username:
+                continue
+            pw = str(r.password)
+            if not _SHA256_HEX.match(pw):
+                pw = sha256_hash(pw)
+            rows.append((_key(r.username), r.username, pw, r.role or "user"))
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._conn.execute("SELECT 1 FROM store_meta WHERE key = ?", (meta_key,)).fetchone():
+                    self._conn.execute("ROLLBACK")
+                    return 0
+                # First spelling of a name wins, as the old case-insensitive lookup did
+                # rowcount counts the inserted users only; total_changes would add the generation trigger's writes
+                imported = self._conn.executemany(
+                    "INSERT OR IGNORE INTO users (username_key, username, password, role) VALUES (?, ?, ?, ?)",
+                    rows,
+                ).rowcount
+                self._conn.execute(
+                    "INSERT INTO store_meta (key, value) VALUES (?, ?)", (meta_key, datetime.now().isoformat())
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._index = None
+            return imported
+
+
+_repos = {}
+_repos_lock = threading.Lock()
+
+
+def get_user_repository(path=DB_FILE, legacy_csv=USERS_CSV):
+    """Process-wide UserRepository per database path."""
+    with _repos_lock:
+        repo = _repos.get(path)
+        if repo is None:
+            repo = UserRepository(path, legacy_csv)
+            _repos[path] = repo
+        return repo